@@ -0,0 +1,201 @@
+import json
+import math
+import os
+import select
+import time
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from metrics import dump_json, instrument, span
+from users import find_user_id
+
+# Канал LISTEN/NOTIFY получателя, в него публикует update-prices (notifications.py).
+# LISTEN привязан к серверной сессии, поэтому long-poll (?wait) работает только на прямом подключении
+# или через пулер в режиме session. За PgBouncer в режиме transaction серверное соединение после каждого
+# запроса уходит другому клиенту, и уведомления не доходят: для этой функции DATABASE_POOLER_URL должен
+# указывать на session-пул или не задаваться (тогда используется DATABASE_URL)
+NOTIFY_CHANNEL_PREFIX = 'notifications_'
+# Облачная функция ограничена по времени, поэтому long-poll держится не дольше этого
+NOTIFICATIONS_MAX_WAIT = float(os.environ.get('NOTIFICATIONS_MAX_WAIT', '25'))
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+def load_unread(cur, user_id: int, after: int, limit: int) -> dict:
+    """Одним запросом: непрочитанные уведомления новее after и общее число непрочитанных.
+    Оба читаются по частичному индексу (user_id, id) WHERE is_read = FALSE"""
+    cur.execute(
+        f"""
+        SELECT c.unread, n.id, n.type, n.message, n.track_id, n.payload, n.created_at
+        FROM (
+            SELECT COUNT(*) AS unread FROM {os.environ['MAIN_DB_SCHEMA']}.notifications
+            WHERE user_id = %s AND is_read = FALSE
+        ) c
+        LEFT JOIN LATERAL (
+            SELECT id, type, message, track_id, payload, created_at
+            FROM {os.environ['MAIN_DB_SCHEMA']}.notifications
+            WHERE user_id = %s AND is_read = FALSE AND id > %s
+            ORDER BY id
+            LIMIT %s
+        ) n ON TRUE
+        """,
+        (user_id, user_id, after, limit)
+    )
+    rows = cur.fetchall()
+    return {
+        'notifications': [
+            {field: row[field] for field in ('id', 'type', 'message', 'track_id', 'payload', 'created_at')}
+            for row in rows if row['id'] is not None
+        ],
+        'unread': rows[0]['unread'] if rows else 0
+    }
+
+def wait_for_notify(conn, seconds: float) -> bool:
+    """Ждёт NOTIFY на прослушиваемых каналах подключения (в autocommit) не дольше seconds"""
+    deadline = time.monotonic() + seconds
+    with span('notify_wait'):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if select.select([conn], [], [], remaining) == ([], [], []):
+                return False
+            conn.poll()
+            if conn.notifies:
+                conn.notifies.clear()
+                return True
+
+@instrument('notifications')
+def handler(event: dict, context) -> dict:
+    """API уведомлений пользователя: непрочитанные, ожидание новых (long-poll) и отметка о прочтении"""
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Id'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    headers = event.get('headers') or {}
+    steam_id = headers.get('X-Steam-Id') or headers.get('x-steam-id')
+
+    if not steam_id:
+        return {
+            'statusCode': 401,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Authentication required'}),
+            'isBase64Encoded': False
+        }
+
+    if method not in ('GET', 'POST'):
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    try:
+        after = int(params.get('after') or 0)
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+        wait = float(params.get('wait') or 0)
+        body = json.loads(event.get('body') or '{}') if method == 'POST' else {}
+        ids = [int(notification_id) for notification_id in body.get('ids') or []]
+    except (ValueError, TypeError, AttributeError):
+        limit = 0
+        ids = []
+        wait = 0
+
+    # nan и inf float() принимает, а min() с nan дал бы nan и в select.select
+    if not 1 <= limit <= MAX_LIMIT or not math.isfinite(wait) or wait < 0:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f'Invalid after, wait, limit (1-{MAX_LIMIT}) or ids'}),
+            'isBase64Encoded': False
+        }
+
+    wait = min(wait, NOTIFICATIONS_MAX_WAIT)
+
+    conn = None
+    listening = False
+    try:
+        conn = get_db_connection()
+        # LISTEN действует только вне транзакции, и чтению откат при возврате в пул не нужен
+        conn.autocommit = True
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        user_id = find_user_id(cur, steam_id)
+        if user_id is None:
+            result = {'updated': 0, 'unread': 0} if method == 'POST' else {'notifications': [], 'unread': 0}
+        elif method == 'POST':
+            # Без ids отмечаются все непрочитанные; CTE видит таблицу до обновления, поэтому вычитаем
+            id_filter = 'AND id = ANY(%s)' if ids else ''
+            cur.execute(
+                f"""
+                WITH updated AS (
+                    UPDATE {os.environ['MAIN_DB_SCHEMA']}.notifications SET is_read = TRUE
+                    WHERE user_id = %s AND is_read = FALSE {id_filter}
+                    RETURNING id
+                )
+                SELECT (SELECT COUNT(*) FROM updated) AS updated,
+                       (SELECT COUNT(*) FROM {os.environ['MAIN_DB_SCHEMA']}.notifications
+                        WHERE user_id = %s AND is_read = FALSE) - (SELECT COUNT(*) FROM updated) AS unread
+                """,
+                (user_id, ids, user_id) if ids else (user_id, user_id)
+            )
+            result = dict(cur.fetchone())
+        else:
+            if wait:
+                # Подписываемся до чтения: уведомление, закоммиченное между чтением и ожиданием, не потеряется
+                cur.execute(f'LISTEN {NOTIFY_CHANNEL_PREFIX}{int(user_id)}')
+                listening = True
+            result = load_unread(cur, user_id, after, limit)
+            if wait and not result['notifications'] and wait_for_notify(conn, wait):
+                result = load_unread(cur, user_id, after, limit)
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': dump_json(result, default=str),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+    finally:
+        if conn:
+            if listening and not conn.closed:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute('UNLISTEN *')
+                    conn.notifies.clear()
+                except Exception as e:
+                    print(f"UNLISTEN failed: {e}")
+            release_db_connection(conn)
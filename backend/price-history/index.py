@@ -0,0 +1,148 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from metrics import dump_json, instrument
+
+BUCKETS = {'hour': timedelta(days=31), 'day': timedelta(days=366)}
+
+def parse_bound(value: str) -> datetime:
+    """Граница диапазона из ISO 8601 в наивное UTC, как recorded_at; без смещения время считается UTC"""
+    # fromisoformat до Python 3.11 не понимает суффикс Z
+    moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith(('Z', 'z')) else value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@instrument('price-history')
+def handler(event: dict, context) -> dict:
+    """API для истории цен предмета: min/max/avg/last по часам или дням"""
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    item_name = params.get('item', '')
+    bucket = params.get('bucket', 'day')
+    appid = params.get('appid', '730')
+
+    if not item_name or bucket not in BUCKETS or not appid.isdigit():
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Query parameter "item" is required, "bucket" must be hour or day, "appid" must be a number'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        date_to = parse_bound(params['to']) if params.get('to') else datetime.utcnow()
+        date_from = parse_bound(params['from']) if params.get('from') else date_to - timedelta(days=7)
+    except ValueError:
+        date_from = date_to = None
+
+    # Ограничиваем диапазон, чтобы размер ответа не рос вместе с историей
+    if date_from is None or date_from >= date_to or date_to - date_from > BUCKETS[bucket]:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Invalid date range'}),
+            'isBase64Encoded': False
+        }
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        # Агрегация целиком в SQL по индексу (item_id, recorded_at), Python получает только корзины
+        cur.execute(
+            f"""
+            SELECT date_trunc(%s, h.recorded_at) AS bucket,
+                   MIN(h.price_cents) AS min_cents,
+                   MAX(h.price_cents) AS max_cents,
+                   AVG(h.price_cents) AS avg_cents,
+                   (ARRAY_AGG(h.price_cents ORDER BY h.recorded_at DESC))[1] AS last_cents,
+                   COUNT(*) AS samples
+            FROM {os.environ['MAIN_DB_SCHEMA']}.price_history h
+            JOIN {os.environ['MAIN_DB_SCHEMA']}.market_items m ON m.id = h.item_id
+            WHERE m.appid = %s AND m.hash_name = %s AND h.recorded_at >= %s AND h.recorded_at < %s
+            GROUP BY 1
+            ORDER BY 1
+            """,
+            (bucket, int(appid), item_name, date_from, date_to)
+        )
+        rows = cur.fetchall()
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': dump_json({
+                'item_name': item_name,
+                'appid': int(appid),
+                # История хранится в базовой валюте, в которой цены запрашиваются у Steam
+                'currency': 'RUB',
+                'bucket': bucket,
+                'from': date_from.isoformat(),
+                'to': date_to.isoformat(),
+                'points': [
+                    {
+                        'time': row['bucket'].isoformat(),
+                        'min': row['min_cents'] / 100,
+                        'max': row['max_cents'] / 100,
+                        'avg': round(float(row['avg_cents']) / 100, 2),
+                        'last': row['last_cents'] / 100,
+                        'samples': row['samples']
+                    }
+                    for row in rows
+                ]
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if conn:
+            cur.close()
+            release_db_connection(conn)
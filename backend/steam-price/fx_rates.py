@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from decimal import Decimal
+from psycopg2.extras import execute_values
+
+FX_RATES_URL = os.environ.get('FX_RATES_URL', 'https://www.cbr-xml-daily.ru/latest.js')
+FX_RATES_TTL = int(os.environ.get('FX_RATES_TTL', '3600'))
+FX_RETRY_SECONDS = 60
+BASE_CURRENCY = 'RUB'
+CENT = Decimal('0.01')
+
+# Коды валют Steam (ECurrencyCode) для priceoverview и createbuyorder
+STEAM_CURRENCIES = {
+    'USD': 1, 'GBP': 2, 'EUR': 3, 'CHF': 4, 'RUB': 5, 'PLN': 6, 'BRL': 7, 'JPY': 8,
+    'NOK': 9, 'TRY': 17, 'UAH': 18, 'CAD': 20, 'AUD': 21, 'CNY': 23, 'KZT': 37
+}
+
+class FxRates:
+    """Курсы валют к базовой (сколько единиц валюты в одном рубле): память контейнера → таблица fx_rates → FX_RATES_URL.
+    Источник опрашивается не чаще раза в FX_RATES_TTL, таблица делит свежие курсы между контейнерами"""
+
+    def __init__(self, connect=None, ttl: int = FX_RATES_TTL):
+        self.connect = connect
+        self.ttl = ttl
+        self.rates = {}
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+    def load_table(self) -> tuple:
+        """Курсы из fx_rates и возраст самой свежей записи в секундах"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT currency, rate, EXTRACT(EPOCH FROM (LOCALTIMESTAMP - updated_at))
+                    FROM {os.environ['MAIN_DB_SCHEMA']}.fx_rates
+                    """
+                )
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return {}, None
+        return {currency: float(rate) for currency, rate, _ in rows}, min(float(age) for _, _, age in rows)
+
+    def save_table(self, rates: dict) -> None:
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    f"""
+                    INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.fx_rates (currency, rate, updated_at)
+                    VALUES %s
+                    ON CONFLICT (currency) DO UPDATE SET rate = EXCLUDED.rate, updated_at = EXCLUDED.updated_at
+                    """,
+                    list(rates.items()),
+                    template='(%s, %s, LOCALTIMESTAMP)'
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fetch_source(self) -> dict:
+        """Запрашивает курсы у источника: ожидается JSON с полем rates относительно рубля"""
+        req = urllib.request.Request(FX_RATES_URL, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(req, timeout=10) as response:
+            data = json.loads(response.read().decode('utf-8'))
+        rates = {
+            currency.upper(): float(rate)
+            for currency, rate in (data.get('rates') or {}).items()
+            if currency.upper() in STEAM_CURRENCIES and rate
+        }
+        if not rates:
+            raise ValueError('FX source returned no usable rates')
+        return rates
+
+    def current(self) -> dict:
+        """Актуальные курсы; при недоступности источника — последние известные"""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.expires_at:
+                return self.rates
+
+            rates, age = {}, None
+            if self.connect:
+                try:
+                    rates, age = self.load_table()
+                except Exception as e:
+                    print(f"FX rates table unavailable: {e}")
+
+            if age is not None and age <= self.ttl:
+                self.rates, self.expires_at = rates, now + self.ttl - age
+                return self.rates
+
+            try:
+                fetched = self.fetch_source()
+            except Exception as e:
+                print(f"FX rates refresh failed: {e}")
+                self.rates = rates or self.rates
+                self.expires_at = now + FX_RETRY_SECONDS
+                return self.rates
+
+            self.rates, self.expires_at = fetched, now + self.ttl
+            if self.connect:
+                try:
+                    self.save_table(fetched)
+                except Exception as e:
+                    print(f"FX rates not saved: {e}")
+            return self.rates
+
+    def convert(self, amount: Decimal, currency: str):
+        """Переводит сумму из базовой валюты с точностью до копейки (Decimal), None если курса нет"""
+        if currency == BASE_CURRENCY:
+            return amount
+        rate = self.current().get(currency)
+        return (amount * Decimal(str(rate))).quantize(CENT) if rate else None
+
+    def exchange(self, amount: Decimal, source: str, target: str):
+        """Переводит сумму между любыми валютами через курсы к базовой с одним округлением до копейки,
+        None если курса нет"""
+        if source == target:
+            return amount
+        rates = {**self.current(), BASE_CURRENCY: 1.0}
+        if not rates.get(source) or not rates.get(target):
+            return None
+        return (amount / Decimal(str(rates[source])) * Decimal(str(rates[target]))).quantize(CENT)
@@ -1,7 +1,41 @@
+import hashlib
 import json
-import urllib.request
+import os
 import urllib.parse
+import psycopg2
+from fx_rates import BASE_CURRENCY, STEAM_CURRENCIES, FxRates
+from metrics import TimedConnection, dump_json, instrument
+from price_cache import cache_key, create_price_cache
+from price_parser import parse_price
+from steam_http import STEAM_MARKET_URL, SteamRateLimited, SteamUnavailable, request_json
 
+def get_db_connection():
+    """Создаёт подключение к базе данных (кэш цен с бэкендом db и таблица курсов валют)"""
+    return psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TimedConnection)
+
+price_cache = create_price_cache(get_db_connection)
+fx_rates = FxRates(get_db_connection if os.environ.get('DATABASE_URL') else None)
+
+def fetch_price_overview(appid: int, item_name: str) -> dict:
+    """Запрашивает priceoverview предмета в базовой валюте, None если предмет не найден"""
+    price_url = f'{STEAM_MARKET_URL}/priceoverview/?appid={appid}&currency={STEAM_CURRENCIES[BASE_CURRENCY]}&market_hash_name={urllib.parse.quote(item_name)}'
+    data = request_json(price_url, timeout=10)
+    return data if data.get('success') else None
+
+def price_etag(appid: str, item_name: str, currency: str, price, median, volume) -> str:
+    """Слабый ETag ответа по его содержимому: цена в валюте запроса уже учитывает и запись кэша, и курс"""
+    key = f'{appid}|{item_name}|{currency}|{price}|{median}|{volume}'
+    return f'W/"{hashlib.md5(key.encode("utf-8")).hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    return bool(if_none_match) and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')])
+
+def format_price(value, currency: str) -> str:
+    if value is None:
+        return 'N/A'
+    return f"{value}₽" if currency == BASE_CURRENCY else f"{value} {currency}"
+
+@instrument('steam-price')
 def handler(event: dict, context) -> dict:
     """API для получения цены предмета в Steam Market"""
     method = event.get('httpMethod', 'GET')
@@ -12,14 +46,17 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
     if method == 'GET':
-        item_name = event.get('queryStringParameters', {}).get('item', '')
+        params = event.get('queryStringParameters') or {}
+        item_name = params.get('item', '')
+        appid = params.get('appid', '730')
+        currency = params.get('currency', BASE_CURRENCY).upper()
         
         if not item_name:
             return {
@@ -32,44 +69,75 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
 
+        if not appid.isdigit() or currency not in STEAM_CURRENCIES:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f"appid must be a number, currency one of {', '.join(STEAM_CURRENCIES)}"}),
+                'isBase64Encoded': False
+            }
+
         try:
-            price_url = f'https://steamcommunity.com/market/priceoverview/?appid=730&currency=5&market_hash_name={urllib.parse.quote(item_name)}'
-            
-            req = urllib.request.Request(price_url)
-            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-            
-            with urllib.request.urlopen(req, timeout=10) as response:
-                data = json.loads(response.read().decode('utf-8'))
-            
-            print(f"Steam Price API response for {item_name}: {data}")
-            
-            if data.get('success'):
-                lowest_price = data.get('lowest_price', 'N/A')
-                price_value = None
-                
-                if lowest_price != 'N/A':
-                    import re
-                    price_match = re.search(r'[\d\s]+[,\.]?\d*', lowest_price)
-                    if price_match:
-                        price_str = price_match.group(0).replace(' ', '').replace(',', '.')
-                        try:
-                            price_value = float(price_str)
-                            print(f"Parsed price: {price_value}₽")
-                        except ValueError:
-                            print(f"Failed to parse price: {price_str}")
-                            price_value = None
-                
+            # Цена запрашивается один раз в базовой валюте и пересчитывается по курсу
+            data, cache_status = price_cache.get_or_fetch(
+                cache_key(int(appid), item_name, STEAM_CURRENCIES[BASE_CURRENCY]),
+                lambda: fetch_price_overview(int(appid), item_name)
+            )
+
+            if data:
+                base_price = parse_price(data.get('lowest_price'))
+                base_median = parse_price(data.get('median_price'))
+                price = fx_rates.convert(base_price, currency) if base_price else None
+                median = fx_rates.convert(base_median, currency) if base_median else None
+
+                if base_price and price is None:
+                    return {
+                        'statusCode': 503,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': f'No exchange rate for {currency}'}),
+                        'isBase64Encoded': False
+                    }
+
+                # Цена не изменилась с прошлого опроса клиента — тело не собирается и не сериализуется
+                etag = price_etag(appid, item_name, currency, price, median, data.get('volume'))
+                request_headers = event.get('headers') or {}
+                if etag_matches(request_headers.get('If-None-Match') or request_headers.get('if-none-match'), etag):
+                    return {
+                        'statusCode': 304,
+                        'headers': {
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Expose-Headers': 'ETag, X-Cache',
+                            'Cache-Control': 'no-cache',
+                            'ETag': etag,
+                            'X-Cache': cache_status
+                        },
+                        'body': '',
+                        'isBase64Encoded': False
+                    }
+
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Expose-Headers': 'ETag, X-Cache',
+                        'Cache-Control': 'no-cache',
+                        'ETag': etag,
+                        'X-Cache': cache_status
                     },
-                    'body': json.dumps({
+                    'body': dump_json({
                         'item_name': item_name,
-                        'lowest_price': f"{price_value}₽" if price_value else 'N/A',
-                        'price_value': price_value,
-                        'median_price': data.get('median_price', 'N/A'),
+                        'appid': int(appid),
+                        'currency': currency,
+                        'lowest_price': format_price(price, currency),
+                        'price_value': float(price) if price is not None else None,
+                        'median_price': format_price(median, currency),
                         'volume': data.get('volume', 'N/A')
                     }),
                     'isBase64Encoded': False
@@ -85,6 +153,26 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
         
+        except SteamRateLimited as e:
+            return {
+                'statusCode': 429,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        except SteamUnavailable as e:
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
         except Exception as e:
             return {
                 'statusCode': 500,
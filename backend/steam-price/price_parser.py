@@ -0,0 +1,30 @@
+import re
+from decimal import Decimal
+
+# Целая часть — цифры, дальше группы по три через пробел (в т.ч. неразрывный), точку, запятую или апостроф,
+# либо индийская запись «1,23,456» (группы по две через запятую перед последней тройкой);
+# дробная — 1-2 цифры или «--» (Steam пишет «12,--€» для целых евро)
+PRICE_PATTERN = re.compile(r"(\d{1,2}(?:,\d\d)+,\d{3}|\d+(?:[ \u00a0\u202f\u2009.,']\d{3})*)(?:[.,](\d\d?|--))?(?!\d)")
+GROUP_SEPARATORS = str.maketrans('', '', " \u00a0\u202f\u2009.,'")
+CENT = Decimal('0.01')
+
+def parse_price_cents(text: str):
+    """Цена из строки Steam в целых копейках (центах), None если числа в строке нет.
+    Понимает «1 234,56 pуб.», «$1,234.56», «1.234,56€», «12,--€», «CHF 1'234.56», «¥ 1,234», «₹ 1,23,456.00»"""
+    match = PRICE_PATTERN.search(text) if text else None
+    if match is None:
+        return None
+    units, fraction = match.groups()
+    if not units.isdigit():
+        # Разделитель групп стоит перед последними тремя цифрами и обычно один на всё число
+        units = units.replace(units[-4], '')
+        if not units.isdigit():
+            units = units.translate(GROUP_SEPARATORS)
+    if fraction is None or fraction == '--':
+        return int(units) * 100
+    return int(units + fraction if len(fraction) == 2 else units + fraction + '0')
+
+def parse_price(text: str):
+    """Цена из строки Steam как Decimal с двумя знаками, None если числа в строке нет"""
+    cents = parse_price_cents(text)
+    return None if cents is None else Decimal(cents) * CENT
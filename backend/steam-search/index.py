@@ -1,62 +1,245 @@
 import json
-import urllib.request
+import os
 import urllib.parse
 import re
+import time
+from psycopg2.extras import RealDictCursor, execute_values
+from db import get_db_connection, release_db_connection
+from metrics import dump_json, increment, instrument
+from search_cache import SearchCache
+from steam_http import STEAM_MARKET_URL, SteamRateLimited, SteamUnavailable, request_json
+from steam_stream import read_search_page
+
+SEARCH_COUNT = 10
+DEFAULT_APPID = 730
+SEARCH_CACHE_ITEMS = 50
+SYNC_PAGE_SIZE = 100
+# Пока каталог не выкачан целиком, меньше страницы совпадений в нём не значит, что в Steam их нет
+SEARCH_LOCAL_MIN_RESULTS = int(os.environ.get('SEARCH_LOCAL_MIN_RESULTS', str(SEARCH_COUNT)))
+# Полный проход синхронизации старше этого не считается: в Steam появляются новые предметы
+SEARCH_CATALOGUE_MAX_AGE = int(os.environ.get('SEARCH_CATALOGUE_MAX_AGE', '86400'))
+STEAM_IMAGE_URL = 'https://community.cloudflare.steamstatic.com/economy/image/'
+STEAM_SEARCH_HEADERS = {
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://steamcommunity.com/market/'
+}
+
+CYRILLIC_PATTERN = re.compile('[а-яА-ЯёЁ]')
 
 def is_russian(text: str) -> bool:
     """Проверяет содержит ли текст кириллицу"""
-    return bool(re.search('[а-яА-Я]', text))
+    return bool(CYRILLIC_PATTERN.search(text))
+
+def build_trie_pattern(terms: list) -> str:
+    """Собирает из терминов регулярное выражение-префиксное дерево: общие префиксы проверяются один раз,
+    а жадные необязательные группы дают совпадение с самым длинным термином"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+def load_translations(path: str) -> tuple:
+    """Загружает словарь терминов и компилирует его в одно выражение с границами слов"""
+    with open(path, encoding='utf-8') as f:
+        translations = {ru.lower(): en for ru, en in json.load(f).items()}
+    pattern = re.compile(r'(?<!\w)(?:' + build_trie_pattern(list(translations)) + r')(?!\w)')
+    return translations, pattern
+
+TRANSLATIONS, TRANSLATION_PATTERN = load_translations(os.path.join(os.path.dirname(__file__), 'translations.json'))
 
 def translate_weapon_terms(text: str) -> str:
-    """Переводит основные игровые термины с русского на английский"""
-    translations = {
-        'калаш': 'AK-47',
-        'ак': 'AK-47',
-        'эм4': 'M4A4',
-        'м4': 'M4A4',
-        'авп': 'AWP',
-        'глок': 'Glock-18',
-        'usp': 'USP-S',
-        'десерт игл': 'Desert Eagle',
-        'дигл': 'Desert Eagle',
-        'deagle': 'Desert Eagle',
-        'нож': 'knife',
-        'перчатки': 'gloves',
-        'сланец': 'slate',
-        'красная линия': 'redline',
-        'азимов': 'asiimov',
-        'вой': 'howl',
-        'дракон': 'dragon lore',
-        'неон': 'neon',
-        'киловатт': 'kilowatt',
-        'поблекшие': 'fade',
-        'гипнотика': 'hypnotic',
-        'наследие': 'inheritance',
-        'градиент': 'gradient',
-        'пустынный повстанец': 'rebel',
-        'элитное снаряжение': 'elite build',
-        'кровавый спорт': 'bloodsport',
-        'поверхностная закалка': 'case hardened',
-        'закалка': 'case hardened',
-        'автоматика': 'autotronic',
-        'полевые испытания': 'field-tested',
-        'прямо с завода': 'factory new',
-        'минимальный износ': 'minimal wear',
-        'после полевых испытаний': 'well-worn',
-        'закалённое в боях': 'battle-scarred',
-        'ft': 'field-tested',
-        'fn': 'factory new',
-        'mw': 'minimal wear',
-        'ww': 'well-worn',
-        'bs': 'battle-scarred'
+    """Переводит игровые термины с русского на английский за один проход по строке"""
+    return TRANSLATION_PATTERN.sub(lambda match: TRANSLATIONS[match.group(0)], text.lower())
+
+search_cache = SearchCache()
+
+def normalize_query(query: str) -> str:
+    """Ключ кэша: перевод с русского, нижний регистр, схлопнутые пробелы"""
+    # Пробелы схлопываются до перевода, иначе многословный термин с двойным пробелом не совпадёт
+    query = ' '.join(query.split())
+    if is_russian(query):
+        query = translate_weapon_terms(query)
+    return query.lower()
+
+def search_steam(query: str, start: int = 0, count: int = SEARCH_COUNT, appid: int = DEFAULT_APPID) -> dict:
+    """Запрос к market/search/render (через общий HTTP-слой с лимитом скорости).
+    Ответ разбирается потоково, от каждого предмета остаются только поля каталога"""
+    search_url = f'{STEAM_MARKET_URL}/search/render/?query={urllib.parse.quote(query)}&start={start}&count={count}&search_descriptions=0&sort_column=popular&sort_dir=desc&appid={appid}&norender=1'
+    return request_json(search_url, headers=STEAM_SEARCH_HEADERS, timeout=15, parse=read_search_page)
+
+def catalogue_row(item: dict) -> tuple:
+    """Строка каталога из компактного результата поиска Steam"""
+    return (
+        item.get('hash_name') or '',
+        item.get('name') or '',
+        item.get('icon_url') or '',
+        item.get('sell_price_text'),
+        item.get('sell_listings', 0)
+    )
+
+def format_result(hash_name: str, name: str, icon_url: str, price: str, sell_listings: int) -> dict:
+    """Элемент ответа поиска в формате, который ожидает фронтенд"""
+    return {
+        'name': name or '',
+        'hash_name': hash_name,
+        'image': f"{STEAM_IMAGE_URL}{icon_url}" if icon_url else '',
+        'price': price or 'N/A',
+        'sell_listings': sell_listings or 0
     }
-    
-    text_lower = text.lower()
-    for ru, en in translations.items():
-        text_lower = text_lower.replace(ru, en)
-    
-    return text_lower
 
+def upsert_catalogue(cur, items: list, appid: int = DEFAULT_APPID) -> int:
+    """Сохраняет результаты поиска Steam в локальный каталог market_items"""
+    rows = [(appid, *row) for row in map(catalogue_row, items) if row[0]]
+    if not rows:
+        return 0
+    execute_values(
+        cur,
+        f"""
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.market_items
+        (appid, hash_name, name, icon_url, sell_price_text, sell_listings, last_seen_at)
+        VALUES %s
+        ON CONFLICT (appid, hash_name) DO UPDATE SET
+            name = EXCLUDED.name,
+            icon_url = EXCLUDED.icon_url,
+            sell_price_text = EXCLUDED.sell_price_text,
+            sell_listings = EXCLUDED.sell_listings,
+            last_seen_at = EXCLUDED.last_seen_at
+        """,
+        list({row[1]: row for row in rows}.values()),
+        template='(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)',
+        page_size=SYNC_PAGE_SIZE
+    )
+    return len(rows)
+
+def search_catalogue(cur, query: str, count: int = SEARCH_COUNT, appid: int = DEFAULT_APPID) -> list:
+    """Ищет по локальному каталогу: каждое слово запроса — подстрока hash_name (индекс pg_trgm)"""
+    words = query.lower().split()
+    if not words:
+        return []
+    patterns = ['%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for word in words]
+    cur.execute(
+        f"""
+        SELECT hash_name, name, icon_url, sell_price_text, sell_listings
+        FROM {os.environ['MAIN_DB_SCHEMA']}.market_items
+        WHERE appid = %s AND name IS NOT NULL AND {' AND '.join(['lower(hash_name) LIKE %s'] * len(patterns))}
+        ORDER BY sell_listings DESC NULLS LAST, hash_name
+        LIMIT %s
+        """,
+        [appid] + patterns + [count]
+    )
+    return [
+        format_result(row['hash_name'], row['name'], row['icon_url'], row['sell_price_text'], row['sell_listings'])
+        for row in cur.fetchall()
+    ]
+
+def catalogue_synced(cur, appid: int) -> bool:
+    """Каталог приложения выкачан целиком (action=sync прошёл от начала до конца) не раньше SEARCH_CATALOGUE_MAX_AGE назад"""
+    cur.execute(
+        f"""
+        SELECT 1 FROM {os.environ['MAIN_DB_SCHEMA']}.catalogue_sync
+        WHERE appid = %s AND synced_at >= LOCALTIMESTAMP - make_interval(secs => %s)
+        """,
+        (appid, SEARCH_CATALOGUE_MAX_AGE)
+    )
+    return cur.fetchone() is not None
+
+def find_items(query: str, appid: int = DEFAULT_APPID) -> tuple:
+    """Ищет до SEARCH_CACHE_ITEMS предметов: сначала в каталоге, при промахе в Steam.
+    Возвращает (results, complete, source), complete — найдены все подходящие предметы.
+    Ответ каталога полный, только если каталог выкачан целиком: иначе в Steam могут быть предметы,
+    которых каталог ещё не видел, и кэш поиска не должен отвечать из него на более узкие запросы"""
+    conn = None
+    if os.environ.get('DATABASE_URL'):
+        conn = get_db_connection()
+
+    try:
+        if conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            results = search_catalogue(cur, query, SEARCH_CACHE_ITEMS, appid)
+            synced = catalogue_synced(cur, appid)
+            if synced or len(results) >= SEARCH_LOCAL_MIN_RESULTS:
+                return results, synced and len(results) < SEARCH_CACHE_ITEMS, 'catalogue'
+
+        # В Steam идём, если каталог не выкачан и знает меньше страницы подходящих предметов
+        data = search_steam(query, count=SEARCH_CACHE_ITEMS, appid=appid)
+
+        if not data.get('success') or not data.get('results'):
+            return [], bool(data.get('success')), 'steam'
+
+        items = data['results'][:SEARCH_CACHE_ITEMS]
+        if conn:
+            upsert_catalogue(cur, items, appid)
+            conn.commit()
+        results = [format_result(*catalogue_row(item)) for item in items]
+        return results, data.get('total_count', 0) <= len(items), 'steam'
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+def save_sync_progress(cur, appid: int, start: int, next_start: int, total_count, finished: bool) -> None:
+    """Запоминает, докуда дошла синхронизация. Проход, начатый с нуля и дошедший до конца каталога,
+    отмечает каталог выкачанным на момент своего начала"""
+    cur.execute(
+        f"""
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.catalogue_sync AS s (appid, next_start, total_count, pass_started_at, updated_at)
+        VALUES (%(appid)s, %(next_start)s, %(total_count)s, CASE WHEN %(start)s = 0 THEN LOCALTIMESTAMP END, LOCALTIMESTAMP)
+        ON CONFLICT (appid) DO UPDATE SET
+            next_start = EXCLUDED.next_start,
+            total_count = EXCLUDED.total_count,
+            pass_started_at = CASE WHEN %(start)s = 0 THEN LOCALTIMESTAMP ELSE s.pass_started_at END,
+            updated_at = LOCALTIMESTAMP
+        """,
+        {'appid': appid, 'start': start, 'next_start': 0 if finished else next_start, 'total_count': total_count}
+    )
+    if finished:
+        cur.execute(
+            f"""
+            UPDATE {os.environ['MAIN_DB_SCHEMA']}.catalogue_sync SET synced_at = pass_started_at
+            WHERE appid = %s AND pass_started_at IS NOT NULL
+            """,
+            (appid,)
+        )
+
+def sync_catalogue(start: int, pages: int, appid: int = DEFAULT_APPID) -> dict:
+    """Постранично выкачивает поиск Steam (по 100 предметов) в локальный каталог"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        upserted = 0
+        total_count = None
+        pass_start = start
+        finished = False
+        for _ in range(pages):
+            data = search_steam('', start=start, count=SYNC_PAGE_SIZE, appid=appid)
+            items = data.get('results') or []
+            total_count = data.get('total_count', total_count)
+            upserted += upsert_catalogue(cur, items, appid)
+            start += len(items)
+            finished = not items or (total_count is not None and start >= total_count)
+            save_sync_progress(cur, appid, pass_start, start, total_count, finished)
+            conn.commit()
+            # Следующие страницы продолжают тот же проход
+            pass_start = start
+            if finished:
+                break
+        cur.close()
+        return {'upserted': upserted, 'next_start': start, 'total_count': total_count, 'synced': finished}
+    finally:
+        release_db_connection(conn)
+
+@instrument('steam-search')
 def handler(event: dict, context) -> dict:
     """API для поиска предметов в Steam Market"""
     method = event.get('httpMethod', 'GET')
@@ -66,80 +249,134 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Refresh-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
+    if method == 'POST' and (event.get('queryStringParameters') or {}).get('action') == 'sync':
+        # Массовое наполнение каталога доступно только по секретному токену (как глобальное обновление цен)
+        headers = event.get('headers') or {}
+        refresh_token = headers.get('X-Refresh-Token') or headers.get('x-refresh-token')
+        if not os.environ.get('REFRESH_TOKEN') or refresh_token != os.environ['REFRESH_TOKEN']:
+            return {
+                'statusCode': 403,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+
+        params = event.get('queryStringParameters') or {}
+        try:
+            result = sync_catalogue(
+                int(params.get('start', 0)),
+                min(int(params.get('pages', 5)), 50),
+                int(params.get('appid', DEFAULT_APPID))
+            )
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': dump_json(result),
+                'isBase64Encoded': False
+            }
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+
+    if method == 'GET' and (event.get('queryStringParameters') or {}).get('stats'):
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'search_cache': search_cache.stats()}),
+            'isBase64Encoded': False
+        }
+
     if method == 'GET':
-        query = event.get('queryStringParameters', {}).get('q', '')
+        params = event.get('queryStringParameters') or {}
+        query = params.get('q', '')
+        appid = params.get('appid', str(DEFAULT_APPID))
         
-        if not query:
+        if not query or not appid.isdigit():
             return {
                 'statusCode': 400,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'Query parameter "q" is required'}),
+                'body': json.dumps({'error': 'Query parameter "q" is required, "appid" must be a number'}),
                 'isBase64Encoded': False
             }
 
         try:
-            # Если запрос на русском, переводим на английский
-            original_query = query
-            if is_russian(query):
-                query = translate_weapon_terms(query)
-                print(f"Translated '{original_query}' → '{query}'")
-            
-            search_url = f'https://steamcommunity.com/market/search/render/?query={urllib.parse.quote(query)}&start=0&count=10&search_descriptions=0&sort_column=popular&sort_dir=desc&appid=730&norender=1'
-            
-            req = urllib.request.Request(search_url)
-            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-            req.add_header('Accept', 'application/json, text/javascript, */*; q=0.01')
-            req.add_header('Accept-Language', 'en-US,en;q=0.9')
-            req.add_header('Referer', 'https://steamcommunity.com/market/')
-            
-            with urllib.request.urlopen(req, timeout=15) as response:
-                raw_data = response.read().decode('utf-8')
-                data = json.loads(raw_data)
-            
-            print(f"Search query: {query}")
-            print(f"API response success: {data.get('success')}")
-            print(f"Results count: {len(data.get('results', []))}")
-            
-            results = []
-            if data.get('success') and data.get('results'):
-                for item in data['results'][:10]:
-                    icon_url = ''
-                    if 'asset_description' in item and 'icon_url' in item['asset_description']:
-                        icon_url = item['asset_description']['icon_url']
-                    
-                    results.append({
-                        'name': item.get('name', ''),
-                        'hash_name': item.get('hash_name', ''),
-                        'image': f"https://community.cloudflare.steamstatic.com/economy/image/{icon_url}" if icon_url else '',
-                        'price': item.get('sell_price_text', 'N/A'),
-                        'sell_listings': item.get('sell_listings', 0)
-                    })
-            
-            print(f"Formatted results: {len(results)}")
-            
+            started = time.perf_counter()
+
+            # Нормализованный запрос: перевод с русского, регистр и пробелы не влияют на ключ кэша
+            key = normalize_query(query)
+
+            appid = int(appid)
+            results, cache_status = search_cache.get(appid, key)
+            source = 'cache'
+            if results is None:
+                results, complete, source = find_items(key, appid)
+                search_cache.put(appid, key, results, complete)
+            results = results[:SEARCH_COUNT]
+
+            search_cache.observe(cache_status, (time.perf_counter() - started) * 1000)
+            increment(f'search_source.{source}')
+
             return {
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    'X-Search-Source': source,
+                    'X-Cache': cache_status
                 },
-                'body': json.dumps({
+                'body': dump_json({
                     'results': results,
                     'total': len(results)
                 }),
                 'isBase64Encoded': False
             }
         
+        except SteamRateLimited as e:
+            return {
+                'statusCode': 429,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        except SteamUnavailable as e:
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
         except Exception as e:
             return {
                 'statusCode': 500,
@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import extensions
+
+METRICS_LOG_SAMPLE = float(os.environ.get('METRICS_LOG_SAMPLE', '1'))
+METRICS_SLOW_MS = float(os.environ.get('METRICS_SLOW_MS', '1000'))
+# Верхние границы корзин гистограмм в миллисекундах, последняя корзина — всё, что дольше
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами: перцентили оцениваются по верхней границе корзины"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction: float) -> float:
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return float(BUCKETS_MS[index]) if index < len(BUCKETS_MS) else round(self.max, 1)
+        return round(self.max, 1)
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 1),
+            'max_ms': round(self.max, 1),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {str(le): count for le, count in zip(BUCKETS_MS + ('inf',), self.counts) if count}
+        }
+
+class Invocation:
+    """Спаны и счётчики одного вызова функции. Время спана суммируется по всем потокам,
+    поэтому steam_http при параллельных запросах может превышать total"""
+
+    def __init__(self, function: str):
+        self.function = function
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+
+    def add_span(self, name: str, ms: float) -> None:
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += ms
+        span[1] += 1
+
+class Registry:
+    """Агрегаты на контейнер: переживают вызовы тёплого контейнера, в каждом контейнере свои"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self.invocations = 0
+        self.current = None
+        # Подписчики на завершённые вызовы (нагрузочный стенд bench/load_test.py)
+        self.listeners = []
+
+    def begin(self, function: str) -> Invocation:
+        with self.lock:
+            self.current = Invocation(function)
+            return self.current
+
+    def span(self, name: str, ms: float) -> None:
+        with self.lock:
+            if self.current is not None:
+                self.current.add_span(name, ms)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if self.current is not None:
+                self.current.counters[name] = self.current.counters.get(name, 0) + value
+
+    def finish(self, invocation: Invocation, status: int) -> dict:
+        """Закрывает вызов: в гистограммы попадают суммарное время каждого спана и total"""
+        total_ms = (time.perf_counter() - invocation.started) * 1000
+        with self.lock:
+            if self.current is invocation:
+                self.current = None
+            self.invocations += 1
+            for name, (ms, _) in invocation.spans.items():
+                self.histograms.setdefault(name, Histogram()).observe(ms)
+            self.histograms.setdefault('total', Histogram()).observe(total_ms)
+        line = {
+            'metric': 'invocation',
+            'function': invocation.function,
+            'status': status,
+            'total_ms': round(total_ms, 1),
+            'spans': {name: {'ms': round(ms, 1), 'n': n} for name, (ms, n) in invocation.spans.items()},
+            'counters': invocation.counters
+        }
+        for listener in self.listeners:
+            listener(line)
+        return line
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at),
+                'invocations': self.invocations,
+                'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+                'counters': dict(self.counters)
+            }
+
+registry = Registry()
+
+def increment(name: str, value: int = 1) -> None:
+    """Увеличивает счётчик (попадания в кэш, повторы, покупки) текущего вызова и контейнера"""
+    registry.increment(name, value)
+
+@contextmanager
+def span(name: str):
+    """Замеряет блок кода: steam_http, steam_rate_wait, db, json"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.span(name, (time.perf_counter() - started) * 1000)
+
+def dump_json(value, **kwargs) -> str:
+    """json.dumps тела ответа с замером сериализации"""
+    with span('json'):
+        return json.dumps(value, **kwargs)
+
+def should_log(status: int, total_ms: float) -> bool:
+    """Ошибки и медленные вызовы пишутся всегда, остальные — с вероятностью METRICS_LOG_SAMPLE"""
+    return status >= 500 or total_ms >= METRICS_SLOW_MS or random.random() < METRICS_LOG_SAMPLE
+
+def metrics_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(registry.snapshot()),
+        'isBase64Encoded': False
+    }
+
+def instrument(function: str):
+    """Оборачивает handler: замеряет вызов целиком, пишет одну компактную JSON-строку в лог
+    и отдаёт агрегированные гистограммы контейнера на GET ?metrics=1"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event: dict, context) -> dict:
+            params = event.get('queryStringParameters') or {}
+            if event.get('httpMethod') == 'GET' and params.get('metrics') == '1':
+                return metrics_response()
+
+            invocation = registry.begin(function)
+            status = 500
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode', 200)
+                return response
+            finally:
+                line = registry.finish(invocation, status)
+                if should_log(status, line['total_ms']):
+                    print(json.dumps(line, separators=(',', ':')))
+        return wrapper
+    return decorate
+
+class TimedCursorMixin:
+    def execute(self, query, vars=None):
+        with span('db'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with span('db'):
+            return super().executemany(query, vars_list)
+
+timed_cursors = {}
+
+def timed_cursor(cursor_factory):
+    """Подкласс курсора (обычного, RealDictCursor и т.д.), замеряющий запросы"""
+    timed = timed_cursors.get(cursor_factory)
+    if timed is None:
+        timed = timed_cursors[cursor_factory] = type(f'Timed{cursor_factory.__name__}', (TimedCursorMixin, cursor_factory), {})
+    return timed
+
+class TimedConnection(extensions.connection):
+    """Подключение psycopg2 (connection_factory), у которого запросы, commit и rollback попадают в спан db"""
+
+    def cursor(self, *args, **kwargs):
+        kwargs['cursor_factory'] = timed_cursor(kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        with span('db'):
+            return super().commit()
+
+    def rollback(self):
+        with span('db'):
+            return super().rollback()
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import increment
+
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '300'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '2000'))
+
+def matches(item: dict, words: list) -> bool:
+    """Все слова запроса встречаются в hash_name предмета"""
+    hash_name = item['hash_name'].lower()
+    return all(word in hash_name for word in words)
+
+class SearchCache:
+    """LRU+TTL кэш результатов поиска по нормализованному запросу.
+    Полный результат более широкого запроса-префикса отвечает на более узкий фильтрацией на месте"""
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: int = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'prefix_hits': 0, 'misses': 0}
+        self.latency_ms = {'hits': 0.0, 'prefix_hits': 0.0, 'misses': 0.0}
+
+    def lookup(self, key: tuple):
+        """Свежая запись (results, complete) по ключу (appid, запрос) или None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, results, complete = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return results, complete
+
+    def get(self, appid: int, key: str) -> tuple:
+        """Возвращает (results, статус): HIT, PREFIX или (None, MISS)"""
+        with self.lock:
+            entry = self.lookup((appid, key))
+            if entry is not None:
+                return entry[0], 'HIT'
+
+            # Ищем самый длинный закэшированный префикс с полным набором результатов
+            words = key.split()
+            for length in range(len(key) - 1, 0, -1):
+                entry = self.lookup((appid, key[:length].rstrip()))
+                if entry is not None and entry[1]:
+                    return [item for item in entry[0] if matches(item, words)], 'PREFIX'
+        return None, 'MISS'
+
+    def put(self, appid: int, key: str, results: list, complete: bool) -> None:
+        """Сохраняет результаты; complete — в них все предметы, подходящие под запрос"""
+        with self.lock:
+            self.entries[(appid, key)] = (time.monotonic(), results, complete)
+            self.entries.move_to_end((appid, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def observe(self, status: str, elapsed_ms: float) -> None:
+        """Учитывает исход запроса и его длительность"""
+        name = {'HIT': 'hits', 'PREFIX': 'prefix_hits'}.get(status, 'misses')
+        with self.lock:
+            self.counters[name] += 1
+            self.latency_ms[name] += elapsed_ms
+        increment(f'search_cache.{name}')
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = sum(self.counters.values())
+            return {
+                **self.counters,
+                'entries': len(self.entries),
+                'hit_ratio': round((self.counters['hits'] + self.counters['prefix_hits']) / lookups, 4) if lookups else 0.0,
+                'avg_latency_ms': {
+                    name: round(self.latency_ms[name] / count, 2) if count else 0.0
+                    for name, count in self.counters.items()
+                }
+            }
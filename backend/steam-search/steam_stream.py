@@ -0,0 +1,105 @@
+import codecs
+import json
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RESULT_FIELDS = ('name', 'hash_name', 'sell_price', 'sell_price_text', 'sell_listings')
+
+decoder = json.JSONDecoder()
+NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+def compact_item(item: dict) -> dict:
+    """Оставляет от результата поиска только нужные поля, описание предмета отбрасывается"""
+    compact = {field: item.get(field) for field in RESULT_FIELDS}
+    compact['icon_url'] = (item.get('asset_description') or {}).get('icon_url', '')
+    return compact
+
+class JsonStream:
+    """Читает JSON из файлоподобного потока кусками; в памяти держится не больше куска и одного значения"""
+
+    def __init__(self, stream, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Дочитывает следующий кусок, уже разобранная часть буфера отбрасывается"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk or b'', final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Следующий значимый символ без продвижения позиции"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON stream')
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at stream offset {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        """Разбирает одно значение целиком, дочитывая поток, пока оно не закончится"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # Число может продолжаться в следующем куске: за ним до конца буфера только символы числа
+                # ("1500." + "0", "1e" + "5") или буфер кончается прямо на нём
+                partial_number = (
+                    isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and all(char in NUMBER_CHARS for char in self.buffer[end:])
+                )
+                if self.eof or (end < len(self.buffer) and not partial_number):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+def iter_search_results(stream, meta: dict, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Генератор по массиву results ответа search/render: отдаёт предметы по одному в компактном виде.
+    Скалярные поля верхнего уровня (success, total_count, ...) складываются в meta"""
+    json_stream = JsonStream(stream, chunk_size)
+    json_stream.expect('{')
+    if json_stream.peek() == '}':
+        return
+    while True:
+        key = json_stream.value()
+        json_stream.expect(':')
+        if key == 'results' and json_stream.peek() == '[':
+            json_stream.expect('[')
+            if json_stream.peek() == ']':
+                json_stream.pos += 1
+            else:
+                while True:
+                    yield compact_item(json_stream.value())
+                    if json_stream.peek() == ']':
+                        json_stream.pos += 1
+                        break
+                    json_stream.expect(',')
+        else:
+            value = json_stream.value()
+            if not isinstance(value, (dict, list)):
+                meta[key] = value
+        if json_stream.peek() == '}':
+            return
+        json_stream.expect(',')
+
+def read_search_page(response) -> dict:
+    """Разбирает ответ search/render потоково: {success, total_count, ..., results: [компактные предметы]}"""
+    meta = {}
+    meta['results'] = list(iter_search_results(response, meta))
+    return meta
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+from metrics import TimedConnection
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+DB_POOL_VALIDATE_AFTER = float(os.environ.get('DB_POOL_VALIDATE_AFTER', '30'))
+
+db_pool = None
+pool_lock = threading.Lock()
+last_used = {}
+
+def database_url() -> str:
+    """DATABASE_POOLER_URL (локальный PgBouncer или аналог) имеет приоритет над прямым DATABASE_URL"""
+    return os.environ.get('DATABASE_POOLER_URL') or os.environ['DATABASE_URL']
+
+def connect():
+    """Создаёт отдельное подключение вне пула (для долгоживущих служебных соединений)"""
+    return psycopg2.connect(database_url(), connection_factory=TimedConnection)
+
+def get_pool():
+    """Пул создаётся один раз на контейнер и переживает вызовы тёплого контейнера.
+    Между вызовами держится до DB_POOL_MIN открытых соединений, всего не больше DB_POOL_MAX"""
+    global db_pool
+    with pool_lock:
+        if db_pool is None or db_pool.closed:
+            db_pool = pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, database_url(), connection_factory=TimedConnection)
+        return db_pool
+
+def is_alive(conn) -> bool:
+    """Проверяет соединение, простоявшее дольше DB_POOL_VALIDATE_AFTER секунд"""
+    if conn.closed:
+        return False
+    if time.monotonic() - last_used.get(id(conn), 0) < DB_POOL_VALIDATE_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_db_connection():
+    """Берёт подключение из пула, мёртвые соединения заменяются новыми"""
+    connections = get_pool()
+    for _ in range(DB_POOL_MAX + 1):
+        conn = connections.getconn()
+        if is_alive(conn):
+            return conn
+        last_used.pop(id(conn), None)
+        connections.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_db_connection(conn) -> None:
+    """Возвращает подключение в пул; сломанные соединения закрываются, autocommit сбрасывается"""
+    broken = bool(conn.closed)
+    if not broken and conn.autocommit:
+        conn.autocommit = False
+    if not broken and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    if broken:
+        last_used.pop(id(conn), None)
+    else:
+        last_used[id(conn)] = time.monotonic()
+    get_pool().putconn(conn, close=broken)
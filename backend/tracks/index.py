@@ -1,12 +1,217 @@
+import base64
+import hashlib
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from decimal import Decimal, InvalidOperation
+from psycopg2.extras import RealDictCursor, execute_values
+from db import get_db_connection, release_db_connection
+from fx_rates import BASE_CURRENCY, STEAM_CURRENCIES
+from metrics import dump_json, instrument
+from users import resolve_user_id, upsert_user, user_ids
 
-def get_db_connection():
-    """Создаёт подключение к базе данных"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+TRACK_FIELDS = (
+    'id', 'user_id', 'item_name', 'item_hash_name', 'item_image', 'current_price',
+    'target_price', 'status', 'auto_purchase', 'appid', 'currency', 'created_at', 'updated_at'
+)
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+# Наибольшее значение DECIMAL(10, 2)
+MAX_PRICE = Decimal('99999999.99')
+UPDATABLE_FIELDS = ('current_price', 'target_price', 'status', 'auto_purchase')
+DEFAULT_APPID = 730
 
+def encode_cursor(track: dict) -> str:
+    """Курсор keyset-пагинации: (created_at, id) последнего трека страницы"""
+    raw = json.dumps([track['created_at'].isoformat(), track['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбирает курсор, ValueError если он повреждён"""
+    try:
+        created_at, track_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return created_at, int(track_id)
+    except Exception as e:
+        raise ValueError('Invalid cursor') from e
+
+def list_etag(params: dict, tracks: list) -> str:
+    """Слабый ETag страницы списка: параметры запроса и (id, xmin) строк страницы вместе с лишней строкой,
+    по которой определяется следующая страница. xmin меняется при любой записи строки, поэтому тег меняется
+    вместе с телом ответа и X-Next-Cursor, а строки за пределами страницы на него не влияют"""
+    key = '&'.join(f'{name}={params[name]}' for name in sorted(params)) + '|' + ','.join(f"{t['id']}:{t['row_version']}" for t in tracks)
+    return f'W/"{hashlib.md5(key.encode("utf-8")).hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    return bool(if_none_match) and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')])
+
+def is_batch(body) -> bool:
+    """Пакетный запрос: объект со списками create / update / delete"""
+    return isinstance(body, dict) and any(isinstance(body.get(key), list) for key in ('create', 'update', 'delete'))
+
+def price_error(value, field: str, required: bool = True):
+    """Проверяет цену под DECIMAL(10, 2), возвращает текст ошибки или None"""
+    if value is None:
+        return f'{field} is required' if required else None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return f'{field} must be a number'
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        return f'{field} must be a number'
+    if not number.is_finite() or not 0 <= number <= MAX_PRICE:
+        return f'{field} is out of range'
+    return None
+
+def market_error(item: dict):
+    """Проверяет приложение и валюту трека; они задаются при создании и дальше не меняются"""
+    appid = item.get('appid', DEFAULT_APPID)
+    if isinstance(appid, bool) or not isinstance(appid, int) or appid <= 0:
+        return 'appid must be a positive integer'
+    if item.get('currency', BASE_CURRENCY) not in STEAM_CURRENCIES:
+        return f"currency must be one of {', '.join(STEAM_CURRENCIES)}"
+    return None
+
+def validate_create(item) -> str:
+    """Ошибка валидации создаваемого трека или None"""
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    for field in ('item_name', 'item_hash_name'):
+        if not isinstance(item.get(field), str) or not item[field] or len(item[field]) > 500:
+            return f'{field} is required'
+    if item.get('item_image') is not None and not isinstance(item['item_image'], str):
+        return 'item_image must be a string'
+    if 'status' in item and (not isinstance(item['status'], str) or not 0 < len(item['status']) <= 50):
+        return 'status is invalid'
+    return (
+        price_error(item.get('target_price'), 'target_price')
+        or price_error(item.get('current_price'), 'current_price', required=False)
+        or market_error(item)
+    )
+
+def validate_update(item) -> str:
+    """Ошибка валидации изменения трека или None"""
+    if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+        return 'id is required'
+    if not any(field in item for field in UPDATABLE_FIELDS):
+        return 'Nothing to update'
+    if 'target_price' in item and (error := price_error(item['target_price'], 'target_price')):
+        return error
+    if 'current_price' in item and (error := price_error(item['current_price'], 'current_price', required=False)):
+        return error
+    if 'status' in item and (not isinstance(item['status'], str) or not 0 < len(item['status']) <= 50):
+        return 'status is invalid'
+    if 'auto_purchase' in item and not isinstance(item['auto_purchase'], bool):
+        return 'auto_purchase must be a boolean'
+    return None
+
+def run_batch(cur, user_id: int, body: dict) -> dict:
+    """Выполняет пакет create / update / delete в одной транзакции: по одному запросу на каждый тип операции.
+    Ошибки валидации возвращаются по каждому элементу и не прерывают пакет"""
+    schema = os.environ['MAIN_DB_SCHEMA']
+    results = {'create': [], 'update': [], 'delete': []}
+
+    creates = []
+    for index, item in enumerate(body.get('create') or []):
+        error = validate_create(item)
+        if error:
+            results['create'].append({'index': index, 'success': False, 'error': error})
+        else:
+            creates.append((index, item))
+
+    if creates:
+        created = execute_values(
+            cur,
+            f"""
+            INSERT INTO {schema}.tracks 
+            (user_id, item_name, item_hash_name, item_image, current_price, target_price, status, appid, currency)
+            VALUES %s
+            RETURNING *
+            """,
+            [
+                (user_id, item['item_name'], item['item_hash_name'], item.get('item_image'),
+                 item.get('current_price'), item['target_price'], item.get('status', 'active'),
+                 item.get('appid', DEFAULT_APPID), item.get('currency', BASE_CURRENCY))
+                for _, item in creates
+            ],
+            page_size=len(creates),
+            fetch=True
+        )
+        # RETURNING одного многострочного INSERT отдаёт строки в порядке VALUES
+        for (index, _), track in zip(creates, created):
+            results['create'].append({'index': index, 'success': True, 'track': dict(track)})
+
+    updates = []
+    seen_ids = set()
+    for index, item in enumerate(body.get('update') or []):
+        error = validate_update(item)
+        if not error and item['id'] in seen_ids:
+            error = 'Duplicate id in batch'
+        if error:
+            results['update'].append({'index': index, 'success': False, 'error': error})
+        else:
+            seen_ids.add(item['id'])
+            updates.append((index, item))
+
+    if updates:
+        # Для каждого поля передаём флаг «задано», чтобы разные элементы могли менять разные поля
+        updated = execute_values(
+            cur,
+            f"""
+            UPDATE {schema}.tracks AS t SET
+                current_price = CASE WHEN v.set_current_price THEN v.current_price ELSE t.current_price END,
+                target_price = CASE WHEN v.set_target_price THEN v.target_price ELSE t.target_price END,
+                status = CASE WHEN v.set_status THEN v.status ELSE t.status END,
+                auto_purchase = CASE WHEN v.set_auto_purchase THEN v.auto_purchase ELSE t.auto_purchase END,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, user_id, set_current_price, current_price, set_target_price, target_price,
+                                 set_status, status, set_auto_purchase, auto_purchase)
+            WHERE t.id = v.id AND t.user_id = v.user_id
+            RETURNING t.*
+            """,
+            [
+                (item['id'], user_id,
+                 'current_price' in item, item.get('current_price'),
+                 'target_price' in item, item.get('target_price'),
+                 'status' in item, item.get('status'),
+                 'auto_purchase' in item, item.get('auto_purchase'))
+                for _, item in updates
+            ],
+            template='(%s::integer, %s::integer, %s, %s::numeric, %s, %s::numeric, %s, %s::varchar, %s, %s::boolean)',
+            page_size=len(updates),
+            fetch=True
+        )
+        updated_by_id = {track['id']: dict(track) for track in updated}
+        for index, item in updates:
+            track = updated_by_id.get(item['id'])
+            if track:
+                results['update'].append({'index': index, 'success': True, 'track': track})
+            else:
+                results['update'].append({'index': index, 'success': False, 'error': 'Track not found'})
+
+    deletes = []
+    for index, item in enumerate(body.get('delete') or []):
+        track_id = item.get('id') if isinstance(item, dict) else item
+        if isinstance(track_id, int) and not isinstance(track_id, bool):
+            deletes.append((index, track_id))
+        else:
+            results['delete'].append({'index': index, 'success': False, 'error': 'id is required'})
+
+    if deletes:
+        cur.execute(
+            f"DELETE FROM {schema}.tracks WHERE user_id = %s AND id = ANY(%s) RETURNING id",
+            (user_id, [track_id for _, track_id in deletes])
+        )
+        deleted_ids = {row['id'] for row in cur.fetchall()}
+        for index, track_id in deletes:
+            if track_id in deleted_ids:
+                results['delete'].append({'index': index, 'success': True, 'id': track_id})
+            else:
+                results['delete'].append({'index': index, 'success': False, 'error': 'Track not found'})
+
+    for key in results:
+        results[key].sort(key=lambda result: result['index'])
+    return results
+
+@instrument('tracks')
 def handler(event: dict, context) -> dict:
     """API для управления треками пользователя"""
     method = event.get('httpMethod', 'GET')
@@ -17,7 +222,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Id'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Id, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
@@ -51,37 +256,9 @@ def handler(event: dict, context) -> dict:
                 track_fields = {'current_price', 'target_price', 'status', 'auto_purchase'}
                 if not any(field in body for field in track_fields):
                     # Это запрос на обновление credentials
-                    update_fields = []
-                    values = []
-                    
-                    if 'steam_cookie' in body:
-                        update_fields.append('steam_cookie = %s')
-                        values.append(body['steam_cookie'])
-                    if 'steam_session_id' in body:
-                        update_fields.append('steam_session_id = %s')
-                        values.append(body['steam_session_id'])
-                    
-                    if update_fields:
-                        # Проверяем существует ли пользователь
-                        cur.execute(
-                            f"SELECT id FROM {os.environ['MAIN_DB_SCHEMA']}.users WHERE steam_id = %s",
-                            (steam_id,)
-                        )
-                        user = cur.fetchone()
-                        
-                        if not user:
-                            # Создаём пользователя если его нет
-                            cur.execute(
-                                f"INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.users (steam_id, username) VALUES (%s, %s)",
-                                (steam_id, f'User{steam_id[-4:]}')
-                            )
-                        
-                        values.append(steam_id)
-                        cur.execute(
-                            f"UPDATE {os.environ['MAIN_DB_SCHEMA']}.users SET {', '.join(update_fields)} WHERE steam_id = %s",
-                            values
-                        )
-                        conn.commit()
+                    credentials = {field: body[field] for field in ('steam_cookie', 'steam_session_id') if field in body}
+                    if credentials:
+                        upsert_user(cur, steam_id, credentials)
                         
                         return {
                             'statusCode': 200,
@@ -93,29 +270,26 @@ def handler(event: dict, context) -> dict:
                             'isBase64Encoded': False
                         }
         
-        cur.execute(
-            f"SELECT id FROM {os.environ['MAIN_DB_SCHEMA']}.users WHERE steam_id = %s",
-            (steam_id,)
-        )
-        user = cur.fetchone()
-        
-        if not user:
-            cur.execute(
-                f"INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.users (steam_id, username) VALUES (%s, %s) RETURNING id",
-                (steam_id, f'User{steam_id[-4:]}')
-            )
-            user = cur.fetchone()
-            conn.commit()
-        
-        user_id = user['id']
+        if method != 'GET':
+            user_id = resolve_user_id(cur, steam_id)
 
         if method == 'GET':
+            # Чтение не создаёт пользователя и не тратит на него отдельный запрос:
+            # id берётся из кэша контейнера или подзапросом внутри запроса треков.
+            # В autocommit после запроса не нужен откат при возврате подключения в пул
+            conn.autocommit = True
+            user_id = user_ids.get(steam_id)
+            if user_id is not None:
+                owner, owner_value = '%s', user_id
+            else:
+                owner, owner_value = f"(SELECT id FROM {os.environ['MAIN_DB_SCHEMA']}.users WHERE steam_id = %s)", steam_id
+
             track_id = event.get('queryStringParameters', {}).get('id')
             
             if track_id:
                 cur.execute(
-                    f"SELECT * FROM {os.environ['MAIN_DB_SCHEMA']}.tracks WHERE id = %s AND user_id = %s",
-                    (track_id, user_id)
+                    f"SELECT * FROM {os.environ['MAIN_DB_SCHEMA']}.tracks WHERE id = %s AND user_id = {owner}",
+                    (track_id, owner_value)
                 )
                 track = cur.fetchone()
                 
@@ -136,28 +310,124 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps(dict(track), default=str),
+                    'body': dump_json(dict(track), default=str),
                     'isBase64Encoded': False
                 }
             else:
-                cur.execute(
-                    f"SELECT * FROM {os.environ['MAIN_DB_SCHEMA']}.tracks WHERE user_id = %s ORDER BY created_at DESC",
-                    (user_id,)
-                )
+                params = event.get('queryStringParameters') or {}
+
+                fields = [f.strip() for f in params['fields'].split(',') if f.strip()] if params.get('fields') else list(TRACK_FIELDS)
+                unknown_fields = [f for f in fields if f not in TRACK_FIELDS]
+                try:
+                    limit = int(params['limit']) if params.get('limit') else None
+                    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+                except ValueError:
+                    limit = 0
+                    after = None
+
+                if unknown_fields or (limit is not None and not 1 <= limit <= MAX_PAGE_SIZE):
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': f'Invalid fields, limit (1-{MAX_PAGE_SIZE}) or cursor'}),
+                        'isBase64Encoded': False
+                    }
+
+                # id и created_at нужны для курсора, user_id — для кэша, даже если клиент их не запросил
+                columns = list(dict.fromkeys(fields + ['id', 'created_at', 'user_id']))
+                conditions = [f'user_id = {owner}']
+                values = [owner_value]
+
+                if params.get('status'):
+                    conditions.append('status = %s')
+                    values.append(params['status'])
+                if after:
+                    conditions.append('(created_at, id) < (%s, %s)')
+                    values.extend(after)
+
+                # Без оконных функций: keyset-страница читает по индексу только свои limit + 1 строк,
+                # а ETag считается по ним же, так что 304 экономит сериализацию и передачу тела
+                query = f"""
+                    SELECT {', '.join(columns)}, xmin::text AS row_version
+                    FROM {os.environ['MAIN_DB_SCHEMA']}.tracks
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY created_at DESC, id DESC
+                """
+                if limit is not None:
+                    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+                    query += ' LIMIT %s'
+                    values.append(limit + 1)
+
+                cur.execute(query, values)
                 tracks = cur.fetchall()
+                if tracks and user_id is None:
+                    user_ids.set(steam_id, tracks[0]['user_id'])
+
+                etag = list_etag(params, tracks)
+                request_headers = event.get('headers') or {}
+                if_none_match = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+                if etag_matches(if_none_match, etag):
+                    return {
+                        'statusCode': 304,
+                        'headers': {
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Expose-Headers': 'X-Next-Cursor, ETag',
+                            'Cache-Control': 'no-cache',
+                            'ETag': etag
+                        },
+                        'body': '',
+                        'isBase64Encoded': False
+                    }
+
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'X-Next-Cursor, ETag',
+                    'Cache-Control': 'no-cache',
+                    'ETag': etag
+                }
+                if limit is not None and len(tracks) > limit:
+                    tracks = tracks[:limit]
+                    headers['X-Next-Cursor'] = encode_cursor(tracks[-1])
                 
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': dump_json([{f: t[f] for f in fields} for t in tracks], default=str),
+                    'isBase64Encoded': False
+                }
+
+        elif method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+
+            if is_batch(body):
+                batch_size = sum(len(body.get(key) or []) for key in ('create', 'update', 'delete'))
+                if batch_size > MAX_BATCH_SIZE:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': f'Batch is limited to {MAX_BATCH_SIZE} items'}),
+                        'isBase64Encoded': False
+                    }
+
+                results = run_batch(cur, user_id, body)
+                conn.commit()
+
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps([dict(t) for t in tracks], default=str),
+                    'body': dump_json(results, default=str),
                     'isBase64Encoded': False
                 }
-
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
             
             required_fields = ['item_name', 'item_hash_name', 'target_price']
             if not all(field in body for field in required_fields):
@@ -171,11 +441,23 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
 
+            error = market_error(body)
+            if error:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+
             cur.execute(
                 f"""
                 INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.tracks 
-                (user_id, item_name, item_hash_name, item_image, current_price, target_price, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                (user_id, item_name, item_hash_name, item_image, current_price, target_price, status, appid, currency)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING *
                 """,
                 (
@@ -185,7 +467,9 @@ def handler(event: dict, context) -> dict:
                     body.get('item_image'),
                     body.get('current_price'),
                     body['target_price'],
-                    body.get('status', 'active')
+                    body.get('status', 'active'),
+                    body.get('appid', DEFAULT_APPID),
+                    body.get('currency', BASE_CURRENCY)
                 )
             )
             
@@ -198,7 +482,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(dict(new_track), default=str),
+                'body': dump_json(dict(new_track), default=str),
                 'isBase64Encoded': False
             }
 
@@ -267,7 +551,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(dict(updated_track), default=str),
+                'body': dump_json(dict(updated_track), default=str),
                 'isBase64Encoded': False
             }
 
@@ -339,4 +623,4 @@ def handler(event: dict, context) -> dict:
     finally:
         if conn:
             cur.close()
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+from metrics import increment
+
+USER_CACHE_MAX_ITEMS = int(os.environ.get('USER_CACHE_MAX_ITEMS', '10000'))
+
+class UserCache:
+    """LRU steam_id → users.id на контейнер: id пользователя не меняется, поэтому запись не устаревает"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, steam_id: str):
+        with self.lock:
+            user_id = self.entries.get(steam_id)
+            if user_id is not None:
+                self.entries.move_to_end(steam_id)
+        increment('user_cache.hits' if user_id is not None else 'user_cache.misses')
+        return user_id
+
+    def set(self, steam_id: str, user_id: int) -> None:
+        with self.lock:
+            self.entries[steam_id] = user_id
+            self.entries.move_to_end(steam_id)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+user_ids = UserCache(USER_CACHE_MAX_ITEMS)
+
+def default_username(steam_id: str) -> str:
+    return f'User{steam_id[-4:]}'
+
+def upsert_user(cur, steam_id: str, fields: dict = None) -> int:
+    """Создаёт пользователя или обновляет его поля (steam_cookie, steam_session_id) одним запросом и фиксирует, возвращает id"""
+    fields = fields or {}
+    columns = ['steam_id', 'username', *fields]
+    # Без полей обновлять нечего, но DO UPDATE нужен, чтобы RETURNING вернул id существующей строки
+    updates = [f'{column} = EXCLUDED.{column}' for column in fields] or ['steam_id = EXCLUDED.steam_id']
+    cur.execute(
+        f"""
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.users ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        ON CONFLICT (steam_id) DO UPDATE SET {', '.join(updates)}
+        RETURNING id
+        """,
+        (steam_id, default_username(steam_id), *fields.values())
+    )
+    row = cur.fetchone()
+    user_id = row['id'] if isinstance(row, dict) else row[0]
+    # Фиксируем сразу: откат остального запроса не должен отменить строку, id которой уже в кэше
+    cur.connection.commit()
+    user_ids.set(steam_id, user_id)
+    return user_id
+
+def resolve_user_id(cur, steam_id: str) -> int:
+    """id пользователя по steam_id: из кэша контейнера, иначе upsert (пользователь создаётся при первом обращении)"""
+    user_id = user_ids.get(steam_id)
+    if user_id is None:
+        user_id = upsert_user(cur, steam_id)
+    return user_id
+
+def find_user_id(cur, steam_id: str):
+    """id пользователя по steam_id без создания (для чтения): из кэша контейнера или запросом, None если его нет"""
+    user_id = user_ids.get(steam_id)
+    if user_id is None:
+        cur.execute(f"SELECT id FROM {os.environ['MAIN_DB_SCHEMA']}.users WHERE steam_id = %s", (steam_id,))
+        row = cur.fetchone()
+        if row is not None:
+            user_id = row['id'] if isinstance(row, dict) else row[0]
+            user_ids.set(steam_id, user_id)
+    return user_id
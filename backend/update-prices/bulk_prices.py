@@ -0,0 +1,107 @@
+import os
+from decimal import Decimal
+from fx_rates import BASE_CURRENCY, STEAM_CURRENCIES
+from metrics import increment
+from steam_http import STEAM_MARKET_URL, SteamHttpError, request_json
+from steam_stream import read_search_page
+
+# Меньше стольких непрокэшированных предметов приложения выгоднее поштучный priceoverview
+BULK_MIN_ITEMS = int(os.environ.get('BULK_MIN_ITEMS', '50'))
+BULK_MAX_PAGES = int(os.environ.get('BULK_MAX_PAGES', '300'))
+BULK_PAGE_SIZE = 100
+# Страница поиска стоит одного запроса к Steam, как priceoverview одного предмета: листаем, пока последние
+# BULK_YIELD_WINDOW страниц находят в среднем не меньше BULK_MIN_PAGE_YIELD отслеживаемых предметов. Тогда все
+# запросы обновления не больше, чем поштучных запросов плюс BULK_YIELD_WINDOW страниц на приложение
+BULK_YIELD_WINDOW = int(os.environ.get('BULK_YIELD_WINDOW', '10'))
+BULK_MIN_PAGE_YIELD = float(os.environ.get('BULK_MIN_PAGE_YIELD', '1.5'))
+# search/render с norender=1 отдаёт sell_price в центах USD независимо от валюты запроса
+SEARCH_PRICE_CURRENCY = 'USD'
+# Оценки из поиска кэшируются отдельно от ответов priceoverview, которые читает и steam-price
+SEARCH_CACHE_CURRENCY = 'search'
+STEAM_SEARCH_HEADERS = {
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://steamcommunity.com/market/'
+}
+
+def fetch_search_page(appid: int, start: int) -> dict:
+    """Страница каталога приложения по популярности, до BULK_PAGE_SIZE предметов с ценами"""
+    search_url = f'{STEAM_MARKET_URL}/search/render/?query=&start={start}&count={BULK_PAGE_SIZE}&search_descriptions=0&sort_column=popular&sort_dir=desc&appid={appid}&norender=1'
+    return request_json(search_url, headers=STEAM_SEARCH_HEADERS, timeout=15, parse=read_search_page)
+
+def search_prices(appid: int, names: set) -> tuple:
+    """Листает каталог приложения, пока не найдены все names, не кончился каталог или BULK_MAX_PAGES.
+    Каталог отсортирован по популярности, и отслеживаемые предметы встречаются всё реже: листание прекращается,
+    когда последние BULK_YIELD_WINDOW страниц нашли меньше BULK_MIN_PAGE_YIELD предметов на страницу,
+    или когда страниц запрошено не меньше, чем осталось ненайденных предметов — дальше поштучный
+    priceoverview дешевле. Возвращает ({hash_name: sell_price в центах USD или None без лотов}, страниц)"""
+    found = {}
+    yields = []
+    start = 0
+    while len(found) < len(names) and len(yields) < BULK_MAX_PAGES and len(yields) < len(names) - len(found):
+        if len(yields) >= BULK_YIELD_WINDOW and sum(yields[-BULK_YIELD_WINDOW:]) < BULK_MIN_PAGE_YIELD * BULK_YIELD_WINDOW:
+            break
+        try:
+            page = fetch_search_page(appid, start)
+        except SteamHttpError as e:
+            print(f"Bulk pricing stopped for appid {appid} at {start}: {e}")
+            break
+        before = len(found)
+        results = page.get('results') or []
+        for item in results:
+            hash_name = item.get('hash_name')
+            if hash_name in names and hash_name not in found:
+                # Без лотов priceoverview тоже ответил бы без цены
+                found[hash_name] = item.get('sell_price') if item.get('sell_listings') else None
+        yields.append(len(found) - before)
+        start += BULK_PAGE_SIZE
+        if not results or start >= (page.get('total_count') or 0):
+            break
+    increment('bulk_prices.pages', len(yields))
+    increment('bulk_prices.items', len(found))
+    return found, len(yields)
+
+def fetch_bulk_prices(items: list, price_cache, cache_key, fx_rates) -> tuple:
+    """Покрывает большие наборы предметов (appid, item_hash_name) без поштучных запросов: свежими записями
+    кэша цен priceoverview и оценками из страниц search/render по BULK_PAGE_SIZE предметов.
+    Оценка — цена в USD по курсу, а не в базовой валюте Steam, поэтому её нельзя выдавать за ответ
+    priceoverview: она кэшируется под отдельным ключом, а решения по целевой цене принимаются только
+    после подтверждения через priceoverview (см. update-prices/index.py).
+    Возвращает ({предмет: данные priceoverview}, {предмет: оценка Decimal в SEARCH_PRICE_CURRENCY или None
+    без лотов}, страниц поиска); остальные предметы нужно запросить поштучно"""
+    by_appid = {}
+    for appid, name in items:
+        by_appid.setdefault(appid, []).append(name)
+
+    cached = {}
+    estimates = {}
+    pages = 0
+    if fx_rates.exchange(Decimal(1), SEARCH_PRICE_CURRENCY, BASE_CURRENCY) is None:
+        print(f"Bulk pricing skipped: no {SEARCH_PRICE_CURRENCY} exchange rate")
+        return cached, estimates, pages
+
+    currency = STEAM_CURRENCIES[BASE_CURRENCY]
+    for appid, names in by_appid.items():
+        if len(names) < BULK_MIN_ITEMS:
+            continue
+        missing = set()
+        for name in names:
+            data = price_cache.peek(cache_key(appid, name, currency))
+            if data is not None:
+                cached[(appid, name)] = data
+                continue
+            estimate = price_cache.peek(cache_key(appid, name, SEARCH_CACHE_CURRENCY))
+            if estimate is not None:
+                estimates[(appid, name)] = Decimal(estimate['sell_price']) / 100
+            else:
+                missing.add(name)
+        if len(missing) < BULK_MIN_ITEMS:
+            continue
+
+        found, app_pages = search_prices(appid, missing)
+        pages += app_pages
+        for name, sell_price in found.items():
+            if sell_price:
+                price_cache.put(cache_key(appid, name, SEARCH_CACHE_CURRENCY), {'sell_price': sell_price})
+            estimates[(appid, name)] = Decimal(sell_price) / 100 if sell_price else None
+    return cached, estimates, pages
@@ -1,82 +1,485 @@
 import json
 import os
-import urllib.request
+import time
 import urllib.parse
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import RealDictCursor, execute_values
+from bulk_prices import SEARCH_PRICE_CURRENCY, fetch_bulk_prices
+from db import connect, get_db_connection, release_db_connection
+from fx_rates import BASE_CURRENCY, STEAM_CURRENCIES, FxRates
+from metrics import dump_json, increment, instrument
+from notifications import notify, price_drop_notification
+from price_cache import cache_key, create_price_cache
+from price_parser import parse_price
+from purchase_outbox import drain_outbox, enqueue_purchases
+from scheduler import SCHEDULER_BUDGET, plan
+from steam_http import STEAM_MARKET_URL, STEAM_MAX_WAIT, SteamHttpError, request_json
+from users import resolve_user_id
 
-def get_db_connection():
-    """Создаёт подключение к базе данных"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+PRICE_FETCH_CONCURRENCY = int(os.environ.get('PRICE_FETCH_CONCURRENCY', '8'))
 
-def get_steam_price(item_hash_name: str) -> float:
-    """Получает актуальную цену предмета из Steam Market"""
+TRACK_COLUMNS = (
+    't.id, t.user_id, t.item_name, t.item_hash_name, t.item_image, t.current_price, '
+    't.target_price, t.auto_purchase, t.appid, t.currency, u.steam_cookie, u.steam_session_id'
+)
+
+price_cache = create_price_cache(connect)
+fx_rates = FxRates(connect)
+
+def fetch_price_overview(appid: int, item_hash_name: str, deadline: float = None) -> dict:
+    """Запрашивает priceoverview предмета в базовой валюте, None если цены нет.
+    Ограничение скорости и недоступность Steam пробрасываются как SteamHttpError"""
     try:
-        price_url = f'https://steamcommunity.com/market/priceoverview/?appid=730&currency=5&market_hash_name={urllib.parse.quote(item_hash_name)}'
-        
-        req = urllib.request.Request(price_url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-        
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-        
-        print(f"Steam API response for {item_hash_name}: {data}")
-        
-        if data.get('success'):
-            lowest_price = data.get('lowest_price', '')
-            if lowest_price:
-                import re
-                price_match = re.search(r'[\d\s]+[,\.]?\d*', lowest_price)
-                if price_match:
-                    price_str = price_match.group(0).replace(' ', '').replace(',', '.')
-                    try:
-                        price_rub = float(price_str)
-                        print(f"Parsed price: {price_rub}₽")
-                        return price_rub
-                    except ValueError:
-                        print(f"Failed to parse price: {price_str}")
-                        return None
-        
-        print(f"No valid price found in response")
+        price_url = f'{STEAM_MARKET_URL}/priceoverview/?appid={appid}&currency={STEAM_CURRENCIES[BASE_CURRENCY]}&market_hash_name={urllib.parse.quote(item_hash_name)}'
+        data = request_json(price_url, timeout=10, deadline=deadline)
+
+        if data.get('success') and data.get('lowest_price'):
+            return data
+
+        increment('steam_http.no_price')
         return None
+    except SteamHttpError:
+        raise
     except Exception as e:
         print(f"Error fetching price for {item_hash_name}: {e}")
         return None
 
-def purchase_item(item_hash_name: str, price: float, steam_cookie: str, session_id: str) -> dict:
-    """Создает заявку на покупку предмета на Steam Market"""
+def get_steam_price(appid: int, item_hash_name: str, deadline: float = None) -> tuple:
+    """Получает актуальную цену предмета в базовой валюте через общий кэш цен.
+    Возвращает (цена Decimal, статус кэша)"""
+    data, cache_status = price_cache.get_or_fetch(
+        cache_key(appid, item_hash_name, STEAM_CURRENCIES[BASE_CURRENCY]),
+        lambda: fetch_price_overview(appid, item_hash_name, deadline)
+    )
+    return overview_price(data), cache_status
+
+def overview_price(data: dict):
+    """Цена Decimal из ответа priceoverview (или записи кэша цен), None если цены нет"""
+    if not data or not data.get('lowest_price'):
+        return None
+
+    price = parse_price(data['lowest_price'])
+    if price is None:
+        print(f"Failed to parse price: {data['lowest_price']!r}")
+    return price
+
+def fetch_price(item: tuple, deadline: float = None) -> tuple:
+    """Цена предмета (appid, item_hash_name) в базовой валюте.
+    Возвращает (цена, ошибка, свежая) — ошибка заполняется, если Steam ограничил или недоступен,
+    свежая — цена только что получена из Steam, а не из кэша"""
     try:
-        purchase_url = 'https://steamcommunity.com/market/createbuyorder/'
-        
-        purchase_data = {
-            'sessionid': session_id,
-            'currency': 5,
-            'appid': 730,
-            'market_hash_name': item_hash_name,
-            'price_total': int(price * 100),
-            'quantity': 1
-        }
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Cookie': f'steamLoginSecure={steam_cookie}; sessionid={session_id}',
-            'Referer': f'https://steamcommunity.com/market/listings/730/{urllib.parse.quote(item_hash_name)}',
-            'Origin': 'https://steamcommunity.com'
+        price, cache_status = get_steam_price(*item, deadline)
+        return price, None, cache_status in ('MISS', 'REFRESH')
+    except SteamHttpError as e:
+        print(f"Error fetching price for {item[1]}: {e}")
+        return None, str(e), False
+
+def fetch_individually(items: list, prices: dict, failures: dict, fresh: dict) -> int:
+    """Запрашивает предметы поштучно через priceoverview параллельно, не больше PRICE_FETCH_CONCURRENCY
+    запросов одновременно, и дописывает результаты в prices, failures и fresh. Возвращает число запросов.
+    Токены лимита скорости все предметы ждут в пределах общих STEAM_MAX_WAIT: когда бюджет кончился,
+    оставшиеся непрокэшированные предметы сразу получают ошибку, а не ждут по STEAM_MAX_WAIT каждый"""
+    if not items:
+        return 0
+    workers = max(1, min(PRICE_FETCH_CONCURRENCY, len(items)))
+    deadline = time.monotonic() + STEAM_MAX_WAIT
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda item: fetch_price(item, deadline), items))
+
+    for item, (price, error, is_fresh) in zip(items, results):
+        prices[item] = price
+        if error:
+            failures[item] = error
+        if is_fresh and price is not None:
+            fresh[item] = price
+    return len(items)
+
+def fetch_prices(items: list) -> tuple:
+    """Получает цены для списка предметов (appid, item_hash_name) в базовой валюте, независимо от валют треков.
+    Большие наборы сначала покрываются кэшем и страницами search/render по BULK_PAGE_SIZE предметов,
+    остальное запрашивается поштучно через priceoverview.
+    Возвращает (цены, ошибки, свежие цены, оценки, запросов к Steam) — словари по (appid, item_hash_name).
+    Оценки — цены из поиска в SEARCH_PRICE_CURRENCY: по ним показывается цена трека, но в историю цен они
+    не пишутся и целевую цену не проверяют, пока их не подтвердит confirm_estimates"""
+    unique_items = list(dict.fromkeys(items))
+    if not unique_items:
+        return {}, {}, {}, {}, 0
+
+    cached, estimates, pages = fetch_bulk_prices(unique_items, price_cache, cache_key, fx_rates)
+    prices = {item: overview_price(data) for item, data in cached.items()}
+    failures, fresh, estimated = {}, {}, {}
+    for item, estimate in estimates.items():
+        prices[item] = fx_rates.exchange(estimate, SEARCH_PRICE_CURRENCY, BASE_CURRENCY) if estimate is not None else None
+        if estimate is not None:
+            estimated[item] = estimate
+
+    calls = fetch_individually([item for item in unique_items if item not in prices], prices, failures, fresh)
+    return prices, failures, fresh, estimated, pages + calls
+
+def track_price(item: tuple, currency: str, prices: dict, estimated: dict):
+    """Цена предмета в валюте трека, None если цены или курса нет. Оценка из поиска пересчитывается
+    из своей валюты напрямую, без промежуточного округления в базовой"""
+    if item in estimated:
+        return fx_rates.exchange(estimated[item], SEARCH_PRICE_CURRENCY, currency)
+    base_price = prices.get(item)
+    return fx_rates.convert(base_price, currency) if base_price is not None else None
+
+def estimated_hits(rows: list, prices: dict, estimated: dict) -> list:
+    """Предметы, чья оценка из поиска не выше целевой цены строки — трека или группы треков
+    (тогда target_price — наибольшая цель группы)"""
+    hits = []
+    for row in rows:
+        item = track_item(row)
+        if item in estimated:
+            price = track_price(item, row['currency'], prices, estimated)
+            if price is not None and price <= row['target_price']:
+                hits.append(item)
+    return list(dict.fromkeys(hits))
+
+def confirm_estimates(items: list, prices: dict, failures: dict, fresh: dict, estimated: dict) -> int:
+    """Перепроверяет оценки из поиска через priceoverview: ответ заменяет оценку и дальше участвует
+    в истории цен, уведомлениях и автопокупке. Если Steam не ответил, оценка остаётся в estimated, а ошибка
+    попадает в failures: такую цену не записываем, иначе следующее обновление не увидит пересечения цели.
+    Возвращает число запросов"""
+    confirmed, confirm_failures, confirmed_fresh = {}, {}, {}
+    calls = fetch_individually(items, confirmed, confirm_failures, confirmed_fresh)
+    for item in items:
+        if item in confirm_failures:
+            failures[item] = confirm_failures[item]
+            continue
+        prices[item] = confirmed[item]
+        estimated.pop(item, None)
+        if item in confirmed_fresh:
+            fresh[item] = confirmed_fresh[item]
+    increment('bulk_prices.confirmed', len(items) - len(confirm_failures))
+    return calls
+
+def track_item(track: dict) -> tuple:
+    return track['appid'], track['item_hash_name']
+
+def record_price_history(cur, prices: dict) -> None:
+    """Дописывает свежие цены (в базовой валюте) в price_history — одна строка на предмет, а не на трек.
+    Заодно отмечает время проверки предмета для планировщика"""
+    if not prices:
+        return
+
+    execute_values(
+        cur,
+        f"""
+        WITH v(appid, hash_name, price_cents) AS (VALUES %s),
+        items AS (
+            INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.market_items (appid, hash_name, last_checked_at)
+            SELECT appid, hash_name, LOCALTIMESTAMP FROM v
+            ON CONFLICT (appid, hash_name) DO UPDATE SET last_checked_at = EXCLUDED.last_checked_at
+            RETURNING id, appid, hash_name
+        )
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.price_history (item_id, price_cents, recorded_at)
+        SELECT i.id, v.price_cents, now() AT TIME ZONE 'UTC'
+        FROM v
+        JOIN items i ON i.appid = v.appid AND i.hash_name = v.hash_name
+        """,
+        [(appid, name, int(price * 100)) for (appid, name), price in prices.items()],
+        template='(%s::integer, %s, %s::integer)',
+        page_size=1000
+    )
+
+def handle_target_hits(cur, hits: list) -> tuple:
+    """Обрабатывает треки, достигшие целевой цены: уведомление о снижении (в ответе и в notifications)
+    и постановка автопокупки в outbox.
+    Сама заявка в Steam уходит позже исполнителем outbox (mode=purchases), обновление цен её не ждёт.
+    hit — строка трека (TRACK_COLUMNS) с new_price в валюте трека. Возвращает (price_drops, purchases_queued)"""
+    price_drops = []
+    purchase_hits = []
+    notifications = []
+
+    for hit in hits:
+        # Уведомляем только о пересечении цели: пока цена остаётся ниже, каждое обновление снова даёт hit
+        if hit['current_price'] is None or hit['current_price'] > hit['target_price']:
+            notifications.append(price_drop_notification(hit))
+        price_drops.append({
+            'track_id': hit['id'],
+            'item_name': hit['item_hash_name'],
+            'old_price': float(hit['current_price']) if hit['current_price'] else 0,
+            'new_price': float(hit['new_price']),
+            'target_price': float(hit['target_price']),
+            'currency': hit['currency']
+        })
+        if hit.get('auto_purchase') and hit['steam_cookie'] and hit['steam_session_id']:
+            purchase_hits.append(hit)
+
+    notify(cur, notifications)
+    queued = set(enqueue_purchases(cur, purchase_hits))
+    purchases_queued = [
+        {
+            'track_id': hit['id'],
+            'item_name': hit['item_hash_name'],
+            'price': float(hit['new_price']),
+            'currency': hit['currency']
         }
-        
-        data = urllib.parse.urlencode(purchase_data).encode('utf-8')
-        req = urllib.request.Request(purchase_url, data=data, headers=headers, method='POST')
-        
-        with urllib.request.urlopen(req, timeout=15) as response:
-            result = json.loads(response.read().decode('utf-8'))
-        
-        print(f"Purchase response for {item_hash_name}: {result}")
-        return result
-    except Exception as e:
-        print(f"Error purchasing {item_hash_name}: {e}")
-        return {'success': 0, 'message': str(e)}
+        for hit in purchase_hits if hit['id'] in queued
+    ]
+    return price_drops, purchases_queued
 
+def process_tracks(cur, tracks: list, prices: dict, failures: dict = None, estimated: dict = None) -> dict:
+    """Применяет полученные цены к трекам одного пользователя: обновляет цену, проверяет целевую цену и автопокупку.
+    Неподтверждённые оценки из поиска (estimated) обновляют только цену трека и только выше целевой:
+    оценка не выше цели без подтверждения priceoverview оставляет прежнюю цену и попадает в ошибки.
+    Все записи в БД копятся в памяти и отправляются пачками в конце"""
+    estimated = estimated or {}
+    price_updates = []
+    hits = []
+    errors = []
+
+    for track in tracks:
+        base_price = prices.get(track_item(track))
+        new_price = track_price(track_item(track), track['currency'], prices, estimated)
+
+        if base_price is not None and new_price is None:
+            errors.append({
+                'track_id': track['id'],
+                'item_name': track['item_hash_name'],
+                'error': f"No exchange rate for {track['currency']}"
+            })
+        elif new_price is not None and track_item(track) in estimated and new_price <= track['target_price']:
+            errors.append({
+                'track_id': track['id'],
+                'item_name': track['item_hash_name'],
+                'error': (failures or {}).get(track_item(track), 'Price estimate not confirmed')
+            })
+        elif new_price is not None:
+            # Неизменившуюся цену не переписываем: время проверки хранится в market_items.last_checked_at
+            if new_price != track['current_price']:
+                price_updates.append((track['id'], new_price))
+            if new_price <= track['target_price'] and track_item(track) not in estimated:
+                hits.append({**track, 'new_price': new_price})
+        else:
+            errors.append({
+                'track_id': track['id'],
+                'item_name': track['item_hash_name'],
+                'error': (failures or {}).get(track_item(track), 'Failed to fetch price')
+            })
+
+    if price_updates:
+        execute_values(
+            cur,
+            f"""
+            UPDATE {os.environ['MAIN_DB_SCHEMA']}.tracks AS t
+            SET current_price = v.price, updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, price)
+            WHERE t.id = v.id
+            """,
+            price_updates,
+            template='(%s, %s::numeric)',
+            page_size=1000
+        )
+
+    price_drops, purchases_queued = handle_target_hits(cur, hits)
+
+    return {
+        # updated — треки с полученной ценой; из них changed переписаны, unchanged остались прежними
+        'updated': len(tracks) - len(errors),
+        'changed': len(price_updates),
+        'unchanged': len(tracks) - len(price_updates) - len(errors),
+        'total': len(tracks),
+        'price_drops': price_drops,
+        # Заявки создаёт исполнитель outbox, поэтому в ответе обновления выполненных покупок нет;
+        # ключ сохранён ради стабильной формы ответа, поставленные заявки — в purchases_queued
+        'purchases_made': [],
+        'purchases_queued': purchases_queued,
+        'errors': errors
+    }
+
+def find_target_hits(cur, item_prices: list) -> list:
+    """Одним запросом находит все активные треки, для которых свежая цена не выше целевой.
+    item_prices — строки (appid, item_hash_name, currency, цена); соединение идёт по частичному индексу
+    активных треков (item_hash_name, target_price), так что сравнение цен делает Postgres, а не цикл в Python"""
+    if not item_prices:
+        return []
+    return execute_values(
+        cur,
+        f"""
+        SELECT {TRACK_COLUMNS}, v.price AS new_price
+        FROM (VALUES %s) AS v(appid, item_hash_name, currency, price)
+        JOIN {os.environ['MAIN_DB_SCHEMA']}.tracks t
+            ON t.item_hash_name = v.item_hash_name AND t.target_price >= v.price
+            AND t.status = 'active' AND t.appid = v.appid AND t.currency = v.currency
+        JOIN {os.environ['MAIN_DB_SCHEMA']}.users u ON u.id = t.user_id
+        """,
+        item_prices,
+        template='(%s::integer, %s, %s, %s::numeric)',
+        page_size=len(item_prices),
+        fetch=True
+    )
+
+def apply_item_prices(cur, item_prices: list) -> int:
+    """Записывает цены активным трекам предметов, у которых цена изменилась, возвращает число обновлённых треков.
+    Треки с той же ценой не трогаются (ни строки, ни WAL): время проверки хранится в market_items.last_checked_at"""
+    if not item_prices:
+        return 0
+    execute_values(
+        cur,
+        f"""
+        UPDATE {os.environ['MAIN_DB_SCHEMA']}.tracks AS t
+        SET current_price = v.price, updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(appid, item_hash_name, currency, price)
+        WHERE t.appid = v.appid AND t.item_hash_name = v.item_hash_name
+          AND t.currency = v.currency AND t.status = 'active'
+          AND t.current_price IS DISTINCT FROM v.price
+        """,
+        item_prices,
+        template='(%s::integer, %s, %s, %s::numeric)',
+        page_size=len(item_prices)
+    )
+    return cur.rowcount
+
+def mark_checked(cur, items: list) -> None:
+    """Отмечает предметы проверенными без записи цены, чтобы планировщик не выбирал их снова сразу"""
+    if not items:
+        return
+    execute_values(
+        cur,
+        f"""
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.market_items (appid, hash_name, last_checked_at)
+        VALUES %s
+        ON CONFLICT (appid, hash_name) DO UPDATE SET last_checked_at = EXCLUDED.last_checked_at
+        """,
+        items,
+        template='(%s, %s, LOCALTIMESTAMP)',
+        page_size=1000
+    )
+
+def load_schedule_candidates(cur) -> list:
+    """Предметы активных треков с признаками для приоритета: возраст последней проверки, ближайший
+    к целевой цене трек (доля от целевой), автопокупка и коэффициент вариации цены за сутки"""
+    cur.execute(
+        f"""
+        WITH items AS (
+            SELECT appid, item_hash_name,
+                   MIN((current_price - target_price) / NULLIF(target_price, 0))::float8 AS target_gap,
+                   BOOL_OR(COALESCE(auto_purchase, FALSE)) AS auto_purchase
+            FROM {os.environ['MAIN_DB_SCHEMA']}.tracks
+            WHERE status = 'active'
+            GROUP BY appid, item_hash_name
+        )
+        SELECT i.appid, i.item_hash_name, i.target_gap, i.auto_purchase,
+               EXTRACT(EPOCH FROM (LOCALTIMESTAMP - m.last_checked_at))::float8 AS age,
+               v.volatility
+        FROM items i
+        LEFT JOIN {os.environ['MAIN_DB_SCHEMA']}.market_items m
+            ON m.appid = i.appid AND m.hash_name = i.item_hash_name
+        LEFT JOIN LATERAL (
+            SELECT (STDDEV_POP(h.price_cents) / NULLIF(AVG(h.price_cents), 0))::float8 AS volatility
+            FROM {os.environ['MAIN_DB_SCHEMA']}.price_history h
+            WHERE h.item_id = m.id AND h.recorded_at >= (now() AT TIME ZONE 'UTC') - INTERVAL '1 day'
+        ) v ON TRUE
+        """
+    )
+    return cur.fetchall()
+
+def refresh_all(cur, items: list = None) -> dict:
+    """Глобальное обновление: каждый уникальный предмет запрашивается в Steam один раз для всех пользователей.
+    items — список (appid, item_hash_name), по умолчанию все предметы активных треков.
+    Треки целиком в Python не загружаются: цены пишутся и сравниваются с целевыми на стороне БД"""
+    if items is None:
+        item_filter, params = '', ()
+    else:
+        item_filter = 'AND (appid, item_hash_name) IN (SELECT * FROM unnest(%s::integer[], %s::text[]))'
+        params = ([appid for appid, _ in items], [name for _, name in items])
+
+    cur.execute(
+        f"""
+        SELECT appid, item_hash_name, currency, COUNT(*) AS tracks, COUNT(DISTINCT user_id) AS users,
+               MAX(target_price) AS target_price
+        FROM {os.environ['MAIN_DB_SCHEMA']}.tracks
+        WHERE status = 'active' {item_filter}
+        GROUP BY appid, item_hash_name, currency
+        """,
+        params
+    )
+    groups = cur.fetchall()
+    items = list(dict.fromkeys(track_item(group) for group in groups))
+
+    prices, failures, fresh, estimated, upstream_calls = fetch_prices(items)
+    # Оценку из поиска, достигшую чьей-то цели, подтверждаем до уведомлений и автопокупки
+    upstream_calls += confirm_estimates(estimated_hits(groups, prices, estimated), prices, failures, fresh, estimated)
+    record_price_history(cur, fresh)
+    # Предметы без цены и с оценкой из поиска тоже считаются проверенными; ограниченные Steam
+    # и неподтверждённые оценки не выше цели остаются в очереди планировщика
+    mark_checked(cur, [
+        item for item in items
+        if item not in failures and (prices.get(item) is None or item in estimated)
+    ])
+
+    # Одна строка на сочетание предмета и валюты: цена в базовой валюте пересчитывается по курсу
+    item_prices = []
+    errors = []
+    for group in groups:
+        item = track_item(group)
+        base_price = prices.get(item)
+        price = track_price(item, group['currency'], prices, estimated)
+        unconfirmed = item in estimated and price is not None and price <= group['target_price']
+        if price is not None and not unconfirmed:
+            item_prices.append((*item, group['currency'], price))
+            continue
+        if unconfirmed:
+            # Прежняя цена остаётся, пока priceoverview не подтвердит оценку, иначе уведомление потеряется
+            error = failures.get(item, 'Price estimate not confirmed')
+        elif base_price is not None:
+            error = f"No exchange rate for {group['currency']}"
+        else:
+            error = failures.get(item, 'Failed to fetch price')
+        errors.append({
+            'item_name': group['item_hash_name'],
+            'appid': group['appid'],
+            'currency': group['currency'],
+            'tracks': group['tracks'],
+            'error': error
+        })
+
+    # Сначала находим сработавшие треки (со старой ценой для уведомления), затем обновляем цены
+    hits = find_target_hits(cur, [row for row in item_prices if tuple(row[:2]) not in estimated])
+    changed = apply_item_prices(cur, item_prices)
+    price_drops, purchases_queued = handle_target_hits(cur, hits)
+
+    # Поштучное обновление по пользователям запросило бы каждый предмет один раз на пользователя
+    per_user_calls = sum(group['users'] for group in groups)
+    priced = sum(group['tracks'] for group in groups) - sum(error['tracks'] for error in errors)
+    return {
+        'updated': priced,
+        'changed': changed,
+        'unchanged': priced - changed,
+        'total': sum(group['tracks'] for group in groups),
+        'price_drops': price_drops,
+        'purchases_made': [],
+        'purchases_queued': purchases_queued,
+        'errors': errors,
+        'items': len(items),
+        'upstream_calls': upstream_calls,
+        'upstream_calls_saved': max(0, per_user_calls - upstream_calls),
+        'failed_items': len(failures)
+    }
+
+def run_scheduler_tick(cur) -> dict:
+    """Один такт планировщика (вызывается по расписанию): обновляет столько самых приоритетных предметов,
+    сколько позволяет бюджет запросов к Steam на такт, остальные ждут следующего такта"""
+    candidates = load_schedule_candidates(cur)
+    planned = plan(candidates, SCHEDULER_BUDGET)
+    items = [track_item(candidate) for candidate in planned]
+
+    result = refresh_all(cur, items) if items else {
+        'updated': 0, 'changed': 0, 'unchanged': 0, 'total': 0, 'price_drops': [], 'purchases_made': [],
+        'purchases_queued': [], 'errors': [], 'items': 0, 'upstream_calls': 0, 'upstream_calls_saved': 0, 'failed_items': 0
+    }
+
+    ages = [candidate['age'] for candidate in candidates if candidate['age'] is not None]
+    result['budget'] = SCHEDULER_BUDGET
+    result['candidates'] = len(candidates)
+    result['backlog'] = len(candidates) - len(planned)
+    result['never_checked'] = len(candidates) - len(ages)
+    result['max_age_seconds'] = round(max(ages), 1) if ages else None
+    return result
+
+@instrument('update-prices')
 def handler(event: dict, context) -> dict:
     """API для обновления цен всех активных треков"""
     method = event.get('httpMethod', 'GET')
@@ -87,7 +490,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Id'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Id, X-Refresh-Token'
             },
             'body': '',
             'isBase64Encoded': False
@@ -104,7 +507,63 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    steam_id = event.get('headers', {}).get('X-Steam-Id') or event.get('headers', {}).get('x-steam-id')
+    headers = event.get('headers') or {}
+    mode = (event.get('queryStringParameters') or {}).get('mode', 'user')
+
+    if mode in ('global', 'scheduler', 'purchases'):
+        # Глобальное обновление, такт планировщика и исполнитель outbox автопокупок (cron)
+        # затрагивают всех пользователей, поэтому доступны только по секретному токену
+        refresh_token = headers.get('X-Refresh-Token') or headers.get('x-refresh-token')
+        if not os.environ.get('REFRESH_TOKEN') or refresh_token != os.environ['REFRESH_TOKEN']:
+            return {
+                'statusCode': 403,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+
+        conn = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            if mode == 'purchases':
+                result = drain_outbox(connect, cur)
+            else:
+                result = refresh_all(cur) if mode == 'global' else run_scheduler_tick(cur)
+            conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': dump_json(result),
+                'isBase64Encoded': False
+            }
+
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        finally:
+            if conn:
+                cur.close()
+                release_db_connection(conn)
+
+    steam_id = headers.get('X-Steam-Id') or headers.get('x-steam-id')
     
     if not steam_id:
         return {
@@ -122,106 +581,25 @@ def handler(event: dict, context) -> dict:
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute(
-            f"SELECT id, steam_cookie, steam_session_id FROM {os.environ['MAIN_DB_SCHEMA']}.users WHERE steam_id = %s",
-            (steam_id,)
-        )
-        user = cur.fetchone()
-        
-        if not user:
-            cur.execute(
-                f"INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.users (steam_id, username) VALUES (%s, %s) RETURNING id, steam_cookie, steam_session_id",
-                (steam_id, f'User{steam_id[-4:]}')
-            )
-            user = cur.fetchone()
-            conn.commit()
-        
-        user_id = user['id']
-        steam_cookie = user['steam_cookie']
-        session_id = user['steam_session_id']
+        user_id = resolve_user_id(cur, steam_id)
 
         cur.execute(
-            f"SELECT id, item_name, item_hash_name, item_image, current_price, target_price, auto_purchase FROM {os.environ['MAIN_DB_SCHEMA']}.tracks WHERE user_id = %s AND status = 'active'",
+            f"""
+            SELECT {TRACK_COLUMNS}
+            FROM {os.environ['MAIN_DB_SCHEMA']}.tracks t
+            JOIN {os.environ['MAIN_DB_SCHEMA']}.users u ON u.id = t.user_id
+            WHERE t.user_id = %s AND t.status = 'active'
+            """,
             (user_id,)
         )
         tracks = cur.fetchall()
 
-        updated_count = 0
-        price_drops = []
-        purchases_made = []
-        errors = []
-
-        for track in tracks:
-            new_price = get_steam_price(track['item_hash_name'])
-            
-            if new_price is not None:
-                old_price = float(track['current_price']) if track['current_price'] else 0
-                
-                cur.execute(
-                    f"""
-                    UPDATE {os.environ['MAIN_DB_SCHEMA']}.tracks 
-                    SET current_price = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                    """,
-                    (new_price, track['id'])
-                )
-                updated_count += 1
-
-                if new_price <= float(track['target_price']):
-                    price_drops.append({
-                        'track_id': track['id'],
-                        'item_name': track['item_hash_name'],
-                        'old_price': old_price,
-                        'new_price': new_price,
-                        'target_price': float(track['target_price'])
-                    })
-                    
-                    # Автопокупка если включена
-                    if track.get('auto_purchase') and steam_cookie and session_id:
-                        print(f"Auto-purchasing {track['item_hash_name']} at {new_price}₽")
-                        
-                        purchase_result = purchase_item(
-                            track['item_hash_name'],
-                            new_price,
-                            steam_cookie,
-                            session_id
-                        )
-                        
-                        if purchase_result.get('success') == 1:
-                            # Сохраняем покупку в БД
-                            cur.execute(
-                                f"""
-                                INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.purchases 
-                                (user_id, track_id, item_name, item_hash_name, item_image, purchase_price, buy_order_id, status)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                                """,
-                                (user_id, track['id'], track['item_name'], track['item_hash_name'], 
-                                 track['item_image'], new_price, purchase_result.get('buy_orderid'), 'completed')
-                            )
-                            
-                            # Обновляем статус трека
-                            cur.execute(
-                                f"UPDATE {os.environ['MAIN_DB_SCHEMA']}.tracks SET status = 'purchased' WHERE id = %s",
-                                (track['id'],)
-                            )
-                            
-                            purchases_made.append({
-                                'track_id': track['id'],
-                                'item_name': track['item_hash_name'],
-                                'price': new_price,
-                                'buy_orderid': purchase_result.get('buy_orderid')
-                            })
-                            
-                            print(f"Successfully purchased {track['item_hash_name']}")
-                        else:
-                            print(f"Failed to purchase {track['item_hash_name']}: {purchase_result.get('message')}")
-            else:
-                errors.append({
-                    'track_id': track['id'],
-                    'item_name': track['item_hash_name'],
-                    'error': 'Failed to fetch price'
-                })
+        # Сначала получаем все цены параллельно, затем применяем изменения в БД
+        prices, failures, fresh, estimated, _ = fetch_prices([track_item(track) for track in tracks])
+        confirm_estimates(estimated_hits(tracks, prices, estimated), prices, failures, fresh, estimated)
+        record_price_history(cur, fresh)
 
+        result = process_tracks(cur, tracks, prices, failures, estimated)
         conn.commit()
 
         return {
@@ -230,13 +608,7 @@ def handler(event: dict, context) -> dict:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'updated': updated_count,
-                'total': len(tracks),
-                'price_drops': price_drops,
-                'purchases_made': purchases_made,
-                'errors': errors
-            }),
+            'body': dump_json(result),
             'isBase64Encoded': False
         }
 
@@ -255,4 +627,4 @@ def handler(event: dict, context) -> dict:
     finally:
         if conn:
             cur.close()
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
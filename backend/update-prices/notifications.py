@@ -0,0 +1,60 @@
+import json
+import os
+from psycopg2.extras import execute_values
+from metrics import increment
+
+# Канал LISTEN/NOTIFY получателя; функция notifications слушает канал пользователя в long-poll
+NOTIFY_CHANNEL_PREFIX = 'notifications_'
+
+def price_drop_notification(hit: dict) -> tuple:
+    """Уведомление о достижении целевой цены; hit — строка трека с new_price в валюте трека"""
+    message = f"{hit['item_name']}: цена {hit['new_price']} {hit['currency']} достигла цели {hit['target_price']} {hit['currency']}"
+    return hit['user_id'], 'price_drop', message, hit['id'], {
+        'item_name': hit['item_name'],
+        'item_hash_name': hit['item_hash_name'],
+        'old_price': float(hit['current_price']) if hit['current_price'] is not None else None,
+        'new_price': float(hit['new_price']),
+        'target_price': float(hit['target_price']),
+        'currency': hit['currency']
+    }
+
+def purchase_notification(entry: dict, status: str, buy_order_id, error) -> tuple:
+    """Уведомление об исходе заявки из purchase_outbox: completed, failed или unknown"""
+    price = f"{entry['price']} {entry['currency']}"
+    if status == 'completed':
+        message = f"{entry['item_name']}: заявка на покупку за {price} создана"
+    elif status == 'failed':
+        message = f"{entry['item_name']}: заявка на покупку за {price} не создана: {error}"
+    else:
+        message = f"{entry['item_name']}: исход заявки на покупку за {price} неизвестен, проверьте заявки в Steam"
+    return entry['user_id'], f'purchase_{status}', message, entry['track_id'], {
+        'item_name': entry['item_name'],
+        'item_hash_name': entry['item_hash_name'],
+        'price': float(entry['price']),
+        'currency': entry['currency'],
+        'buy_order_id': buy_order_id,
+        'error': error
+    }
+
+def notify(cur, notifications: list) -> int:
+    """Пачкой пишет уведомления (user_id, type, message, track_id, payload) и в том же запросе публикует
+    pg_notify в канал каждого получателя с id последнего уведомления. NOTIFY транзакционный:
+    слушатели получат его после коммита вместе с обновлёнными ценами"""
+    if not notifications:
+        return 0
+    execute_values(
+        cur,
+        f"""
+        WITH inserted AS (
+            INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.notifications (user_id, type, message, track_id, payload)
+            VALUES %s
+            RETURNING id, user_id
+        )
+        SELECT pg_notify('{NOTIFY_CHANNEL_PREFIX}' || user_id, MAX(id)::text) FROM inserted GROUP BY user_id
+        """,
+        [(user_id, kind, message, track_id, json.dumps(payload)) for user_id, kind, message, track_id, payload in notifications],
+        template='(%s::integer, %s, %s, %s::integer, %s::jsonb)',
+        page_size=len(notifications)
+    )
+    increment('notifications.created', len(notifications))
+    return len(notifications)
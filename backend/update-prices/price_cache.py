@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import increment
+
+PRICE_CACHE_BACKEND = os.environ.get('PRICE_CACHE_BACKEND', 'memory')
+PRICE_CACHE_TTL = int(os.environ.get('PRICE_CACHE_TTL', '300'))
+PRICE_CACHE_GRACE = int(os.environ.get('PRICE_CACHE_GRACE', '600'))
+PRICE_CACHE_MAX_ITEMS = int(os.environ.get('PRICE_CACHE_MAX_ITEMS', '5000'))
+PRICE_CACHE_LOCK_SECONDS = 30
+# accessed_at в таблице обновляется не чаще, чем раз в столько секунд: LRU хватает грубой точности,
+# а чтение без записи не создаёт новую версию строки
+PRICE_CACHE_TOUCH_SECONDS = int(os.environ.get('PRICE_CACHE_TOUCH_SECONDS', '60'))
+
+def cache_key(appid: int, market_hash_name: str, currency: int) -> str:
+    """Ключ записи кэша: приложение, валюта и market_hash_name"""
+    return f'{appid}:{currency}:{market_hash_name}'
+
+class MemoryBackend:
+    """Хранит записи в памяти процесса, живёт между вызовами тёплого контейнера"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        self.refreshing = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            value, stored_at = entry
+            return value, time.time() - stored_at
+
+    def set(self, key: str, value) -> None:
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            self.refreshing.pop(key, None)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+    def try_lock(self, key: str) -> bool:
+        with self.lock:
+            now = time.time()
+            if self.refreshing.get(key, 0) > now:
+                return False
+            self.refreshing[key] = now + PRICE_CACHE_LOCK_SECONDS
+            return True
+
+class DbBackend:
+    """Хранит записи в таблице price_cache, общей для всех функций и контейнеров"""
+
+    def __init__(self, connect, schema: str, max_items: int):
+        self.connect = connect
+        self.table = f'{schema}.price_cache'
+        self.max_items = max_items
+        self.conn = None
+        self.lock = threading.Lock()
+        self.writes = 0
+
+    def execute(self, query: str, params: tuple):
+        with self.lock:
+            if self.conn is None or self.conn.closed:
+                self.conn = self.connect()
+                self.conn.autocommit = True
+            with self.conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchone() if cur.description else None
+
+    def get(self, key: str):
+        row = self.execute(
+            f"""
+            WITH entry AS (
+                SELECT cache_key, value, stored_at, accessed_at FROM {self.table} WHERE cache_key = %s
+            ), touched AS (
+                UPDATE {self.table} t SET accessed_at = LOCALTIMESTAMP
+                FROM entry
+                WHERE t.cache_key = entry.cache_key
+                  AND entry.accessed_at < LOCALTIMESTAMP - make_interval(secs => %s)
+            )
+            SELECT value, EXTRACT(EPOCH FROM (LOCALTIMESTAMP - stored_at)) FROM entry
+            """,
+            (key, PRICE_CACHE_TOUCH_SECONDS)
+        )
+        if row is None:
+            return None
+        return json.loads(row[0]), float(row[1])
+
+    def set(self, key: str, value) -> None:
+        self.execute(
+            f"""
+            INSERT INTO {self.table} (cache_key, value, stored_at, accessed_at, refreshing_until)
+            VALUES (%s, %s, LOCALTIMESTAMP, LOCALTIMESTAMP, NULL)
+            ON CONFLICT (cache_key) DO UPDATE
+            SET value = EXCLUDED.value, stored_at = EXCLUDED.stored_at,
+                accessed_at = EXCLUDED.accessed_at, refreshing_until = NULL
+            """,
+            (key, json.dumps(value))
+        )
+
+        # LRU-вытеснение по accessed_at, не на каждую запись, чтобы не сканировать индекс постоянно
+        self.writes += 1
+        if self.writes % 100 == 0:
+            self.execute(
+                f"""
+                DELETE FROM {self.table} WHERE cache_key IN (
+                    SELECT cache_key FROM {self.table} ORDER BY accessed_at DESC OFFSET %s
+                )
+                """,
+                (self.max_items,)
+            )
+
+    def try_lock(self, key: str) -> bool:
+        row = self.execute(
+            f"""
+            UPDATE {self.table} SET refreshing_until = LOCALTIMESTAMP + make_interval(secs => %s)
+            WHERE cache_key = %s AND (refreshing_until IS NULL OR refreshing_until < LOCALTIMESTAMP)
+            RETURNING cache_key
+            """,
+            (PRICE_CACHE_LOCK_SECONDS, key)
+        )
+        return row is not None
+
+class PriceCache:
+    """TTL-кэш цен: свежие записи отдаются сразу, устаревшие в пределах grace отдаются,
+    пока один запрос обновляет их, остальное запрашивается у Steam с объединением параллельных промахов"""
+
+    def __init__(self, backend, ttl: int = PRICE_CACHE_TTL, grace: int = PRICE_CACHE_GRACE):
+        self.backend = backend
+        self.ttl = ttl
+        self.grace = grace
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def peek(self, key: str):
+        """Свежее значение из кэша без запроса к Steam, None если его нет или оно устарело"""
+        entry = self.backend.get(key)
+        if entry is None or entry[1] > self.ttl:
+            return None
+        increment('price_cache.hits')
+        return entry[0]
+
+    def put(self, key: str, value) -> None:
+        """Кладёт значение, полученное в обход get_or_fetch (например, пачкой из поиска)"""
+        self.backend.set(key, value)
+
+    def get_or_fetch(self, key: str, fetch) -> tuple:
+        """Возвращает (значение, статус), где статус — HIT, STALE, REFRESH или MISS"""
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, age = entry
+            if age <= self.ttl:
+                increment('price_cache.hits')
+                return value, 'HIT'
+            if age <= self.ttl + self.grace:
+                if not self.backend.try_lock(key):
+                    increment('price_cache.stale_hits')
+                    return value, 'STALE'
+                # Этот запрос обновляет запись, при неудаче отдаём устаревшее значение
+                increment('price_cache.refreshes')
+                try:
+                    fresh = fetch()
+                except Exception as e:
+                    print(f"Price cache refresh failed for {key}: {e}")
+                    fresh = None
+                if fresh is None:
+                    return value, 'STALE'
+                self.backend.set(key, fresh)
+                return fresh, 'REFRESH'
+
+        increment('price_cache.misses')
+        return self.fetch_once(key, fetch), 'MISS'
+
+    def fetch_once(self, key: str, fetch):
+        """Одновременные промахи по одному ключу внутри процесса превращаются в один запрос к Steam"""
+        with self.lock:
+            event = self.inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self.inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait(PRICE_CACHE_LOCK_SECONDS)
+            entry = self.backend.get(key)
+            return entry[0] if entry is not None else None
+
+        try:
+            value = fetch()
+            if value is not None:
+                self.backend.set(key, value)
+            return value
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            event.set()
+
+def create_price_cache(connect=None) -> PriceCache:
+    """Создаёт кэш с бэкендом из PRICE_CACHE_BACKEND (memory или db)"""
+    if PRICE_CACHE_BACKEND == 'db' and connect is not None:
+        backend = DbBackend(connect, os.environ['MAIN_DB_SCHEMA'], PRICE_CACHE_MAX_ITEMS)
+    else:
+        backend = MemoryBackend(PRICE_CACHE_MAX_ITEMS)
+    return PriceCache(backend)
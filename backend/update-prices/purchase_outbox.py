@@ -0,0 +1,271 @@
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+from decimal import Decimal
+from psycopg2.extras import RealDictCursor, execute_values
+from fx_rates import STEAM_CURRENCIES
+from metrics import increment
+from notifications import notify, purchase_notification
+from steam_http import STEAM_MARKET_URL, SteamHttpError, SteamRateLimited, SteamUnavailable, request_json
+
+PURCHASE_CONCURRENCY = int(os.environ.get('PURCHASE_CONCURRENCY', '4'))
+PURCHASE_MAX_ATTEMPTS = int(os.environ.get('PURCHASE_MAX_ATTEMPTS', '5'))
+PURCHASE_DRAIN_SECONDS = float(os.environ.get('PURCHASE_DRAIN_SECONDS', '20'))
+PURCHASE_RETRY_SECONDS = 30
+# Заявка дольше этого в processing — исполнитель упал посреди запроса к Steam
+PURCHASE_PROCESSING_TIMEOUT = 300
+# Класс транзакционных advisory-блокировок Postgres: заявку пользователя захватывает один исполнитель
+OUTBOX_LOCK_CLASS = 21001
+
+def enqueue_purchases(cur, hits: list) -> list:
+    """Записывает намерения купить в purchase_outbox в транзакции обновления цен.
+    Ключ идемпотентности — трек и число уже закрытых заявок по нему: пока заявка по треку открыта,
+    повторное срабатывание даёт тот же ключ и ничего не добавляет. Возвращает id треков с новой заявкой"""
+    if not hits:
+        return []
+    rows = execute_values(
+        cur,
+        f"""
+        INSERT INTO {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox
+            (idempotency_key, user_id, track_id, appid, item_name, item_hash_name, item_image, price, currency)
+        SELECT 'track:' || v.track_id || ':' || (
+                   SELECT COUNT(*) FROM {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox o
+                   WHERE o.track_id = v.track_id AND o.status IN ('completed', 'failed', 'unknown')
+               ),
+               v.user_id, v.track_id, v.appid, v.item_name, v.item_hash_name, v.item_image, v.price, v.currency
+        FROM (VALUES %s) AS v(user_id, track_id, appid, item_name, item_hash_name, item_image, price, currency)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING track_id
+        """,
+        [
+            (hit['user_id'], hit['id'], hit['appid'], hit['item_name'], hit['item_hash_name'],
+             hit['item_image'], hit['new_price'], hit['currency'])
+            for hit in hits
+        ],
+        template='(%s::integer, %s::integer, %s::integer, %s, %s, %s, %s::numeric, %s)',
+        page_size=len(hits),
+        fetch=True
+    )
+    increment('purchases.queued', len(rows))
+    return [row['track_id'] for row in rows]
+
+def purchase_item(appid: int, item_hash_name: str, price: Decimal, currency: str, steam_cookie: str, session_id: str) -> dict:
+    """Создает заявку на покупку предмета на Steam Market в валюте трека"""
+    purchase_url = f'{STEAM_MARKET_URL}/createbuyorder/'
+
+    purchase_data = {
+        'sessionid': session_id,
+        'currency': STEAM_CURRENCIES[currency],
+        'appid': appid,
+        'market_hash_name': item_hash_name,
+        'price_total': int(price * 100),
+        'quantity': 1
+    }
+
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'Cookie': f'steamLoginSecure={steam_cookie}; sessionid={session_id}',
+        'Referer': f'https://steamcommunity.com/market/listings/{appid}/{urllib.parse.quote(item_hash_name)}',
+        'Origin': 'https://steamcommunity.com'
+    }
+
+    data = urllib.parse.urlencode(purchase_data).encode('utf-8')
+    # Заявку на покупку не повторяем автоматически, чтобы не создать дубликат
+    return request_json(purchase_url, headers=headers, timeout=15, data=data, method='POST', retries=0)
+
+def execute_entry(entry: dict) -> tuple:
+    """Отправляет заявку в Steam. Возвращает (статус, buy_order_id, ошибка), статус:
+    completed; retry — Steam точно не принял запрос (429, circuit breaker); failed — Steam отказал;
+    unknown — обрыв или 5xx, заявка могла создаться, поэтому повторять её нельзя"""
+    try:
+        result = purchase_item(
+            entry['appid'], entry['item_hash_name'], entry['price'], entry['currency'],
+            entry['steam_cookie'], entry['steam_session_id']
+        )
+    except (SteamRateLimited, SteamUnavailable) as e:
+        return 'retry', None, str(e)
+    except urllib.error.HTTPError as e:
+        return 'failed', None, f'HTTP {e.code}'
+    except SteamHttpError as e:
+        return 'unknown', None, str(e)
+    except Exception as e:
+        return 'unknown', None, str(e)
+
+    if result.get('success') == 1:
+        return 'completed', result.get('buy_orderid'), None
+    return 'failed', None, result.get('message') or f"Steam success code {result.get('success')}"
+
+def record_result(cur, entry: dict, status: str, buy_order_id, error) -> str:
+    """Фиксирует исход попытки: заявка в outbox, строка в purchases, трек и уведомление — в одной транзакции.
+    Возвращает итоговый статус заявки (retry после последней попытки становится failed)"""
+    schema = os.environ['MAIN_DB_SCHEMA']
+    if status == 'retry' and entry['attempts'] < PURCHASE_MAX_ATTEMPTS:
+        delay = PURCHASE_RETRY_SECONDS * (2 ** (entry['attempts'] - 1)) * random.uniform(0.8, 1.2)
+        cur.execute(
+            f"""
+            UPDATE {schema}.purchase_outbox
+            SET status = 'pending', next_attempt_at = LOCALTIMESTAMP + make_interval(secs => %s),
+                last_error = %s, updated_at = LOCALTIMESTAMP
+            WHERE id = %s
+            """,
+            (delay, error, entry['id'])
+        )
+        increment('purchases.retried')
+        return 'pending'
+
+    if status == 'retry':
+        status = 'failed'
+    cur.execute(
+        f"""
+        UPDATE {schema}.purchase_outbox
+        SET status = %s, buy_order_id = %s, last_error = %s, updated_at = LOCALTIMESTAMP
+        WHERE id = %s
+        """,
+        (status, buy_order_id, error, entry['id'])
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {schema}.purchases
+            (user_id, track_id, item_name, item_hash_name, item_image, purchase_price, currency,
+             buy_order_id, status, outbox_id, attempts, error)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (outbox_id) DO NOTHING
+        """,
+        (entry['user_id'], entry['track_id'], entry['item_name'], entry['item_hash_name'], entry['item_image'],
+         entry['price'], entry['currency'], buy_order_id, status, entry['id'], entry['attempts'], error)
+    )
+    if status == 'completed':
+        cur.execute(f"UPDATE {schema}.tracks SET status = 'purchased' WHERE id = %s", (entry['track_id'],))
+    else:
+        # Трек продолжает отслеживаться, но без автопокупки, иначе каждое обновление создавало бы новую заявку
+        cur.execute(f"UPDATE {schema}.tracks SET auto_purchase = FALSE WHERE id = %s", (entry['track_id'],))
+    notify(cur, [purchase_notification(entry, status, buy_order_id, error)])
+    increment(f'purchases.{status}')
+    return status
+
+def claim_entry(cur, user_id: int):
+    """Переводит в processing следующую созревшую заявку пользователя, если другой его заявки в processing нет"""
+    schema = os.environ['MAIN_DB_SCHEMA']
+    cur.execute(
+        f"""
+        UPDATE {schema}.purchase_outbox o
+        SET status = 'processing', attempts = o.attempts + 1, updated_at = LOCALTIMESTAMP
+        FROM {schema}.users u
+        WHERE o.id = (
+            SELECT id FROM {schema}.purchase_outbox
+            WHERE user_id = %s AND status = 'pending' AND next_attempt_at <= LOCALTIMESTAMP AND track_id IS NOT NULL
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ) AND u.id = o.user_id
+          AND NOT EXISTS (SELECT 1 FROM {schema}.purchase_outbox p WHERE p.user_id = %s AND p.status = 'processing')
+        RETURNING o.*, u.steam_cookie, u.steam_session_id
+        """,
+        (user_id, user_id)
+    )
+    return cur.fetchone()
+
+def claim_next(cur):
+    """Берёт созревшую заявку пользователя, у которого нет заявки в processing.
+    Проверка и захват идут под транзакционной advisory-блокировкой пользователя, которая снимается коммитом,
+    а дальше очередь пользователя держит сама строка в processing. Сессионные блокировки не используются:
+    через DATABASE_POOLER_URL в режиме транзакций они остались бы на серверном соединении другого клиента"""
+    cur.execute(
+        f"""
+        SELECT DISTINCT o.user_id FROM {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox o
+        WHERE o.status = 'pending' AND o.next_attempt_at <= LOCALTIMESTAMP AND o.track_id IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox p
+              WHERE p.user_id = o.user_id AND p.status = 'processing'
+          )
+        LIMIT 100
+        """
+    )
+    user_ids = [row['user_id'] for row in cur.fetchall()]
+    random.shuffle(user_ids)
+    for user_id in user_ids:
+        cur.execute('SELECT pg_try_advisory_xact_lock(%s, %s) AS locked', (OUTBOX_LOCK_CLASS, user_id))
+        if not cur.fetchone()['locked']:
+            continue
+        entry = claim_entry(cur, user_id)
+        if entry is not None:
+            return entry
+    return None
+
+def outbox_worker(connect, deadline: float, stats: dict, lock: threading.Lock) -> None:
+    """Заявки одного пользователя исполняются строго по очереди: новая берётся, только когда предыдущая
+    вышла из processing"""
+    conn = connect()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            while time.monotonic() < deadline:
+                entry = claim_next(cur)
+                conn.commit()
+                if entry is None:
+                    return
+                status = record_result(cur, entry, *execute_entry(entry))
+                conn.commit()
+                with lock:
+                    stats[status] = stats.get(status, 0) + 1
+    finally:
+        conn.close()
+
+def release_stuck(cur) -> int:
+    """Заявки, зависшие в processing после падения исполнителя: исход запроса к Steam неизвестен,
+    поэтому они не повторяются, а закрываются как unknown"""
+    cur.execute(
+        f"""
+        SELECT o.*, u.steam_cookie, u.steam_session_id
+        FROM {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox o
+        JOIN {os.environ['MAIN_DB_SCHEMA']}.users u ON u.id = o.user_id
+        WHERE o.status = 'processing' AND o.updated_at < LOCALTIMESTAMP - make_interval(secs => %s)
+        FOR UPDATE OF o SKIP LOCKED
+        """,
+        (PURCHASE_PROCESSING_TIMEOUT,)
+    )
+    stuck = cur.fetchall()
+    for entry in stuck:
+        record_result(cur, entry, 'unknown', None, 'Executor stopped while the buy order was in flight')
+    return len(stuck)
+
+def cancel_orphaned(cur) -> int:
+    """Заявки, трек которых удалён (track_id обнулён внешним ключом ON DELETE SET NULL), не исполняются"""
+    cur.execute(
+        f"""
+        UPDATE {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox
+        SET status = 'cancelled', last_error = 'Track deleted', updated_at = LOCALTIMESTAMP
+        WHERE status = 'pending' AND track_id IS NULL
+        """
+    )
+    return cur.rowcount
+
+def drain_outbox(connect, cur, seconds: float = PURCHASE_DRAIN_SECONDS, workers: int = PURCHASE_CONCURRENCY) -> dict:
+    """Исполнитель outbox: до workers потоков со своими подключениями берут заявки по одной,
+    так что заявки разных пользователей идут параллельно, а одного — последовательно"""
+    started = time.monotonic()
+    stuck = release_stuck(cur)
+    cancelled = cancel_orphaned(cur)
+    cur.connection.commit()
+
+    stats = {}
+    lock = threading.Lock()
+    deadline = started + seconds
+    threads = [threading.Thread(target=outbox_worker, args=(connect, deadline, stats, lock)) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cur.execute(f"SELECT COUNT(*) AS pending FROM {os.environ['MAIN_DB_SCHEMA']}.purchase_outbox WHERE status = 'pending'")
+    return {
+        'completed': stats.get('completed', 0),
+        'failed': stats.get('failed', 0),
+        'unknown': stats.get('unknown', 0) + stuck,
+        'retried': stats.get('pending', 0),
+        'cancelled': cancelled,
+        'pending': cur.fetchone()['pending'],
+        'seconds': round(time.monotonic() - started, 2)
+    }
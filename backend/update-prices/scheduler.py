@@ -0,0 +1,39 @@
+import heapq
+import os
+from steam_http import STEAM_RATE_BURST, STEAM_RATE_PER_SECOND
+
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', '25'))
+SCHEDULER_BUDGET = int(os.environ.get('SCHEDULER_BUDGET') or STEAM_RATE_BURST + STEAM_RATE_PER_SECOND * SCHEDULER_TICK_SECONDS)
+SCHEDULER_MIN_INTERVAL = int(os.environ.get('SCHEDULER_MIN_INTERVAL', '60'))
+NEVER_CHECKED_AGE = 24 * 3600
+TARGET_BAND = 0.1
+TARGET_WEIGHT = 4.0
+AUTO_PURCHASE_WEIGHT = 2.0
+VOLATILITY_WEIGHT = 20.0
+
+def priority(candidate: dict) -> float:
+    """Приоритет предмета: сколько он не обновлялся, умноженное на важность.
+    Важность растёт, когда цена в пределах TARGET_BAND от целевой (или уже ниже), при автопокупке
+    и с волатильностью (коэффициент вариации цены за сутки)"""
+    age = candidate['age'] if candidate['age'] is not None else NEVER_CHECKED_AGE
+    weight = 1.0
+    if candidate['target_gap'] is not None:
+        weight += TARGET_WEIGHT * max(0.0, 1 - max(candidate['target_gap'], 0.0) / TARGET_BAND)
+    if candidate['auto_purchase']:
+        weight += AUTO_PURCHASE_WEIGHT
+    weight += VOLATILITY_WEIGHT * (candidate['volatility'] or 0.0)
+    return age * weight
+
+def plan(candidates: list, budget: int = SCHEDULER_BUDGET, min_interval: int = SCHEDULER_MIN_INTERVAL) -> list:
+    """Очередь с приоритетом: из предметов, не обновлявшихся дольше min_interval, выбирает не больше budget
+    самых приоритетных. Кандидат — словарь с age (секунды или None), target_gap, auto_purchase, volatility"""
+    queue = [
+        (-priority(candidate), index, candidate)
+        for index, candidate in enumerate(candidates)
+        if candidate['age'] is None or candidate['age'] >= min_interval
+    ]
+    heapq.heapify(queue)
+    planned = []
+    while queue and len(planned) < budget:
+        planned.append(heapq.heappop(queue)[2])
+    return planned
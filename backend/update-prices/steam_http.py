@@ -0,0 +1,224 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+import urllib.error
+import urllib.request
+from metrics import increment, span
+
+STEAM_MARKET_URL = os.environ.get('STEAM_MARKET_URL', 'https://steamcommunity.com/market')
+# Лимит действует на контейнер: N тёплых контейнеров функции вместе делают до N × STEAM_RATE_PER_SECOND
+# запросов. STEAM_MAX_WAIT — сколько вызов ждёт токены, дальше непрокэшированные предметы получают ошибку
+STEAM_RATE_PER_SECOND = float(os.environ.get('STEAM_RATE_PER_SECOND', '1'))
+STEAM_RATE_BURST = int(os.environ.get('STEAM_RATE_BURST', '5'))
+STEAM_MAX_RETRIES = int(os.environ.get('STEAM_MAX_RETRIES', '3'))
+STEAM_MAX_WAIT = float(os.environ.get('STEAM_MAX_WAIT', '20'))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('STEAM_CIRCUIT_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('STEAM_CIRCUIT_RESET', '60'))
+STEAM_VALIDATORS_MAX_ITEMS = int(os.environ.get('STEAM_VALIDATORS_MAX_ITEMS', '5000'))
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+class SteamHttpError(Exception):
+    """Steam Market недоступен или ограничивает запросы"""
+
+class SteamRateLimited(SteamHttpError):
+    """Steam вернул 429 и повторные попытки исчерпаны"""
+
+class SteamUnavailable(SteamHttpError):
+    """Circuit breaker разомкнут после серии ошибок"""
+
+class TokenBucket:
+    """Token bucket на уровне модуля: состояние переживает вызовы тёплого контейнера"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, max_wait: float = STEAM_MAX_WAIT) -> None:
+        """Забирает токен, при необходимости ждёт; если ждать дольше max_wait — SteamRateLimited"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            if now + wait > deadline:
+                raise SteamRateLimited('Steam rate limit budget exhausted')
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов всем потокам (после 429 / Retry-After)"""
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+class CircuitBreaker:
+    """Размыкается после CIRCUIT_FAILURE_THRESHOLD неудачных запросов подряд, через
+    CIRCUIT_RESET_SECONDS пропускает один пробный запрос"""
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_seconds:
+                return False
+            # Пробный запрос: следующий будет разрешён не раньше чем через reset_seconds
+            self.opened_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+class Validators:
+    """ETag / Last-Modified последних ответов по URL вместе с разобранным результатом: повторный GET
+    уходит условным, и на 304 результат берётся отсюда. Хранятся только ответы с валидаторами (LRU)"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def headers(self, url: str) -> dict:
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return {}
+            self.entries.move_to_end(url)
+        etag, last_modified, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def result(self, url: str):
+        with self.lock:
+            entry = self.entries.get(url)
+        return entry[2] if entry is not None else None
+
+    def store(self, url: str, response, result) -> None:
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        with self.lock:
+            if not etag and not last_modified:
+                self.entries.pop(url, None)
+                return
+            self.entries[url] = (etag, last_modified, result)
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+bucket = TokenBucket(STEAM_RATE_PER_SECOND, STEAM_RATE_BURST)
+breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+validators = Validators(STEAM_VALIDATORS_MAX_ITEMS)
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def retry_after_seconds(error: urllib.error.HTTPError):
+    """Значение заголовка Retry-After в секундах (HTTP-даты Steam не присылает)"""
+    value = error.headers.get('Retry-After') if error.headers else None
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+def read_json(response) -> dict:
+    return json.loads(response.read().decode('utf-8'))
+
+def request_json(url: str, headers: dict = None, timeout: float = 10, data: bytes = None,
+                 method: str = None, retries: int = STEAM_MAX_RETRIES, parse=read_json, deadline: float = None) -> dict:
+    """Единая точка исходящих запросов к Steam: лимит скорости, повторы с backoff и circuit breaker.
+    parse получает открытый ответ и может разбирать тело потоково. GET-запросы условные: если Steam
+    прислал ETag или Last-Modified, на 304 возвращается прошлый результат без загрузки тела.
+    deadline (time.monotonic()) — общий для нескольких запросов предел ожидания токена вместо STEAM_MAX_WAIT"""
+    conditional = data is None and method in (None, 'GET')
+    if not breaker.allow():
+        raise SteamUnavailable('Steam Market circuit is open')
+
+    for attempt in range(retries + 1):
+        # Ожидание токена — отдельный спан: при большом числе предметов оно, а не сам Steam, занимает вызов
+        with span('steam_rate_wait'):
+            bucket.acquire(STEAM_MAX_WAIT if deadline is None else max(0.0, deadline - time.monotonic()))
+        rate_limited = False
+
+        req = urllib.request.Request(url, data=data, method=method)
+        req.add_header('User-Agent', USER_AGENT)
+        for name, value in (headers or {}).items():
+            req.add_header(name, value)
+        if conditional:
+            for name, value in validators.headers(url).items():
+                req.add_header(name, value)
+
+        try:
+            increment('steam_http.requests')
+            with span('steam_http'), urllib.request.urlopen(req, timeout=timeout) as response:
+                result = parse(response)
+                if conditional:
+                    validators.store(url, response, result)
+            breaker.record_success()
+            return result
+        except urllib.error.HTTPError as e:
+            cached = validators.result(url) if conditional and e.code == 304 else None
+            if cached is not None:
+                increment('steam_http.not_modified')
+                breaker.record_success()
+                return cached
+            if e.code != 429 and e.code < 500:
+                breaker.record_success()
+                raise
+            rate_limited = e.code == 429
+            delay = retry_after_seconds(e) or backoff_delay(attempt)
+            if rate_limited:
+                increment('steam_http.rate_limited')
+                bucket.pause(delay)
+            last_error = e
+        except (urllib.error.URLError, TimeoutError) as e:
+            delay = backoff_delay(attempt)
+            last_error = e
+
+        if attempt < retries:
+            increment('steam_http.retries')
+            print(f"Steam request failed ({last_error}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            # После 429 ожидание уже заложено в паузу token bucket
+            if not rate_limited:
+                time.sleep(delay)
+
+    breaker.record_failure()
+    if rate_limited:
+        raise SteamRateLimited('Rate limited by Steam')
+    raise SteamHttpError(f'Steam request failed: {last_error}')
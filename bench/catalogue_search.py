@@ -0,0 +1,99 @@
+"""Задержка поиска steam-search по локальному каталогу market_items (p50/p99) на синтетическом каталоге.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/catalogue_search.py [--items 30000] [--requests 500] [--explain]
+
+Каталог заполняется под отдельным appid (--appid), строки других приложений не трогаются и при повторном
+запуске с тем же размером не пересоздаются. Имена предметов собраны из оружия, скинов и износа, как в CS2;
+запросы — из load_test.py и несколько коротких слов. Без pg_trgm поиск идёт последовательным сканированием,
+поэтому числа — верхняя граница."""
+import argparse
+import os
+import random
+import time
+
+from load_test import QUERIES, WEARS, load_function, percentile
+
+WEAPONS = ('AK-47', 'AWP', 'M4A4', 'M4A1-S', 'Glock-18', 'USP-S', 'Desert Eagle', 'P250', 'MP9', 'FAMAS', 'Galil AR', 'SSG 08')
+SKINS = ('Redline', 'Asiimov', 'Fade', 'Slate', 'Neon Rider', 'Hyper Beast', 'Case Hardened', 'Dragon Lore', 'Kilowatt',
+         'Bloodsport', 'Gradient', 'Inheritance', 'Vulcan', 'Printstream', 'Howl', 'Water Elemental', 'Safari Mesh')
+EXTRA_QUERIES = ('ak', 'fade', 'stattrak awp', 'case hardened field', 'knife', 'xyz')
+
+def catalogue_names(count: int) -> list:
+    names = []
+    for index in range(count):
+        weapon = WEAPONS[index % len(WEAPONS)]
+        skin = SKINS[index // len(WEAPONS) % len(SKINS)]
+        variant = index // (len(WEAPONS) * len(SKINS))
+        prefix = 'StatTrak™ ' if variant % 3 == 1 else ''
+        names.append(f'{prefix}{weapon} | {skin} {variant // 3 or ""}'.rstrip() + f' ({WEARS[variant % len(WEARS)]})')
+    return list(dict.fromkeys(names))
+
+def fill_catalogue(conn, schema: str, appid: int, items: int) -> int:
+    """Пересоздаёт каталог appid, если в нём не items строк"""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {schema}.market_items WHERE appid = %s", (appid,))
+        if cur.fetchone()[0] == items:
+            return items
+        cur.execute(f"DELETE FROM {schema}.market_items WHERE appid = %s", (appid,))
+        names = catalogue_names(items)
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.market_items (appid, hash_name, name, icon_url, sell_price_text, sell_listings, last_seen_at)
+            SELECT %s, name, name, 'icon', (1 + n %% 5000) || ',00 pуб.', (n * 7919) %% 3000, LOCALTIMESTAMP
+            FROM unnest(%s::text[]) WITH ORDINALITY AS i(name, n)
+            """,
+            (appid, names)
+        )
+        cur.execute(f"ANALYZE {schema}.market_items")
+    conn.commit()
+    return len(names)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=30000, help='предметов в каталоге')
+    parser.add_argument('--requests', type=int, default=500, help='запросов поиска')
+    parser.add_argument('--appid', type=int, default=990730, help='appid синтетического каталога')
+    parser.add_argument('--explain', action='store_true', help='печатать план каждого вида запроса')
+    parser.add_argument('--random-seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.update({'METRICS_LOG_SAMPLE': '0', 'METRICS_SLOW_MS': 'inf'})
+    steam_search, _ = load_function('steam-search')
+    schema = os.environ['MAIN_DB_SCHEMA']
+    queries = list(dict.fromkeys(steam_search.normalize_query(query) for query in QUERIES + EXTRA_QUERIES))
+    rng = random.Random(args.random_seed)
+
+    conn = steam_search.get_db_connection()
+    try:
+        size = fill_catalogue(conn, schema, args.appid, args.items)
+        cur = conn.cursor(cursor_factory=steam_search.RealDictCursor)
+        latencies = {}
+        found = {}
+        for _ in range(args.requests):
+            query = rng.choice(queries)
+            started = time.perf_counter()
+            results = steam_search.search_catalogue(cur, query, steam_search.SEARCH_CACHE_ITEMS, args.appid)
+            latencies.setdefault(query, []).append((time.perf_counter() - started) * 1000)
+            found[query] = len(results)
+        if args.explain:
+            for query in queries:
+                steam_search.search_catalogue(cur, query, steam_search.SEARCH_CACHE_ITEMS, args.appid)
+                cur.execute('EXPLAIN ANALYZE ' + cur.query.decode('utf-8'))
+                print(f'-- {query}')
+                print('\n'.join(row['QUERY PLAN'] for row in cur.fetchall()))
+        conn.rollback()
+    finally:
+        steam_search.release_db_connection(conn)
+
+    print(f'{size} catalogue items, {args.requests} searches')
+    print(f'{"query":>28} {"calls":>6} {"found":>6} {"p50":>9} {"p99":>9}')
+    for query in queries:
+        values = sorted(latencies.get(query, []))
+        if values:
+            print(f'{query:>28} {len(values):6d} {found[query]:6d} {percentile(values, 0.5):7.2f}ms {percentile(values, 0.99):7.2f}ms')
+    overall = sorted(value for values in latencies.values() for value in values)
+    print(f'{"all":>28} {len(overall):6d} {"":>6} {percentile(overall, 0.5):7.2f}ms {percentile(overall, 0.99):7.2f}ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Экономия условных GET (ETag / If-None-Match): байты, CPU и запросы к БД на вызов для неизменного портфеля.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/conditional_get.py [--tracks 1000] [--requests 200]
+
+Стенд заводит пользователя bench-etag (его треки пересоздаются, остальные данные схемы не трогаются)
+с --tracks треками и опрашивает GET /tracks и steam-price сначала без If-None-Match, затем с ETag
+из первого ответа. steam-price ходит в заглушку Steam из load_test.py, цена берётся из кэша функции."""
+import argparse
+import os
+import random
+import time
+
+from load_test import SteamStub, load_function, percentile
+
+STEAM_ID = 'bench-etag'
+
+def seed_portfolio(conn, schema: str, tracks: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.users (steam_id, username) VALUES (%s, 'bench-etag')
+            ON CONFLICT (steam_id) DO UPDATE SET steam_id = EXCLUDED.steam_id
+            RETURNING id
+            """,
+            (STEAM_ID,)
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute(f"DELETE FROM {schema}.tracks WHERE user_id = %s", (user_id,))
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.tracks (user_id, item_name, item_hash_name, item_image, current_price, target_price)
+            SELECT %s, 'Item ' || i, 'Item ' || i, 'https://example.com/' || i || '.png',
+                   (100 + random() * 9000)::numeric(10, 2), (50 + random() * 4000)::numeric(10, 2)
+            FROM generate_series(1, %s) i
+            """,
+            (user_id, tracks)
+        )
+    conn.commit()
+
+def measure(handler, metrics, event: dict, requests: int) -> dict:
+    """Вызывает handler requests раз с одним событием: размер тела, время, процессорное время и запросы к БД"""
+    lines = []
+    metrics.registry.listeners.append(lines.append)
+    latencies = []
+    body_bytes = 0
+    statuses = {}
+    cpu_started = time.process_time()
+    try:
+        for _ in range(requests):
+            call_started = time.perf_counter()
+            response = handler(event, None)
+            latencies.append((time.perf_counter() - call_started) * 1000)
+            body_bytes += len(response['body'].encode('utf-8'))
+            statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+    finally:
+        metrics.registry.listeners.remove(lines.append)
+    cpu_ms = (time.process_time() - cpu_started) * 1000
+
+    latencies.sort()
+    return {
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'bytes': round(body_bytes / requests),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'cpu_ms': round(cpu_ms / requests, 3),
+        'json_ms': round(sum(line['spans'].get('json', {}).get('ms', 0) for line in lines) / max(1, len(lines)), 3),
+        'db_round_trips': round(sum(line['spans'].get('db', {}).get('n', 0) for line in lines) / max(1, len(lines)), 2)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=1000, help='треков в портфеле')
+    parser.add_argument('--requests', type=int, default=200, help='вызовов на сценарий')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    args = parser.parse_args()
+
+    stub = SteamStub(args.fixtures, 0, 0)
+    stub_url = stub.start()
+    os.environ.update({
+        'STEAM_MARKET_URL': f'{stub_url}/market',
+        'FX_RATES_URL': f'{stub_url}/fx',
+        'METRICS_LOG_SAMPLE': '0',
+        'METRICS_SLOW_MS': 'inf'
+    })
+    tracks, tracks_metrics = load_function('tracks')
+    steam_price, steam_price_metrics = load_function('steam-price')
+
+    conn = tracks.get_db_connection()
+    try:
+        seed_portfolio(conn, os.environ['MAIN_DB_SCHEMA'], args.tracks)
+    finally:
+        tracks.release_db_connection(conn)
+
+    item = random.Random(1).choice([name for name, body in stub.overviews.items() if body.get('lowest_price')])
+    cases = {
+        'tracks': (tracks, tracks_metrics, {'httpMethod': 'GET', 'queryStringParameters': {}, 'headers': {'X-Steam-Id': STEAM_ID}}),
+        'steam-price': (steam_price, steam_price_metrics, {'httpMethod': 'GET', 'queryStringParameters': {'item': item, 'currency': 'USD'}, 'headers': {}})
+    }
+
+    print(f'{args.tracks} tracks, {args.requests} calls per case')
+    print(f'{"case":>24} {"bytes":>8} {"p50":>9} {"cpu/call":>10} {"json":>8} {"db/call":>8}  statuses')
+    for name, (module, metrics, event) in cases.items():
+        etag = module.handler(event, None)['headers']['ETag']
+        full = measure(module.handler, metrics, event, args.requests)
+        conditional = measure(module.handler, metrics, {**event, 'headers': {**event['headers'], 'If-None-Match': etag}}, args.requests)
+        for label, result in ((name, full), (f'{name} If-None-Match', conditional)):
+            print(f'{label:>24} {result["bytes"]:8d} {result["p50_ms"]:7.2f}ms {result["cpu_ms"]:8.3f}ms'
+                  f' {result["json_ms"]:6.3f}ms {result["db_round_trips"]:8.2f}  {result["statuses"]}')
+        saved_cpu = 1 - conditional['cpu_ms'] / full['cpu_ms'] if full['cpu_ms'] else 0.0
+        print(f'{"":>24} saved {full["bytes"] - conditional["bytes"]} bytes and {saved_cpu:.0%} CPU per call')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Задержка GET /tracks (p50/p99) с пулом соединений тёплого контейнера и с новым соединением на каждый вызов.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/db_pool_latency.py [--tracks 50] [--requests 500]
+
+Стенд заводит пользователя bench-pool с --tracks треками (его треки пересоздаются, остальные данные схемы
+не трогаются). Без пула DB_POOL_MIN = 0: пул закрывает соединение при возврате, как было до пула.
+Для честного сравнения DATABASE_URL лучше указывать через TCP (host=localhost), а не unix-сокет."""
+import argparse
+import os
+import time
+
+from load_test import load_function, percentile
+
+STEAM_ID = 'bench-pool'
+
+def seed_tracks(conn, schema: str, tracks: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.users (steam_id, username) VALUES (%s, 'bench-pool')
+            ON CONFLICT (steam_id) DO UPDATE SET steam_id = EXCLUDED.steam_id
+            RETURNING id
+            """,
+            (STEAM_ID,)
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute(f"DELETE FROM {schema}.tracks WHERE user_id = %s", (user_id,))
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.tracks (user_id, item_name, item_hash_name, current_price, target_price)
+            SELECT %s, 'Pool item ' || i, 'Pool item ' || i, 100 + i, 90 + i FROM generate_series(1, %s) i
+            """,
+            (user_id, tracks)
+        )
+    conn.commit()
+
+def measure(handler, requests: int) -> dict:
+    event = {'httpMethod': 'GET', 'queryStringParameters': {}, 'headers': {'X-Steam-Id': STEAM_ID}}
+    latencies = []
+    statuses = {}
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+    latencies.sort()
+    return {'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99), 'statuses': statuses}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=50, help='треков у пользователя')
+    parser.add_argument('--requests', type=int, default=500, help='вызовов на режим')
+    parser.add_argument('--rounds', type=int, default=3, help='повторов каждого режима, режимы чередуются')
+    args = parser.parse_args()
+
+    os.environ.update({'METRICS_LOG_SAMPLE': '0', 'METRICS_SLOW_MS': 'inf'})
+    tracks, _ = load_function('tracks')
+    db = tracks.get_db_connection.__globals__
+
+    conn = tracks.get_db_connection()
+    try:
+        seed_tracks(conn, os.environ['MAIN_DB_SCHEMA'], args.tracks)
+    finally:
+        tracks.release_db_connection(conn)
+
+    print(f'GET /tracks, {args.tracks} tracks, {args.requests} calls per run')
+    print(f'{"mode":>14} {"p50":>9} {"p99":>9}  statuses')
+    pool_min = db['DB_POOL_MIN']
+    for _ in range(args.rounds):
+        for mode, minconn in (('no pool', 0), ('pool', max(1, pool_min))):
+            # Пул пересоздаётся с другим DB_POOL_MIN при следующем get_db_connection
+            db['get_pool']().closeall()
+            db['DB_POOL_MIN'] = minconn
+            result = measure(tracks.handler, args.requests)
+            print(f'{mode:>14} {result["p50"]:7.2f}ms {result["p99"]:7.2f}ms  {result["statuses"]}')
+
+if __name__ == '__main__':
+    main()
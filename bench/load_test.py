@@ -0,0 +1,403 @@
+"""Нагрузочный стенд: handler каждой функции вызывается в процессе против заглушки Steam и локального Postgres.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/load_test.py --scale 1000 --seed [--requests 200] [--latency 80] [--rate-429 0.02]
+        [--only steam-price tracks-list] [--save result.json] [--compare baseline.json]
+
+Заглушка Steam отдаёт записанные ответы priceoverview и search/render из bench/fixtures (или --fixtures):
+предмет, которого нет в записи, получает один из записанных ответов по хэшу имени. Поиск с пустым запросом
+листает синтетический каталог из --catalogue предметов, в который перемешаны отслеживаемые. Задержка, доля
+ответов 429 и поддержка ETag (--etag) настраиваются. --seed ОЧИЩАЕТ таблицы схемы MAIN_DB_SCHEMA и заполняет их синтетическими
+пользователями и треками: --scale — число треков (10, 1000, 100000), пользователей в 10 раз меньше.
+
+Вызовы идут последовательно, как в одном контейнере облачной функции. Для каждого сценария печатаются
+пропускная способность, p50/p95/p99 задержки, число запросов к БД и к Steam на вызов (из metrics.py).
+С --compare стенд завершается с кодом 1, если p95 или запросы к БД на вызов выросли сверх --tolerance."""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BACKEND = os.path.join(ROOT, 'backend')
+FUNCTIONS = ('steam-price', 'steam-search', 'tracks', 'price-history', 'update-prices')
+FX_RATES = {'USD': 0.0125, 'EUR': 0.0108, 'GBP': 0.0094, 'KZT': 5.61, 'UAH': 0.47}
+QUERIES = ('ak-47 redline', 'awp', 'калаш красная линия', 'case', 'm4a4', 'авп азимов', 'sticker paris', 'glock fade')
+WEARS = ('Factory New', 'Minimal Wear', 'Field-Tested', 'Well-Worn', 'Battle-Scarred')
+
+class SteamStub:
+    """Локальный Steam Market: записанные ответы, задержка в мс (с джиттером ±25%) и доля ответов 429"""
+
+    def __init__(self, fixtures: str, latency_ms: float, rate_429: float, etag: bool = False):
+        with open(os.path.join(fixtures, 'priceoverview.json'), encoding='utf-8') as f:
+            self.overviews = json.load(f)
+        with open(os.path.join(fixtures, 'search_render.json'), encoding='utf-8') as f:
+            self.search_page = json.load(f)
+        self.recorded = [body for body in self.overviews.values() if body.get('lowest_price')]
+        self.latency = latency_ms / 1000
+        self.rate_429 = rate_429
+        self.etag = etag
+        self.catalogue = []
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def overview(self, name: str) -> dict:
+        body = self.overviews.get(name)
+        return body if body is not None else self.recorded[zlib.crc32(name.encode('utf-8')) % len(self.recorded)]
+
+    def listing(self, name: str) -> dict:
+        """Результат поиска для предмета каталога: цена priceoverview в центах USD, как у search/render"""
+        cents = int(float(self.overview(name)['lowest_price'].split(' p')[0].replace(' ', '').replace(',', '.').replace('--', '0')) * FX_RATES['USD'] * 100)
+        return {'name': name, 'hash_name': name, 'sell_listings': 1 + zlib.crc32(name.encode('utf-8')) % 500,
+                'sell_price': cents, 'sell_price_text': f'${cents / 100:.2f}', 'asset_description': {'icon_url': ''}}
+
+    def fill_catalogue(self, items: list, size: int, rng: random.Random) -> None:
+        """Каталог для постраничного поиска: отслеживаемые предметы и добивка до size, порядок «по популярности» случайный"""
+        names = list(items) + [f'Catalogue item {index}' for index in range(max(0, size - len(items)))]
+        rng.shuffle(names)
+        self.catalogue = [self.listing(name) for name in names]
+
+    def search(self, query: str, start: int, count: int) -> dict:
+        if not query and self.catalogue:
+            return {**self.search_page, 'start': start, 'pagesize': count, 'total_count': len(self.catalogue),
+                    'results': self.catalogue[start:start + count]}
+        words = query.lower().split()
+        results = [item for item in self.search_page['results'] if all(word in item['hash_name'].lower() for word in words)]
+        return {**self.search_page, 'start': start, 'pagesize': count, 'total_count': len(results), 'results': results[start:start + count]}
+
+    def respond(self, request) -> None:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.75, 1.25))
+        if random.random() < self.rate_429:
+            request.send_response(429)
+            request.send_header('Retry-After', '1')
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+
+        url = urllib.parse.urlparse(request.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path.endswith('/fx'):
+            body = {'base': 'RUB', 'rates': FX_RATES}
+        elif url.path.endswith('/priceoverview/'):
+            body = self.overview(params.get('market_hash_name', [''])[0])
+        elif url.path.endswith('/search/render/'):
+            body = self.search(params.get('query', [''])[0], int(params.get('start', ['0'])[0]), int(params.get('count', ['10'])[0]))
+        elif url.path.endswith('/createbuyorder/'):
+            body = {'success': 1, 'buy_orderid': str(random.randint(10 ** 9, 10 ** 10))}
+        else:
+            request.send_response(404)
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        etag = f'"{zlib.crc32(data):08x}"'
+        if self.etag and request.headers.get('If-None-Match') == etag:
+            with self.lock:
+                self.not_modified += 1
+            request.send_response(304)
+            request.send_header('ETag', etag)
+            request.end_headers()
+            return
+        request.send_response(200)
+        if self.etag:
+            request.send_header('ETag', etag)
+        request.send_header('Content-Type', 'application/json; charset=utf-8')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.respond(self)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                stub.respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+def load_function(name: str) -> tuple:
+    """Импортирует index.py функции с её собственными копиями db, metrics, steam_http и т.д.
+    Возвращает (модуль index, модуль metrics этой функции)"""
+    directory = os.path.join(BACKEND, name)
+    shared = {file[:-3] for file in os.listdir(directory) if file.endswith('.py')}
+    for module in shared:
+        sys.modules.pop(module, None)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f"bench_{name.replace('-', '_')}", os.path.join(directory, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module, sys.modules['metrics']
+    finally:
+        sys.path.remove(directory)
+
+def seed(conn, schema: str, scale: int, items: list, prices: dict) -> dict:
+    """Очищает таблицы и заполняет синтетическими данными: scale треков, scale / 10 пользователей,
+    целевые цены вокруг записанных (примерно каждый четвёртый трек срабатывает), история цен за неделю"""
+    users = max(1, scale // 10)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            TRUNCATE {schema}.purchases, {schema}.notifications, {schema}.tracks, {schema}.users,
+                     {schema}.price_history, {schema}.market_items, {schema}.price_cache, {schema}.fx_rates
+            RESTART IDENTITY CASCADE
+            """
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.users (steam_id, username, steam_cookie, steam_session_id)
+            SELECT 'bench' || g, 'Bench' || g, 'cookie' || g, 'session' || g FROM generate_series(1, %s) g
+            """,
+            (users,)
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.market_items (appid, hash_name, name, icon_url, sell_price_text, sell_listings, last_seen_at)
+            SELECT 730, name, name, 'icon', price::text || ' pуб.', 100, LOCALTIMESTAMP
+            FROM unnest(%s::text[], %s::numeric[]) AS i(name, price)
+            """,
+            (items, [prices[item] for item in items])
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.tracks (user_id, item_name, item_hash_name, target_price, current_price, auto_purchase, currency)
+            SELECT 1 + (g - 1) %% %s, i.name, i.name,
+                   ROUND(i.price * (0.85 + random() * 0.2)::numeric, 2), ROUND(i.price * 1.1, 2),
+                   random() < 0.05, 'RUB'
+            FROM generate_series(1, %s) g
+            JOIN unnest(%s::text[], %s::numeric[]) WITH ORDINALITY AS i(name, price, n)
+                ON i.n = 1 + (g * 7919) %% %s
+            """,
+            (users, scale, items, [prices[item] for item in items], len(items))
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.price_history (item_id, price_cents, recorded_at)
+            SELECT m.id, (split_part(m.sell_price_text, ' ', 1)::numeric * 100 * (0.95 + random() * 0.1))::integer, t
+            FROM {schema}.market_items m
+            CROSS JOIN generate_series((now() AT TIME ZONE 'UTC') - INTERVAL '7 days', now() AT TIME ZONE 'UTC', INTERVAL '1 hour') t
+            """
+        )
+    conn.commit()
+    return {'users': users, 'tracks': scale, 'items': len(items)}
+
+def make_items(stub: SteamStub, count: int) -> list:
+    """Записанные предметы с ценой, дополненные вариантами износа до count уникальных имён"""
+    names = [name for name, body in stub.overviews.items() if body.get('lowest_price')]
+    items = []
+    for index in range(count):
+        name = names[index % len(names)]
+        items.append(name if index < len(names) else f'{name} #{index // len(names)} ({WEARS[index % len(WEARS)]})')
+    return items
+
+def scenarios(context: dict) -> dict:
+    """Сценарий: (функция, генератор события)"""
+    users, items = context['users'], context['items']
+
+    def user_headers(rng):
+        return {'X-Steam-Id': f'bench{rng.randint(1, users)}'}
+
+    return {
+        'steam-price': ('steam-price', lambda rng: {
+            'httpMethod': 'GET',
+            'queryStringParameters': {'item': rng.choice(items), 'currency': rng.choice(('RUB', 'USD', 'EUR'))}
+        }),
+        'steam-search': ('steam-search', lambda rng: {
+            'httpMethod': 'GET',
+            'queryStringParameters': {'q': rng.choice(QUERIES)}
+        }),
+        'tracks-list': ('tracks', lambda rng: {
+            'httpMethod': 'GET',
+            'queryStringParameters': {'limit': '50'},
+            'headers': user_headers(rng)
+        }),
+        'price-history': ('price-history', lambda rng: {
+            'httpMethod': 'GET',
+            'queryStringParameters': {'item': rng.choice(items), 'bucket': 'hour'}
+        }),
+        'update-prices-user': ('update-prices', lambda rng: {
+            'httpMethod': 'POST',
+            'queryStringParameters': {},
+            'headers': user_headers(rng)
+        }),
+        'update-prices-scheduler': ('update-prices', lambda rng: {
+            'httpMethod': 'POST',
+            'queryStringParameters': {'mode': 'scheduler'},
+            'headers': {'X-Refresh-Token': context['token']}
+        }),
+        'update-prices-global': ('update-prices', lambda rng: {
+            'httpMethod': 'POST',
+            'queryStringParameters': {'mode': 'global'},
+            'headers': {'X-Refresh-Token': context['token']}
+        })
+    }
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def run_scenario(handler, metrics, make_event, requests: int, rng: random.Random, verbose: bool = False) -> dict:
+    lines = []
+    metrics.registry.listeners.append(lines.append)
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    try:
+        for _ in range(requests):
+            event = make_event(rng)
+            call_started = time.perf_counter()
+            # print-логи функций (автопокупки, повторы) не мешают таблице результатов
+            with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                response = handler(event, None)
+            latencies.append((time.perf_counter() - call_started) * 1000)
+            statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+    finally:
+        metrics.registry.listeners.remove(lines.append)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'calls': requests,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'p99_ms': round(percentile(latencies, 0.99), 1),
+        'db_round_trips': round(sum(line['spans'].get('db', {}).get('n', 0) for line in lines) / max(1, len(lines)), 2),
+        'db_ms': round(sum(line['spans'].get('db', {}).get('ms', 0) for line in lines) / max(1, len(lines)), 2),
+        'steam_requests': round(sum(line['counters'].get('steam_http.requests', 0) for line in lines) / max(1, len(lines)), 2)
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Регрессии относительно сохранённого прогона: p95 и запросы к БД на вызов"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and result['p95_ms'] - base['p95_ms'] > 1:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if result['db_round_trips'] > base['db_round_trips'] * (1 + tolerance) + 0.5:
+            regressions.append(f"{name}: db round-trips {base['db_round_trips']} -> {result['db_round_trips']}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1000, help='число треков при --seed (10, 1000, 100000)')
+    parser.add_argument('--items', type=int, default=500, help='уникальных предметов при --seed')
+    parser.add_argument('--seed', action='store_true', help='очистить таблицы схемы и заполнить синтетикой')
+    parser.add_argument('--requests', type=int, default=200, help='вызовов на сценарий')
+    parser.add_argument('--global-requests', type=int, default=3, help='вызовов глобального обновления и такта планировщика')
+    parser.add_argument('--only', nargs='*', help='запустить только эти сценарии')
+    parser.add_argument('--latency', type=float, default=50, help='задержка ответа Steam, мс')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--catalogue', type=int, default=20000, help='предметов в каталоге поиска заглушки')
+    parser.add_argument('--etag', action='store_true', help='заглушка отдаёт ETag и 304 на If-None-Match')
+    parser.add_argument('--steam-rate', type=float, default=1000, help='STEAM_RATE_PER_SECOND (в проде 1)')
+    parser.add_argument('--scheduler-budget', type=int, default=30, help='SCHEDULER_BUDGET: предметов на такт')
+    parser.add_argument('--price-cache-ttl', default='300')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для поиска регрессий')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='показывать print-логи функций')
+    args = parser.parse_args()
+
+    schema = os.environ['MAIN_DB_SCHEMA']
+    stub = SteamStub(args.fixtures, args.latency, args.rate_429, args.etag)
+    stub_url = stub.start()
+    token = 'bench-token'
+    # Переменные читаются модулями функций при импорте, поэтому задаются до загрузки
+    os.environ.update({
+        'STEAM_MARKET_URL': f'{stub_url}/market',
+        'FX_RATES_URL': f'{stub_url}/fx',
+        'REFRESH_TOKEN': token,
+        'STEAM_RATE_PER_SECOND': str(args.steam_rate),
+        'STEAM_RATE_BURST': str(max(5, int(args.steam_rate))),
+        'SCHEDULER_BUDGET': str(args.scheduler_budget),
+        'PRICE_CACHE_TTL': args.price_cache_ttl,
+        'METRICS_LOG_SAMPLE': '0',
+        'METRICS_SLOW_MS': 'inf'
+    })
+    functions = {name: load_function(name) for name in FUNCTIONS}
+    update_prices = functions['update-prices'][0]
+
+    db = functions['tracks'][0].get_db_connection()
+    try:
+        if args.seed:
+            items = make_items(stub, args.items)
+            prices = {item: update_prices.parse_price(stub.overview(item)['lowest_price']) for item in items}
+            print('seeded', seed(db, schema, args.scale, items, prices))
+        with db.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {schema}.users")
+            users = cur.fetchone()[0]
+            cur.execute(f"SELECT DISTINCT item_hash_name FROM {schema}.tracks")
+            items = [row[0] for row in cur.fetchall()]
+            cur.execute(f"SELECT COUNT(*) FROM {schema}.tracks WHERE status = 'active'")
+            active = cur.fetchone()[0]
+        db.rollback()
+    finally:
+        functions['tracks'][0].release_db_connection(db)
+    if not users or not items:
+        sys.exit('No users or tracks in the schema, run with --seed')
+
+    stub.fill_catalogue(items, args.catalogue, random.Random(args.random_seed))
+    context = {'users': users, 'items': items, 'token': token}
+    print(f'{users} users, {len(items)} items, {active} active tracks; Steam stub {args.latency:g} ms, 429 rate {args.rate_429:g}')
+    print(f'{"scenario":>24} {"calls":>6} {"rps":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"db/call":>8} {"db ms":>7} {"steam/call":>10}  statuses')
+
+    rng = random.Random(args.random_seed)
+    results = {}
+    for name, (function, make_event) in scenarios(context).items():
+        if args.only and name not in args.only:
+            continue
+        handler, metrics = functions[function][0].handler, functions[function][1]
+        requests = args.global_requests if name in ('update-prices-global', 'update-prices-scheduler') else args.requests
+        result = results[name] = run_scenario(handler, metrics, make_event, requests, rng, args.verbose)
+        print(f'{name:>24} {result["calls"]:6d} {result["rps"]:7.1f} {result["p50_ms"]:6.1f}ms {result["p95_ms"]:6.1f}ms'
+              f' {result["p99_ms"]:6.1f}ms {result["db_round_trips"]:8.2f} {result["db_ms"]:7.2f} {result["steam_requests"]:10.2f}'
+              f'  {result["statuses"]}')
+    print(f'Steam stub served {stub.requests} requests, {stub.not_modified} of them 304')
+
+    report = {
+        'scale': {'users': users, 'items': len(items), 'active_tracks': active},
+        'steam': {'latency_ms': args.latency, 'rate_429': args.rate_429, 'rate_per_second': args.steam_rate},
+        'scenarios': results
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Время получения цен update-prices при разной конкурентности запросов priceoverview.
+
+    python bench/price_fetch_concurrency.py [--items 50] [--latency 100] [--workers 1 8 32]
+
+Для каждого значения --workers (PRICE_FETCH_CONCURRENCY) update-prices запрашивает --items предметов
+поштучно через priceoverview у заглушки Steam из load_test.py с задержкой --latency мс.
+Имена предметов в каждом прогоне новые, поэтому кэш цен функции не помогает. БД не нужна."""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from load_test import SteamStub, load_function
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50, help='предметов за обновление')
+    parser.add_argument('--latency', type=float, default=100, help='задержка ответа Steam, мс')
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 8, 32], help='значения PRICE_FETCH_CONCURRENCY')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    args = parser.parse_args()
+
+    stub = SteamStub(args.fixtures, args.latency, 0)
+    stub_url = stub.start()
+    os.environ.update({
+        'STEAM_MARKET_URL': f'{stub_url}/market',
+        'FX_RATES_URL': f'{stub_url}/fx',
+        'STEAM_RATE_PER_SECOND': '100000',
+        'STEAM_RATE_BURST': '100000',
+        'METRICS_LOG_SAMPLE': '0',
+        'METRICS_SLOW_MS': 'inf'
+    })
+    update_prices, _ = load_function('update-prices')
+    names = [name for name, body in stub.overviews.items() if body.get('lowest_price')]
+
+    print(f'{args.items} items, Steam stub {args.latency:g} ms')
+    print(f'{"workers":>8} {"wall":>9} {"per item":>9} {"priced":>7}')
+    baseline = None
+    for run, workers in enumerate(args.workers):
+        update_prices.PRICE_FETCH_CONCURRENCY = workers
+        items = [(730, f'{names[index % len(names)]} #{run}-{index}') for index in range(args.items)]
+        prices = {}
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            update_prices.fetch_individually(items, prices, {}, {})
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        priced = sum(price is not None for price in prices.values())
+        print(f'{workers:8d} {elapsed:8.2f}s {elapsed / args.items * 1000:7.1f}ms {priced:7d}  x{baseline / elapsed:.1f}')
+
+if __name__ == '__main__':
+    main()
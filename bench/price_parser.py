@@ -0,0 +1,101 @@
+"""Разбор строк цен Steam: прежний inline-разбор (re.search + replace + float) против price_parser.
+
+    python bench/price_parser.py [--count 200000] [--fixture prices.txt]
+
+Корпус — цены во всех форматах валют Steam (или строки из --fixture, по одной на строку).
+Свойство round-trip parse_price_cents(format(cents)) == cents проверяется в tests/test_price_parser.py."""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'update-prices'))
+from price_parser import parse_price, parse_price_cents  # noqa: E402
+
+NBSP = ' '
+NNBSP = ' '
+
+def group(units: int, separator: str) -> str:
+    return f'{units:,}'.replace(',', separator)
+
+# Форматы, в которых Steam показывает цены (валюта → функция от целых копеек)
+FORMATS = {
+    'RUB': lambda c: f'{group(c // 100, " ")},{c % 100:02d} pуб.',
+    'RUB whole': lambda c: f'{group(c // 100, " ")} pуб.' if c % 100 == 0 else f'{group(c // 100, " ")},{c % 100:02d} pуб.',
+    'USD': lambda c: f'${group(c // 100, ",")}.{c % 100:02d}',
+    'GBP': lambda c: f'£{group(c // 100, ",")}.{c % 100:02d}',
+    'EUR': lambda c: f'{group(c // 100, ".")},{c % 100:02d}€',
+    'EUR whole': lambda c: f'{group(c // 100, ".")},--€' if c % 100 == 0 else f'{group(c // 100, ".")},{c % 100:02d}€',
+    'CHF': lambda c: f"CHF {group(c // 100, chr(39))}.{c % 100:02d}",
+    'PLN': lambda c: f'{group(c // 100, NBSP)},{c % 100:02d}zł',
+    'UAH': lambda c: f'{group(c // 100, NNBSP)},{c % 100:02d}₴',
+    'BRL': lambda c: f'R$ {group(c // 100, ".")},{c % 100:02d}',
+    'TRY': lambda c: f'{group(c // 100, ".")},{c % 100:02d} TL',
+    'CNY': lambda c: f'¥ {group(c // 100, ",")}.{c % 100:02d}',
+    'JPY': lambda c: f'¥ {group(c // 100, ",")}',
+}
+WHOLE_ONLY = {'JPY'}
+
+def old_parse(text: str):
+    """Прежний код из update-prices / steam-price"""
+    import re
+    price_match = re.search(r'[\d\s]+[,\.]?\d*', text)
+    if price_match:
+        price_str = price_match.group(0).replace(' ', '').replace(',', '.')
+        try:
+            return float(price_str)
+        except ValueError:
+            return None
+    return None
+
+def random_cents(rng: random.Random) -> int:
+    """Цены от копеек до сотен тысяч: длины целой части и группы разрядов распределены равномерно"""
+    return rng.randrange(0, 10 ** rng.randint(1, 10))
+
+def build_corpus(rng: random.Random, count: int) -> list:
+    corpus = []
+    formats = list(FORMATS.items())
+    for _ in range(count):
+        name, fmt = rng.choice(formats)
+        cents = random_cents(rng)
+        if name in WHOLE_ONLY:
+            cents -= cents % 100
+        corpus.append((fmt(cents), cents))
+    return corpus
+
+def timed(parse, strings: list) -> float:
+    started = time.perf_counter()
+    for text in strings:
+        parse(text)
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--fixture', help='файл с записанными строками цен, по одной на строку')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    if args.fixture:
+        with open(args.fixture, encoding='utf-8') as f:
+            strings = [line.rstrip('\n') for line in f if line.strip()]
+        unparsed = [text for text in strings if parse_price_cents(text) is None]
+        print(f'fixture: {len(strings)} strings, {len(unparsed)} without a price {unparsed[:5]}')
+    else:
+        corpus = build_corpus(rng, args.count)
+        strings = [text for text, _ in corpus]
+        wrong = sum(1 for text, cents in corpus if old_parse(text) is None or round(old_parse(text) * 100) != cents)
+        new_wrong = sum(1 for text, cents in corpus if parse_price_cents(text) != cents)
+        print(f'corpus: {len(strings)} strings, old parser wrong on {wrong} ({wrong / len(strings):.1%}), new parser wrong on {new_wrong}')
+
+    old = timed(old_parse, strings)
+    cents = timed(parse_price_cents, strings)
+    decimal = timed(parse_price, strings)
+    print(f'old inline parse        {old * 1e9 / len(strings):7.0f} ns/price')
+    print(f'parse_price_cents (int) {cents * 1e9 / len(strings):7.0f} ns/price  x{old / cents:.1f}')
+    print(f'parse_price (Decimal)   {decimal * 1e9 / len(strings):7.0f} ns/price  x{old / decimal:.1f}')
+
+if __name__ == '__main__':
+    main()
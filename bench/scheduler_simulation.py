@@ -0,0 +1,124 @@
+"""Свежесть цен при фиксированном бюджете запросов: планировщик с приоритетами против обхода по возрасту.
+
+    python bench/scheduler_simulation.py [--items 2000] [--budget 30] [--hours 24]
+
+Цена каждого предмета — случайное блуждание (10% предметов волатильные), целевые цены на 0-30% ниже
+стартовой, у 10% треков автопокупка. Каждый такт (минута) планировщик получает кандидатов в том же виде,
+что и из БД, и обновляет не больше budget предметов. Меряем возраст цен и задержку, с которой замечаем
+достижение целевой цены."""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'update-prices'))
+from scheduler import plan  # noqa: E402
+
+TICK_SECONDS = 60
+DAY_SECONDS = 24 * 3600
+
+def mean(values: list) -> float:
+    return sum(values) / len(values)
+
+def coefficient_of_variation(values: list):
+    """Как STDDEV_POP / AVG в load_schedule_candidates"""
+    if len(values) < 2:
+        return None
+    average = mean(values)
+    return math.sqrt(mean([(value - average) ** 2 for value in values])) / average
+
+class Item:
+    def __init__(self, rng: random.Random):
+        self.volatile = rng.random() < 0.1
+        self.sigma = 0.01 if self.volatile else 0.001
+        self.price = rng.uniform(50, 5000)
+        self.target = self.price * (1 - rng.uniform(0.0, 0.3))
+        self.auto_purchase = rng.random() < 0.1
+        self.observed = None
+        self.checked_at = None
+        self.samples = []
+        self.volatility = None
+        self.hit_at = None
+        self.detected_at = None
+
+    def step(self, rng: random.Random, now: float) -> None:
+        self.price *= math.exp(rng.gauss(0, self.sigma))
+        if self.hit_at is None and self.price <= self.target:
+            self.hit_at = now
+
+    def observe(self, now: float) -> None:
+        self.observed = self.price
+        self.checked_at = now
+        self.samples = [(at, price) for at, price in self.samples if now - at <= DAY_SECONDS] + [(now, self.price)]
+        self.volatility = coefficient_of_variation([price for _, price in self.samples])
+        if self.hit_at is not None and self.detected_at is None:
+            self.detected_at = now
+
+    def candidate(self, now: float) -> dict:
+        return {
+            'item': self,
+            'age': now - self.checked_at if self.checked_at is not None else None,
+            'target_gap': (self.observed - self.target) / self.target if self.observed is not None else None,
+            'auto_purchase': self.auto_purchase,
+            'volatility': self.volatility
+        }
+
+def oldest_first(candidates: list, budget: int) -> list:
+    """Базовая стратегия: только по возрасту, как обход всех предметов по кругу"""
+    never = [c for c in candidates if c['age'] is None]
+    checked = sorted((c for c in candidates if c['age'] is not None), key=lambda c: -c['age'])
+    return (never + checked)[:budget]
+
+def simulate(strategy, items_count: int, budget: int, hours: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    items = [Item(rng) for _ in range(items_count)]
+    ages, important_ages = [], []
+    started = time.perf_counter()
+
+    for tick in range(int(hours * 3600 / TICK_SECONDS)):
+        now = tick * TICK_SECONDS
+        for item in items:
+            item.step(rng, now)
+        for candidate in strategy([item.candidate(now) for item in items], budget):
+            candidate['item'].observe(now)
+
+        # Возраст цен после такта; первый час — прогрев, пока не проверено всё
+        if now >= 3600:
+            for item in items:
+                age = now - item.checked_at if item.checked_at is not None else now
+                ages.append(age)
+                near_target = item.observed is not None and item.observed <= item.target * 1.05
+                if near_target or item.auto_purchase or item.volatile:
+                    important_ages.append(age)
+
+    hits = [item for item in items if item.hit_at is not None]
+    delays = sorted(item.detected_at - item.hit_at for item in hits if item.detected_at is not None)
+    return {
+        'mean_age_min': mean(ages) / 60,
+        'important_age_min': mean(important_ages) / 60 if important_ages else 0.0,
+        'hits': len(hits),
+        'missed': len(hits) - len(delays),
+        'delay_p50_min': delays[len(delays) // 2] / 60 if delays else 0.0,
+        'delay_p95_min': delays[int(len(delays) * 0.95)] / 60 if delays else 0.0,
+        'seconds': time.perf_counter() - started
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--budget', type=int, default=30, help='запросов к Steam на такт (минуту)')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'{args.items} items, budget {args.budget}/min, full pass every {args.items / args.budget:.0f} min, {args.hours:g} h')
+    print(f'{"strategy":>12} {"mean age":>9} {"important":>10} {"hits":>5} {"missed":>7} {"delay p50":>10} {"p95":>7}')
+    for name, strategy in (('oldest-first', oldest_first), ('priority', lambda c, b: plan(c, b, min_interval=0))):
+        r = simulate(strategy, args.items, args.budget, args.hours, args.seed)
+        print(f'{name:>12} {r["mean_age_min"]:7.1f} m {r["important_age_min"]:8.1f} m {r["hits"]:5d} {r["missed"]:7d}'
+              f' {r["delay_p50_min"]:8.1f} m {r["delay_p95_min"]:5.1f} m')
+
+if __name__ == '__main__':
+    main()
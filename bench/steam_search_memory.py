@@ -0,0 +1,98 @@
+"""Пиковая память разбора ответа search/render: json.loads всего тела против потокового разбора.
+
+    python bench/steam_search_memory.py [--items 100 1000 5000] [--fixture recorded.json]
+
+Без --fixture ответ генерируется в формате Steam (предметы с HTML-описаниями в asset_description)."""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'steam-search'))
+from steam_stream import compact_item, iter_search_results, read_search_page  # noqa: E402
+
+def make_fixture(path: str, items: int) -> None:
+    """Пишет ответ search/render с items предметами, по размеру близкий к настоящему"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"success":true,"start":0,"pagesize":%d,"total_count":%d,' % (items, items))
+        f.write('"searchdata":{"query":"","search_descriptions":false,"total_count":%d,"pagesize":%d},"results":[' % (items, items))
+        for i in range(items):
+            name = f'AK-47 | Предмет {i} (Field-Tested)'
+            if i:
+                f.write(',')
+            json.dump({
+                'name': name,
+                'hash_name': name,
+                'sell_listings': i * 7 % 5000,
+                'sell_price': i,
+                'sell_price_text': f'${i / 100:.2f}',
+                'app_icon': 'https://cdn.steamstatic.com/steamcommunity/public/images/apps/730/icon.jpg',
+                'app_name': 'Counter-Strike 2',
+                'asset_description': {
+                    'appid': 730,
+                    'classid': str(1000000 + i),
+                    'instanceid': '0',
+                    'icon_url': 'i' * 120,
+                    'descriptions': [{'type': 'html', 'value': '<div>' + 'описание ' * 200 + '</div>'} for _ in range(3)],
+                    'tags': [{'category': 'Type', 'internal_name': 'CSGO_Type_Rifle', 'localized_tag_name': 'Rifle'}] * 6,
+                    'name': name,
+                    'market_hash_name': name
+                }
+            }, f, ensure_ascii=False)
+        f.write(']}')
+
+def read_all(f) -> dict:
+    """Прежний способ: всё тело в память, полное дерево, затем выбор полей"""
+    data = json.loads(f.read().decode('utf-8'))
+    return {**data, 'results': [compact_item(item) for item in data['results']]}
+
+def consume(f) -> dict:
+    """Генератор без накопления результатов: так память не зависит от размера страницы"""
+    meta = {'items': 0}
+    for _ in iter_search_results(f, meta):
+        meta['items'] += 1
+    return meta
+
+def measure(parse, path: str) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        result = parse(f)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+def report(path: str, label: str) -> None:
+    size = os.path.getsize(path)
+    full, full_peak, full_time = measure(read_all, path)
+    streamed, stream_peak, stream_time = measure(read_search_page, path)
+    counted, iter_peak, iter_time = measure(consume, path)
+    assert full['results'] == streamed['results'] and full['total_count'] == streamed['total_count']
+    assert counted['items'] == len(full['results'])
+    print(f'{label:>10} {size / 2**20:9.1f} MiB  read-all {full_peak / 2**20:8.1f} MiB {full_time * 1000:6.0f} ms'
+          f'  stream {stream_peak / 2**20:6.2f} MiB {stream_time * 1000:6.0f} ms'
+          f'  generator {iter_peak / 2**20:5.2f} MiB {iter_time * 1000:6.0f} ms')
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--fixture', help='записанный ответ search/render (JSON)')
+    args = parser.parse_args()
+
+    if args.fixture:
+        report(args.fixture, 'fixture')
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        for items in args.items:
+            path = os.path.join(tmp, f'search_{items}.json')
+            make_fixture(path, items)
+            report(path, str(items))
+
+if __name__ == '__main__':
+    main()
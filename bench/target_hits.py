@@ -0,0 +1,106 @@
+"""Поиск сработавших треков при глобальном обновлении: join цен с частичным индексом против загрузки всех треков.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/target_hits.py [--seed --scale 100000 --items 20000] [--updates 5000 200] [--explain]
+
+Для каждого размера --updates берутся случайные предметы активных треков с ценой ±15% от текущей и
+в одной транзакции (с откатом, данные не меняются) измеряются find_target_hits и apply_item_prices
+update-prices. Для сравнения измеряется прежний путь: загрузка всех активных треков и цикл в Python.
+--seed ОЧИЩАЕТ таблицы схемы и заполняет их, как load_test.py --seed."""
+import argparse
+import os
+import random
+import time
+from decimal import Decimal
+
+from load_test import SteamStub, load_function, make_items, seed
+
+def timed(action) -> tuple:
+    started = time.perf_counter()
+    result = action()
+    return result, (time.perf_counter() - started) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', action='store_true', help='очистить таблицы схемы и заполнить синтетикой')
+    parser.add_argument('--scale', type=int, default=100000, help='треков при --seed')
+    parser.add_argument('--items', type=int, default=20000, help='уникальных предметов при --seed')
+    parser.add_argument('--updates', type=int, nargs='*', default=[5000, 200], help='предметов с новой ценой')
+    parser.add_argument('--explain', action='store_true', help='печатать план запроса поиска сработавших треков')
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    args = parser.parse_args()
+
+    os.environ.update({'METRICS_LOG_SAMPLE': '0', 'METRICS_SLOW_MS': 'inf'})
+    update_prices, _ = load_function('update-prices')
+    schema = os.environ['MAIN_DB_SCHEMA']
+    rng = random.Random(args.random_seed)
+
+    conn = update_prices.get_db_connection()
+    try:
+        if args.seed:
+            stub = SteamStub(args.fixtures, 0, 0)
+            items = make_items(stub, args.items)
+            prices = {item: update_prices.parse_price(stub.overview(item)['lowest_price']) for item in items}
+            print('seeded', seed(conn, schema, args.scale, items, prices))
+
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT appid, item_hash_name, currency, MAX(current_price)
+            FROM {schema}.tracks WHERE status = 'active' AND current_price IS NOT NULL
+            GROUP BY appid, item_hash_name, currency
+            """
+        )
+        groups = cur.fetchall()
+        cur.execute(f"SELECT COUNT(*) FROM {schema}.tracks WHERE status = 'active'")
+        active = cur.fetchone()[0]
+        conn.rollback()
+        print(f'{active} active tracks, {len(groups)} item/currency groups')
+        print(f'{"updates":>8} {"hits":>7} {"find hits":>10} {"apply":>9} {"load all":>9} {"py loop":>9}')
+
+        for updates in args.updates:
+            item_prices = [
+                (appid, name, currency, (price * Decimal(rng.uniform(0.85, 1.15))).quantize(Decimal('0.01')))
+                for appid, name, currency, price in rng.sample(groups, min(updates, len(groups)))
+            ]
+            dict_cur = conn.cursor(cursor_factory=update_prices.RealDictCursor)
+            try:
+                hits, find_ms = timed(lambda: update_prices.find_target_hits(dict_cur, item_prices))
+                # execute_values отправил весь VALUES одним запросом, его текст остался в курсоре
+                find_query = dict_cur.query.decode('utf-8')
+                _, apply_ms = timed(lambda: update_prices.apply_item_prices(dict_cur, item_prices))
+                if args.explain:
+                    dict_cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + find_query)
+                    print('\n'.join(row['QUERY PLAN'] for row in dict_cur.fetchall()))
+
+                # Прежний путь: все активные треки в Python и сравнение с ценой по одному
+                def load_all():
+                    dict_cur.execute(
+                        f"""
+                        SELECT {update_prices.TRACK_COLUMNS}
+                        FROM {schema}.tracks t
+                        JOIN {schema}.users u ON u.id = t.user_id
+                        WHERE t.status = 'active'
+                        """
+                    )
+                    return dict_cur.fetchall()
+                tracks, load_ms = timed(load_all)
+                by_item = {(appid, name, currency): price for appid, name, currency, price in item_prices}
+
+                def loop():
+                    return [
+                        track for track in tracks
+                        if (price := by_item.get((track['appid'], track['item_hash_name'], track['currency']))) is not None
+                        and price <= track['target_price']
+                    ]
+                loop_hits, loop_ms = timed(loop)
+                assert len(loop_hits) == len(hits), (len(loop_hits), len(hits))
+            finally:
+                conn.rollback()
+            print(f'{updates:8d} {len(hits):7d} {find_ms:8.1f}ms {apply_ms:7.1f}ms {load_ms:7.1f}ms {loop_ms:7.1f}ms')
+    finally:
+        update_prices.release_db_connection(conn)
+
+if __name__ == '__main__':
+    main()
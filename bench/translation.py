@@ -0,0 +1,79 @@
+"""Перевод русских запросов steam-search: цепочка str.replace против одного выражения-префиксного дерева.
+
+    python bench/translation.py [--terms 0 5000] [--queries 2000] [--repeat 5]
+
+Словарь — steam-search/translations.json; --terms добавляет столько синтетических терминов (0 — только словарь).
+Сравниваются прежняя цепочка replace по словарю, плоская альтернатива терминов от длинных к коротким
+и выражение из build_trie_pattern, которое использует функция."""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'steam-search'))
+from index import TRANSLATIONS, build_trie_pattern  # noqa: E402
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+QUERY_WORDS = ['калаш', 'красная', 'линия', 'после', 'полевых', 'испытаний', 'нож', 'градиент', 'войска', 'накал', 'скин', 'дешёвый']
+
+def synthetic_terms(count: int, rng: random.Random) -> dict:
+    """Случайные термины из одного-двух слов с общими префиксами, как у названий скинов"""
+    stems = [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 6))) for _ in range(max(1, count // 10))]
+    terms = {}
+    while len(terms) < count:
+        word = rng.choice(stems) + ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 5)))
+        if rng.random() < 0.3:
+            word += ' ' + rng.choice(stems)
+        terms[word] = f'term{len(terms)}'
+    return terms
+
+def chained_replace(translations: dict):
+    def translate(text: str) -> str:
+        text = text.lower()
+        for ru, en in translations.items():
+            text = text.replace(ru, en)
+        return text
+    return translate
+
+def flat_alternation(translations: dict):
+    pattern = re.compile(r'(?<!\w)(?:' + '|'.join(re.escape(term) for term in sorted(translations, key=len, reverse=True)) + r')(?!\w)')
+    return lambda text: pattern.sub(lambda match: translations[match.group(0)], text.lower())
+
+def trie_regex(translations: dict):
+    pattern = re.compile(r'(?<!\w)(?:' + build_trie_pattern(list(translations)) + r')(?!\w)')
+    return lambda text: pattern.sub(lambda match: translations[match.group(0)], text.lower())
+
+def measure(translate, queries: list, repeat: int) -> float:
+    """Лучшее из repeat среднее время на запрос, мкс"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for query in queries:
+            translate(query)
+        best = min(best, (time.perf_counter() - started) / len(queries))
+    return best * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--terms', type=int, nargs='*', default=[0, 5000], help='синтетических терминов сверх словаря')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--random-seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    print(f'{"terms":>7} {"method":>18} {"build":>10} {"per query":>11}')
+    for extra in args.terms:
+        translations = {**TRANSLATIONS, **synthetic_terms(extra, rng)} if extra else dict(TRANSLATIONS)
+        words = QUERY_WORDS + list(translations)[:200]
+        queries = [' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(args.queries)]
+        for name, build in (('chained replace', chained_replace), ('flat alternation', flat_alternation), ('trie regex', trie_regex)):
+            started = time.perf_counter()
+            translate = build(translations)
+            build_ms = (time.perf_counter() - started) * 1000
+            print(f'{len(translations):7d} {name:>18} {build_ms:8.1f}ms {measure(translate, queries, args.repeat):9.2f}us')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Запросы к БД и время пользовательского обновления цен (update-prices) в зависимости от числа треков.
+
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p... \\
+    python bench/update_round_trips.py [--tracks 10 100 1000] [--requests 5]
+
+Стенд заводит пользователя bench-round-trips (его треки пересоздаются, остальные данные схемы не трогаются):
+каждый трек на своём предмете, все достигают целевой цены, каждый десятый с автопокупкой. Первый вызов
+прогревает кэш цен функции, дальше Steam не запрашивается. Перед каждым измеряемым вызовом current_price
+сбрасывается, чтобы обновление переписывало цену каждого трека."""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from load_test import SteamStub, load_function, percentile
+
+STEAM_ID = 'bench-round-trips'
+
+def seed_tracks(conn, schema: str, tracks: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.users (steam_id, username, steam_cookie, steam_session_id)
+            VALUES (%s, 'bench-round-trips', 'cookie', 'session')
+            ON CONFLICT (steam_id) DO UPDATE SET steam_cookie = EXCLUDED.steam_cookie
+            RETURNING id
+            """,
+            (STEAM_ID,)
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute(f"DELETE FROM {schema}.purchase_outbox WHERE user_id = %s", (user_id,))
+        cur.execute(f"DELETE FROM {schema}.tracks WHERE user_id = %s", (user_id,))
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.tracks (user_id, item_name, item_hash_name, target_price, auto_purchase)
+            SELECT %s, 'Round trip item ' || i, 'Round trip item ' || i, 9999999, i %% 10 = 0
+            FROM generate_series(1, %s) i
+            """,
+            (user_id, tracks)
+        )
+    conn.commit()
+
+def reset_prices(conn, schema: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {schema}.tracks SET current_price = NULL
+            WHERE user_id = (SELECT id FROM {schema}.users WHERE steam_id = %s)
+            """,
+            (STEAM_ID,)
+        )
+        cur.execute(f"DELETE FROM {schema}.purchase_outbox WHERE user_id = (SELECT id FROM {schema}.users WHERE steam_id = %s)", (STEAM_ID,))
+    conn.commit()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tracks', type=int, nargs='*', default=[10, 100, 1000], help='треков у пользователя')
+    parser.add_argument('--requests', type=int, default=5, help='измеряемых вызовов на размер')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    args = parser.parse_args()
+
+    stub = SteamStub(args.fixtures, 0, 0)
+    stub_url = stub.start()
+    os.environ.update({
+        'STEAM_MARKET_URL': f'{stub_url}/market',
+        'FX_RATES_URL': f'{stub_url}/fx',
+        'STEAM_RATE_PER_SECOND': '100000',
+        'STEAM_RATE_BURST': '100000',
+        'METRICS_LOG_SAMPLE': '0',
+        'METRICS_SLOW_MS': 'inf'
+    })
+    update_prices, metrics = load_function('update-prices')
+    schema = os.environ['MAIN_DB_SCHEMA']
+    event = {'httpMethod': 'POST', 'queryStringParameters': {}, 'headers': {'X-Steam-Id': STEAM_ID}}
+
+    print(f'{"tracks":>7} {"db/call":>8} {"p50":>9} {"max":>9}  statuses')
+    for tracks in args.tracks:
+        conn = update_prices.get_db_connection()
+        try:
+            seed_tracks(conn, schema, tracks)
+            with contextlib.redirect_stdout(io.StringIO()):
+                update_prices.handler(event, None)
+
+            lines = []
+            latencies = []
+            statuses = {}
+            metrics.registry.listeners.append(lines.append)
+            try:
+                for _ in range(args.requests):
+                    reset_prices(conn, schema)
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        response = update_prices.handler(event, None)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+            finally:
+                metrics.registry.listeners.remove(lines.append)
+        finally:
+            update_prices.release_db_connection(conn)
+
+        latencies.sort()
+        round_trips = sum(line['spans'].get('db', {}).get('n', 0) for line in lines) / max(1, len(lines))
+        print(f'{tracks:7d} {round_trips:8.2f} {percentile(latencies, 0.5):7.1f}ms {latencies[-1]:7.1f}ms  {statuses}')
+
+if __name__ == '__main__':
+    main()
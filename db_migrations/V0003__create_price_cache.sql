@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS price_cache (
+    cache_key VARCHAR(600) PRIMARY KEY,
+    value TEXT NOT NULL,
+    stored_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    accessed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    refreshing_until TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_cache_accessed_at ON price_cache(accessed_at);
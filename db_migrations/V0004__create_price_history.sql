@@ -0,0 +1,14 @@
+CREATE TABLE IF NOT EXISTS market_items (
+    id SERIAL PRIMARY KEY,
+    hash_name VARCHAR(500) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    item_id INTEGER NOT NULL REFERENCES market_items(id),
+    price_cents INTEGER NOT NULL,
+    recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_history_recorded_at ON price_history USING BRIN (recorded_at);
+CREATE INDEX IF NOT EXISTS idx_price_history_item_id_recorded_at ON price_history(item_id, recorded_at);
@@ -0,0 +1,4 @@
+CREATE INDEX IF NOT EXISTS idx_tracks_user_id_created_at ON tracks(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tracks_user_id_status_created_at ON tracks(user_id, status, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_tracks_user_id;
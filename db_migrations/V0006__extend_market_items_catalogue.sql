@@ -0,0 +1,9 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS name VARCHAR(500);
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS icon_url TEXT;
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS sell_price_text VARCHAR(50);
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS sell_listings INTEGER;
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_market_items_hash_name_trgm ON market_items USING GIN (lower(hash_name) gin_trgm_ops);
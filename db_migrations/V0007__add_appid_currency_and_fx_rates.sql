@@ -0,0 +1,14 @@
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS appid INTEGER NOT NULL DEFAULT 730;
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS currency VARCHAR(3) NOT NULL DEFAULT 'RUB';
+
+ALTER TABLE purchases ADD COLUMN IF NOT EXISTS currency VARCHAR(3) NOT NULL DEFAULT 'RUB';
+
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS appid INTEGER NOT NULL DEFAULT 730;
+ALTER TABLE market_items DROP CONSTRAINT IF EXISTS market_items_hash_name_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_market_items_appid_hash_name ON market_items(appid, hash_name);
+
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency VARCHAR(3) PRIMARY KEY,
+    rate NUMERIC(20, 10) NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
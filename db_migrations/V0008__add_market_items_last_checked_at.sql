@@ -0,0 +1 @@
+ALTER TABLE market_items ADD COLUMN IF NOT EXISTS last_checked_at TIMESTAMP;
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_tracks_active_item_target ON tracks(item_hash_name, target_price) WHERE status = 'active';
@@ -0,0 +1,28 @@
+CREATE TABLE IF NOT EXISTS purchase_outbox (
+    id SERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(100) NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
+    appid INTEGER NOT NULL,
+    item_name VARCHAR(500) NOT NULL,
+    item_hash_name VARCHAR(500) NOT NULL,
+    item_image TEXT,
+    price DECIMAL(10, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    buy_order_id VARCHAR(100),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_purchase_outbox_track_id ON purchase_outbox(track_id);
+CREATE INDEX IF NOT EXISTS idx_purchase_outbox_due ON purchase_outbox(next_attempt_at, user_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_purchase_outbox_processing ON purchase_outbox(updated_at) WHERE status = 'processing';
+
+ALTER TABLE purchases ADD COLUMN IF NOT EXISTS outbox_id INTEGER REFERENCES purchase_outbox(id);
+ALTER TABLE purchases ADD COLUMN IF NOT EXISTS attempts INTEGER;
+ALTER TABLE purchases ADD COLUMN IF NOT EXISTS error TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_purchases_outbox_id ON purchases(outbox_id);
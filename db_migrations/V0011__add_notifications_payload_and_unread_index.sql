@@ -0,0 +1,6 @@
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS track_id INTEGER;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS payload JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_unread ON notifications(user_id, id) WHERE is_read = FALSE;
+
+DROP INDEX IF EXISTS idx_notifications_is_read;
@@ -0,0 +1,8 @@
+ALTER TABLE purchase_outbox ALTER COLUMN track_id DROP NOT NULL;
+ALTER TABLE purchase_outbox DROP CONSTRAINT IF EXISTS purchase_outbox_track_id_fkey;
+ALTER TABLE purchase_outbox ADD CONSTRAINT purchase_outbox_track_id_fkey
+    FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE SET NULL;
+
+ALTER TABLE purchases DROP CONSTRAINT IF EXISTS purchases_track_id_fkey;
+ALTER TABLE purchases ADD CONSTRAINT purchases_track_id_fkey
+    FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE SET NULL;
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS catalogue_sync (
+    appid INTEGER PRIMARY KEY,
+    next_start INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER,
+    pass_started_at TIMESTAMP,
+    synced_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
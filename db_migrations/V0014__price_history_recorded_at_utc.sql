@@ -0,0 +1,3 @@
+-- recorded_at — наивное время UTC: API истории цен сравнивает его с границами в UTC,
+-- а CURRENT_TIMESTAMP в наивной колонке зависел бы от часового пояса сессии
+ALTER TABLE price_history ALTER COLUMN recorded_at SET DEFAULT (now() AT TIME ZONE 'UTC');
@@ -284,6 +284,11 @@ const Index = () => {
           title: '🎉 Автопокупка выполнена!',
           description: `Куплено предметов: ${data.purchases_made.length}`,
         });
+      } else if (data.purchases_queued && data.purchases_queued.length > 0) {
+        toast({
+          title: '🎉 Автопокупка запущена!',
+          description: `Заявок на покупку: ${data.purchases_queued.length}`,
+        });
       } else if (data.price_drops && data.price_drops.length > 0) {
         toast({
           title: '🎯 Цена достигнута!',
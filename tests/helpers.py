@@ -0,0 +1,17 @@
+"""Импорт модулей облачной функции с её собственными копиями общих модулей (db, metrics, steam_http...)."""
+import importlib
+import os
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+def load_module(function: str, module: str = 'index'):
+    """Импортирует module из backend/<function>; копии общих модулей другой функции выгружаются"""
+    directory = os.path.join(BACKEND, function)
+    for name in {file[:-3] for file in os.listdir(directory) if file.endswith('.py')}:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, directory)
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(directory)
@@ -0,0 +1,83 @@
+import os
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from helpers import load_module
+
+class SearchPricesTest(unittest.TestCase):
+    def setUp(self):
+        self.bulk = load_module('update-prices', 'bulk_prices')
+
+    def search(self, catalogue: list, names: set) -> tuple:
+        def fetch_search_page(appid, start):
+            results = [{'hash_name': name, 'sell_listings': 1, 'sell_price': 150} for name in catalogue[start:start + self.bulk.BULK_PAGE_SIZE]]
+            return {'total_count': len(catalogue), 'results': results}
+        with mock.patch.object(self.bulk, 'fetch_search_page', fetch_search_page):
+            return self.bulk.search_prices(730, names)
+
+    def test_dense_catalogue_is_paged_to_the_end(self):
+        catalogue = [f'item {index}' for index in range(1000)]
+        found, pages = self.search(catalogue, set(catalogue[::4]))
+        self.assertEqual(len(found), 250)
+        self.assertEqual(pages, 10)
+
+    def test_paging_stops_when_yield_drops(self):
+        # Отслеживаемые предметы только на первых страницах, дальше каталог без них
+        catalogue = [f'item {index}' for index in range(100000)]
+        names = set(catalogue[:300:2]) | {'never listed %d' % index for index in range(500)}
+        found, pages = self.search(catalogue, names)
+        self.assertEqual(len(found), 150)
+        self.assertLessEqual(pages, 3 + self.bulk.BULK_YIELD_WINDOW)
+        # Страниц плюс поштучных запросов не больше, чем поштучных на все предметы плюс окно
+        self.assertLessEqual(pages + len(names) - len(found), len(names) + self.bulk.BULK_YIELD_WINDOW)
+
+class ExchangeTest(unittest.TestCase):
+    def test_search_price_round_trips_without_double_rounding(self):
+        fx_rates = load_module('update-prices', 'fx_rates').FxRates()
+        fx_rates.current = lambda: {'USD': 0.0123, 'EUR': 0.0109}
+        for cents in range(1, 2000, 7):
+            amount = Decimal(cents) / 100
+            with self.subTest(amount=amount):
+                self.assertEqual(fx_rates.exchange(amount, 'USD', 'USD'), amount)
+                self.assertEqual(
+                    fx_rates.exchange(amount, 'USD', 'EUR'),
+                    (amount / Decimal('0.0123') * Decimal('0.0109')).quantize(Decimal('0.01'))
+                )
+        self.assertIsNone(fx_rates.exchange(Decimal(1), 'USD', 'GBP'))
+
+class UnconfirmedEstimateTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load_module('update-prices')
+        self.index.fx_rates.current = lambda: {'USD': 0.01}
+        self.item = (730, 'AK-47 | Redline (Field-Tested)')
+
+    def process(self, estimate: Decimal, failures: dict) -> tuple:
+        track = {
+            'id': 1, 'appid': self.item[0], 'item_hash_name': self.item[1], 'currency': 'RUB',
+            'current_price': Decimal('150.00'), 'target_price': Decimal('100.00')
+        }
+        prices = {self.item: estimate * 100}
+        estimated = {self.item: estimate}
+        with mock.patch.dict(os.environ, {'MAIN_DB_SCHEMA': 'app'}), \
+                mock.patch.object(self.index, 'execute_values') as execute_values, \
+                mock.patch.object(self.index, 'handle_target_hits', return_value=([], [])) as handle_target_hits:
+            result = self.index.process_tracks(None, [track], prices, failures, estimated)
+        return result, execute_values, handle_target_hits
+
+    def test_estimate_below_target_keeps_old_price(self):
+        # Подтверждение не удалось: цена трека остаётся прежней, чтобы следующее обновление увидело пересечение цели
+        result, execute_values, handle_target_hits = self.process(Decimal('0.90'), {self.item: 'HTTP 429'})
+        execute_values.assert_not_called()
+        handle_target_hits.assert_called_once_with(None, [])
+        self.assertEqual(result['errors'], [{'track_id': 1, 'item_name': self.item[1], 'error': 'HTTP 429'}])
+        self.assertEqual(result['changed'], 0)
+
+    def test_estimate_above_target_is_shown(self):
+        result, execute_values, handle_target_hits = self.process(Decimal('1.20'), {})
+        self.assertEqual(execute_values.call_args.args[2], [(1, Decimal('120.00'))])
+        handle_target_hits.assert_called_once_with(None, [])
+        self.assertEqual(result['changed'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
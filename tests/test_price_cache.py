@@ -0,0 +1,109 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from helpers import load_module
+
+class PriceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.module = load_module('update-prices', 'price_cache')
+        self.now = 1000.0
+        patcher = mock.patch.object(self.module, 'time', SimpleNamespace(time=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = self.module.PriceCache(self.module.MemoryBackend(10), ttl=300, grace=600)
+        self.fetches = []
+
+    def fetch(self, value):
+        def fetch():
+            self.fetches.append(value)
+            return value
+        return fetch
+
+    def test_fresh_entry_is_served_without_fetch(self):
+        self.assertEqual(self.cache.get_or_fetch('a', self.fetch(1)), (1, 'MISS'))
+        self.now += 300
+        self.assertEqual(self.cache.get_or_fetch('a', self.fetch(2)), (1, 'HIT'))
+        self.assertEqual(self.cache.peek('a'), 1)
+        self.assertEqual(self.fetches, [1])
+
+    def test_stale_entry_is_refreshed_by_one_request(self):
+        self.cache.get_or_fetch('a', self.fetch(1))
+        self.now += 301
+        results = []
+
+        def refresh():
+            # Пока этот запрос обновляет запись, остальные получают устаревшее значение
+            results.append(self.cache.get_or_fetch('a', self.fetch(3)))
+            return self.fetch(2)()
+
+        self.assertEqual(self.cache.get_or_fetch('a', refresh), (2, 'REFRESH'))
+        self.assertEqual(results, [(1, 'STALE')])
+        self.assertEqual(self.fetches, [1, 2])
+        self.assertEqual(self.cache.get_or_fetch('a', self.fetch(4)), (2, 'HIT'))
+
+    def test_stale_entry_is_served_when_refresh_fails(self):
+        self.cache.get_or_fetch('a', self.fetch(1))
+        self.now += 301
+
+        def failing():
+            raise OSError('Steam is down')
+
+        with mock.patch('builtins.print'):
+            self.assertEqual(self.cache.get_or_fetch('a', failing), (1, 'STALE'))
+        self.now += self.module.PRICE_CACHE_LOCK_SECONDS + 1
+        self.assertEqual(self.cache.get_or_fetch('a', self.fetch(None)), (1, 'STALE'))
+        self.assertIsNone(self.cache.peek('a'))
+
+    def test_entry_past_grace_is_fetched_again(self):
+        self.cache.get_or_fetch('a', self.fetch(1))
+        self.now += 901
+        self.assertEqual(self.cache.get_or_fetch('a', self.fetch(2)), (2, 'MISS'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = self.module.MemoryBackend(2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual([key for key in backend.entries], ['a', 'c'])
+
+    def test_concurrent_misses_share_one_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+        waiting = threading.Semaphore(0)
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.fetch(1)()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.fetch_once('a', slow)))
+        leader.start()
+        started.wait(5)
+        event = self.cache.inflight['a']
+        wait = event.wait
+
+        def counted_wait(timeout=None):
+            waiting.release()
+            return wait(timeout)
+
+        event.wait = counted_wait
+        followers = [threading.Thread(target=lambda: results.append(self.cache.fetch_once('a', self.fetch(2)))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        for _ in followers:
+            self.assertTrue(waiting.acquire(timeout=5))
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(self.fetches, [1])
+        self.assertEqual(results, [1, 1, 1, 1])
+        self.assertEqual(self.cache.inflight, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime
+
+from helpers import load_module
+
+class ParseBoundTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load_module('price-history')
+
+    def test_offsets_are_converted_to_naive_utc(self):
+        cases = {
+            '2026-10-10T00:00:00': datetime(2026, 10, 10),
+            '2026-10-10T00:00:00Z': datetime(2026, 10, 10),
+            '2026-10-10T03:00:00+03:00': datetime(2026, 10, 10),
+            '2026-10-09T21:00:00-03:00': datetime(2026, 10, 10),
+            '2026-10-10': datetime(2026, 10, 10)
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                bound = self.index.parse_bound(value)
+                self.assertIsNone(bound.tzinfo)
+                self.assertEqual(bound, expected)
+
+    def test_mixed_bounds_are_comparable(self):
+        date_from = self.index.parse_bound('2026-10-01T00:00:00+03:00')
+        date_to = self.index.parse_bound('2026-10-10T00:00:00Z')
+        self.assertLess(date_from, date_to)
+        self.assertLess(date_to, datetime.utcnow())
+
+    def test_invalid_bound_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.index.parse_bound('yesterday')
+
+    def test_aware_bound_against_default_to(self):
+        response = self.index.handler({
+            'httpMethod': 'GET',
+            'queryStringParameters': {'item': 'Item', 'from': '2020-01-01T00:00:00Z'}
+        }, None)
+        # Диапазон длиннее года отклоняется проверкой, а не падает на сравнении aware с naive
+        self.assertEqual(response['statusCode'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
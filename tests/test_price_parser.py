@@ -0,0 +1,83 @@
+import random
+import unittest
+from decimal import Decimal
+
+from helpers import load_module
+
+NBSP = ' '
+NNBSP = ' '
+
+def group(units: int, separator: str) -> str:
+    return f'{units:,}'.replace(',', separator)
+
+def group_indian(units: int) -> str:
+    """Индийская запись: последняя тройка разрядов, перед ней группы по две — 1,23,45,678"""
+    head, tail = str(units)[:-3], str(units)[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ','.join(([head] if head else []) + groups + [tail])
+
+# Форматы, в которых Steam показывает цены (валюта → функция от целых копеек)
+FORMATS = {
+    'RUB': lambda c: f'{group(c // 100, " ")},{c % 100:02d} pуб.',
+    'RUB whole': lambda c: f'{group(c // 100, " ")} pуб.' if c % 100 == 0 else f'{group(c // 100, " ")},{c % 100:02d} pуб.',
+    'USD': lambda c: f'${group(c // 100, ",")}.{c % 100:02d}',
+    'GBP': lambda c: f'£{group(c // 100, ",")}.{c % 100:02d}',
+    'EUR': lambda c: f'{group(c // 100, ".")},{c % 100:02d}€',
+    'EUR whole': lambda c: f'{group(c // 100, ".")},--€' if c % 100 == 0 else f'{group(c // 100, ".")},{c % 100:02d}€',
+    'CHF': lambda c: f"CHF {group(c // 100, chr(39))}.{c % 100:02d}",
+    'PLN': lambda c: f'{group(c // 100, NBSP)},{c % 100:02d}zł',
+    'UAH': lambda c: f'{group(c // 100, NNBSP)},{c % 100:02d}₴',
+    'BRL': lambda c: f'R$ {group(c // 100, ".")},{c % 100:02d}',
+    'TRY': lambda c: f'{group(c // 100, ".")},{c % 100:02d} TL',
+    'CNY': lambda c: f'¥ {group(c // 100, ",")}.{c % 100:02d}',
+    'JPY': lambda c: f'¥ {group(c // 100, ",")}',
+    'INR': lambda c: f'₹ {group_indian(c // 100)}.{c % 100:02d}',
+}
+WHOLE_ONLY = {'JPY'}
+
+class PriceParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = load_module('update-prices', 'price_parser')
+
+    def test_round_trip(self):
+        # Цены от копеек до сотен миллионов: длины целой части и группы разрядов распределены равномерно
+        rng = random.Random(1)
+        for name, fmt in FORMATS.items():
+            for _ in range(500):
+                cents = rng.randrange(0, 10 ** rng.randint(1, 10))
+                if name in WHOLE_ONLY:
+                    cents -= cents % 100
+                text = fmt(cents)
+                with self.subTest(text=text):
+                    self.assertEqual(self.parser.parse_price_cents(text), cents)
+                    self.assertEqual(self.parser.parse_price(text), Decimal(cents) / 100)
+
+    def test_known_strings(self):
+        cases = {
+            '₹ 1,23,456.00': 12345600,
+            '₹ 12,34,56,789.50': 12345678950,
+            '₹ 999.00': 99900,
+            "CHF 1'234.56": 123456,
+            "CHF 12.5": 1250,
+            '12,--€': 1200,
+            '1.234,--€': 123400,
+            '1 234,56 pуб.': 123456,
+            '$1,234.56': 123456,
+            '12,34€': 1234,
+            '--': None,
+            '': None,
+            None: None,
+        }
+        for text, cents in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.parser.parse_price_cents(text), cents)
+
+    def test_copies_are_identical(self):
+        steam_price = load_module('steam-price', 'price_parser')
+        self.assertEqual(steam_price.PRICE_PATTERN.pattern, self.parser.PRICE_PATTERN.pattern)
+
+if __name__ == '__main__':
+    unittest.main()
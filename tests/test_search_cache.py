@@ -0,0 +1,73 @@
+import json
+import unittest
+from unittest import mock
+
+from helpers import load_module
+
+AWP = [
+    {'hash_name': 'AWP | Asiimov (Field-Tested)'},
+    {'hash_name': 'AWP | Asiimov (Battle-Scarred)'},
+    {'hash_name': 'AWP | Dragon Lore (Factory New)'}
+]
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = load_module('steam-search', 'search_cache').SearchCache(max_entries=10, ttl=300)
+
+    def test_exact_hit(self):
+        self.cache.put(730, 'awp', AWP, complete=False)
+        self.assertEqual(self.cache.get(730, 'awp'), (AWP, 'HIT'))
+        self.assertEqual(self.cache.get(570, 'awp'), (None, 'MISS'))
+
+    def test_prefix_hit_filters_complete_set(self):
+        self.cache.put(730, 'awp', AWP, complete=True)
+        results, status = self.cache.get(730, 'awp asiimov')
+        self.assertEqual(status, 'PREFIX')
+        self.assertEqual([item['hash_name'] for item in results], ['AWP | Asiimov (Field-Tested)', 'AWP | Asiimov (Battle-Scarred)'])
+        # Пустой результат из полного набора — тоже окончательный ответ
+        self.assertEqual(self.cache.get(730, 'awp howl'), ([], 'PREFIX'))
+
+    def test_incomplete_set_is_not_reused_for_narrower_queries(self):
+        self.cache.put(730, 'awp', AWP, complete=False)
+        self.assertEqual(self.cache.get(730, 'awp asiimov'), (None, 'MISS'))
+        self.assertEqual(self.cache.get(730, 'awp howl'), (None, 'MISS'))
+
+    def test_longest_complete_prefix_wins(self):
+        self.cache.put(730, 'awp', AWP, complete=True)
+        self.cache.put(730, 'awp asiimov', AWP[:1], complete=True)
+        self.assertEqual(self.cache.get(730, 'awp asiimov battle'), ([], 'PREFIX'))
+
+    def test_expired_entry_is_a_miss(self):
+        self.cache.put(730, 'awp', AWP, complete=True)
+        with mock.patch('time.monotonic', return_value=10 ** 9):
+            self.assertEqual(self.cache.get(730, 'awp'), (None, 'MISS'))
+            self.assertEqual(self.cache.get(730, 'awp asiimov'), (None, 'MISS'))
+
+class SearchHandlerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load_module('steam-search')
+        self.index.search_cache = load_module('steam-search', 'search_cache').SearchCache()
+
+    def search(self, query: str) -> tuple:
+        response = self.index.handler({'httpMethod': 'GET', 'queryStringParameters': {'q': query}}, None)
+        return response['headers']['X-Cache'], json.loads(response['body'])['total']
+
+    def test_handler_reuses_exact_and_prefix_results(self):
+        find_items = mock.Mock(return_value=(AWP, True, 'steam'))
+        with mock.patch.object(self.index, 'find_items', find_items):
+            self.assertEqual(self.search('AWP'), ('MISS', 3))
+            # Регистр, пробелы и перевод с русского дают тот же ключ
+            self.assertEqual(self.search('  авп '), ('HIT', 3))
+            self.assertEqual(self.search('awp asiimov'), ('PREFIX', 2))
+        find_items.assert_called_once_with('awp', 730)
+
+    def test_handler_refetches_when_cached_set_is_incomplete(self):
+        find_items = mock.Mock(side_effect=[(AWP, False, 'catalogue'), (AWP[:2], True, 'steam')])
+        with mock.patch.object(self.index, 'find_items', find_items):
+            self.assertEqual(self.search('awp'), ('MISS', 3))
+            self.assertEqual(self.search('awp asiimov'), ('MISS', 2))
+            self.assertEqual(self.search('awp asiimov'), ('HIT', 2))
+        self.assertEqual(find_items.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
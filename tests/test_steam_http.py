@@ -0,0 +1,136 @@
+import io
+import json
+import unittest
+import urllib.error
+from unittest import mock
+
+from helpers import load_module
+
+class FakeClock:
+    """time.monotonic / time.sleep без реального ожидания: sleep сдвигает часы"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body: dict, headers: dict = None):
+        super().__init__(json.dumps(body).encode('utf-8'))
+        self.headers = headers or {}
+
+def http_error(code: int, headers: dict = None) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError('https://steam.test/', code, 'error', headers or {}, None)
+
+class SteamHttpTest(unittest.TestCase):
+    url = 'https://steam.test/market/priceoverview/?appid=730'
+
+    def setUp(self):
+        self.http = load_module('update-prices', 'steam_http')
+        self.clock = FakeClock()
+        self.requests = []
+        self.responses = []
+        self.patch(self.http, 'time', self.clock)
+        self.patch(self.http.urllib.request, 'urlopen', self.urlopen)
+        self.patch(self.http, 'bucket', self.http.TokenBucket(1, 5))
+        self.patch(self.http, 'breaker', self.http.CircuitBreaker(3, 60))
+        self.patch(self.http, 'validators', self.http.Validators(10))
+        self.patch(self.http.random, 'uniform', lambda low, high: high)
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch(self, target, attribute: str, value) -> None:
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def urlopen(self, request, timeout=None):
+        self.requests.append(request)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_server_errors_back_off_with_full_jitter(self):
+        self.responses = [http_error(503), http_error(502), FakeResponse({'success': True})]
+        with mock.patch.object(self.http.random, 'uniform', side_effect=lambda low, high: high / 2) as uniform:
+            self.assertEqual(self.http.request_json(self.url), {'success': True})
+        self.assertEqual(uniform.call_args_list, [mock.call(0, 0.5), mock.call(0, 1.0)])
+        self.assertEqual(self.clock.sleeps, [0.25, 0.5])
+
+    def test_retry_after_pauses_the_bucket(self):
+        self.responses = [http_error(429, {'Retry-After': '7'}), FakeResponse({'success': True})]
+        self.assertEqual(self.http.request_json(self.url), {'success': True})
+        # Ожидание после 429 — пауза token bucket, а не отдельный sleep: Retry-After, затем токен копится заново
+        self.assertEqual(self.clock.sleeps, [7.0, 1.0])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_bucket_pause_blocks_other_requests(self):
+        self.http.bucket.pause(3)
+        with self.assertRaises(self.http.SteamRateLimited):
+            self.http.bucket.acquire(max_wait=2)
+        self.assertEqual(self.clock.sleeps, [])
+        self.http.bucket.acquire(max_wait=5)
+        # После паузы токенов нет: ещё секунда на один токен при 1 rps
+        self.assertEqual(self.clock.sleeps, [3.0, 1.0])
+
+    def test_exhausted_bucket_fails_fast_after_deadline(self):
+        self.responses = [FakeResponse({'success': True}) for _ in range(5)]
+        for _ in range(5):
+            self.http.request_json(self.url, deadline=self.clock.now)
+        with self.assertRaises(self.http.SteamRateLimited):
+            self.http.request_json(self.url, deadline=self.clock.now)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_rate_limited_after_retries(self):
+        self.responses = [http_error(429), http_error(429)]
+        with self.assertRaises(self.http.SteamRateLimited):
+            self.http.request_json(self.url, retries=1)
+        self.assertEqual(self.http.breaker.failures, 1)
+
+    def test_breaker_opens_and_lets_one_probe_through(self):
+        self.responses = [http_error(500) for _ in range(3)]
+        for _ in range(3):
+            with self.assertRaises(self.http.SteamHttpError):
+                self.http.request_json(self.url, retries=0)
+        with self.assertRaises(self.http.SteamUnavailable):
+            self.http.request_json(self.url, retries=0)
+        self.assertEqual(len(self.requests), 3)
+
+        # Через reset_seconds проходит один пробный запрос; неудача снова размыкает цепь
+        self.clock.now += 60
+        self.responses = [http_error(500)]
+        with self.assertRaises(self.http.SteamHttpError):
+            self.http.request_json(self.url, retries=0)
+        with self.assertRaises(self.http.SteamUnavailable):
+            self.http.request_json(self.url, retries=0)
+
+        self.clock.now += 60
+        self.responses = [FakeResponse({'success': True}), FakeResponse({'success': True})]
+        self.assertEqual(self.http.request_json(self.url, retries=0), {'success': True})
+        self.assertEqual(self.http.request_json(self.url, retries=0), {'success': True})
+        self.assertEqual(len(self.requests), 6)
+
+    def test_not_modified_returns_the_stored_result(self):
+        self.responses = [FakeResponse({'lowest_price': '10,00 pуб.'}, {'ETag': '"v1"'}), http_error(304)]
+        first = self.http.request_json(self.url)
+        second = self.http.request_json(self.url)
+        self.assertEqual(second, first)
+        self.assertIsNone(self.requests[0].get_header('If-none-match'))
+        self.assertEqual(self.requests[1].get_header('If-none-match'), '"v1"')
+
+    def test_post_is_not_conditional(self):
+        self.responses = [FakeResponse({'success': 1}, {'ETag': '"v1"'}), FakeResponse({'success': 1})]
+        self.http.request_json(self.url, data=b'x=1')
+        self.http.request_json(self.url, data=b'x=1')
+        self.assertIsNone(self.requests[1].get_header('If-none-match'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import json
+import unittest
+
+from helpers import load_module
+
+DOCUMENT = {
+    'success': True,
+    'a': [1, 2],
+    'results': [
+        {'name': 'AK-47 | Redline (Field-Tested)', 'hash_name': 'AK-47 | Redline (Field-Tested)', 'sell_price': 1543,
+         'sell_price_text': '$15.43', 'sell_listings': 1532, 'asset_description': {'icon_url': 'icon', 'descriptions': [{'value': 'x' * 50}]}},
+        {'name': 'Наклейка', 'hash_name': 'Sticker | Test', 'sell_price': 3, 'sell_price_text': '$0.03', 'sell_listings': 0,
+         'asset_description': {'icon_url': ''}}
+    ],
+    'total_count': 123456789,
+    'z': 1500.0,
+    'ratio': -1.5e-7,
+    'big': 2.5E+10,
+    'flag': False
+}
+
+class IterSearchResultsTest(unittest.TestCase):
+    def test_every_chunk_size_gives_the_same_result(self):
+        """Числа, разрезанные кусками на '.', 'e' или знаке, не должны обрезаться"""
+        for function in ('steam-search', 'update-prices'):
+            steam_stream = load_module(function, 'steam_stream')
+            data = json.dumps(DOCUMENT, ensure_ascii=False).encode('utf-8')
+            expected = [steam_stream.compact_item(item) for item in DOCUMENT['results']]
+            for chunk_size in range(1, 64):
+                with self.subTest(function=function, chunk_size=chunk_size):
+                    meta = {}
+                    results = list(steam_stream.iter_search_results(io.BytesIO(data), meta, chunk_size))
+                    self.assertEqual(results, expected)
+                    self.assertEqual(meta, {'success': True, 'total_count': 123456789, 'z': 1500.0,
+                                            'ratio': -1.5e-7, 'big': 2.5e10, 'flag': False})
+
+    def test_number_at_end_of_document(self):
+        steam_stream = load_module('steam-search', 'steam_stream')
+        for chunk_size in (1, 2, 3, 5):
+            meta = {}
+            list(steam_stream.iter_search_results(io.BytesIO(b'{"results":[],"total_count":1500.25}'), meta, chunk_size))
+            self.assertEqual(meta, {'total_count': 1500.25})
+
+    def test_truncated_document_raises(self):
+        steam_stream = load_module('steam-search', 'steam_stream')
+        with self.assertRaises(ValueError):
+            list(steam_stream.iter_search_results(io.BytesIO(b'{"results":[{"name":"x"'), {}, 4))
+
+if __name__ == '__main__':
+    unittest.main()
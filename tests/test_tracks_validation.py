@@ -0,0 +1,38 @@
+import unittest
+
+from helpers import load_module
+
+VALID = {'item_name': 'AK-47', 'item_hash_name': 'AK-47 | Redline (Field-Tested)', 'target_price': 100}
+
+class ValidateCreateTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load_module('tracks')
+
+    def test_valid_items(self):
+        for item in (VALID, {**VALID, 'status': 'paused', 'item_image': 'https://example.com/1.png'}, {**VALID, 'item_image': None}):
+            with self.subTest(item=item):
+                self.assertIsNone(self.index.validate_create(item))
+
+    def test_invalid_status_and_image(self):
+        cases = {
+            'status is invalid': [{**VALID, 'status': None}, {**VALID, 'status': ''}, {**VALID, 'status': 5}, {**VALID, 'status': 'x' * 51}],
+            'item_image must be a string': [{**VALID, 'item_image': 5}, {**VALID, 'item_image': ['a']}]
+        }
+        for error, items in cases.items():
+            for item in items:
+                with self.subTest(item=item):
+                    self.assertEqual(self.index.validate_create(item), error)
+
+    def test_price_bounds_match_the_column(self):
+        for price in (0, '0.01', 99999999.99, '99999999.99'):
+            with self.subTest(price=price):
+                self.assertIsNone(self.index.price_error(price, 'target_price'))
+        for price in (-1, '99999999.991', 10 ** 8, 'inf', 'nan', 1e300):
+            with self.subTest(price=price):
+                self.assertEqual(self.index.price_error(price, 'target_price'), 'target_price is out of range')
+        for price in ('abc', '', [1], True):
+            with self.subTest(price=price):
+                self.assertEqual(self.index.price_error(price, 'target_price'), 'target_price must be a number')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import re
+import unittest
+
+from helpers import load_module
+
+class TranslateWeaponTermsTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load_module('steam-search')
+
+    def test_overlapping_terms(self):
+        cases = {
+            # Короткий термин не переписывает середину или начало более длинного слова
+            'накал': 'накал',
+            'войска': 'войска',
+            'вой': 'howl',
+            'ак': 'AK-47',
+            # Номер модели рядом с названием: без вариантов с цифрами «ак47» не переводился, а «ак 47» давал «AK-47 47»
+            'ак47': 'AK-47',
+            'ак-47 красная линия': 'AK-47 redline',
+            'ак 47': 'AK-47',
+            'ак74': 'ак74',
+            'м4а1 неон': 'M4A1-S neon',
+            'глок-18 градиент': 'Glock-18 gradient',
+            # Самый длинный термин выигрывает у своих префиксов и подстрок
+            'после полевых испытаний': 'well-worn',
+            'полевые испытания': 'field-tested',
+            'поверхностная закалка': 'case hardened',
+            'закалка': 'case hardened',
+            'десерт игл': 'Desert Eagle',
+            'АК Красная Линия': 'AK-47 redline',
+            'нож градиент (после полевых испытаний)': 'knife gradient (well-worn)',
+            'usp неон': 'USP-S neon'
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.index.translate_weapon_terms(query), expected)
+
+    def test_trie_pattern_prefers_longest_term(self):
+        terms = ['а', 'аб', 'абв', 'б', 'бв']
+        pattern = re.compile(r'(?<!\w)(?:' + self.index.build_trie_pattern(terms) + r')(?!\w)')
+        for term in terms:
+            with self.subTest(term=term):
+                self.assertEqual(pattern.fullmatch(term).group(0), term)
+        self.assertEqual(pattern.findall('абв аб в бвг'), ['абв', 'аб'])
+
+    def test_normalize_query(self):
+        self.assertEqual(self.index.normalize_query('  Калаш   Красная  линия '), 'ak-47 redline')
+        self.assertEqual(self.index.normalize_query('AK-47  Redline'), 'ak-47 redline')
+
+if __name__ == '__main__':
+    unittest.main()